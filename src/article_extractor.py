@@ -0,0 +1,208 @@
+import logging
+import math
+import re
+import threading
+from collections import Counter
+
+import requests
+from bs4 import BeautifulSoup
+
+from src.config import ARTICLE_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+CHUNK_SIZE = 16 * 1024
+
+# Context tokens each prompt family may spend on article text (~4 chars per token)
+CONTEXT_BUDGETS = {
+    'one_liner': 120,
+    'variations': 120,
+    'variations_batch': 60,
+}
+DEFAULT_BUDGET = 100
+MAX_BODY_CHARS = 20000 # body kept on the news item; prompts select from it
+
+# Readability-style boilerplate removal
+BOILERPLATE_TAGS = ['script', 'style', 'noscript', 'template', 'nav', 'header', 'footer', 'aside',
+                    'form', 'iframe', 'svg', 'button', 'figcaption']
+NEGATIVE_HINTS = re.compile(r'comment|footer|sidebar|nav|menu|promo|related|share|social|subscribe|newsletter|'
+                            r'advert|sponsor|cookie|banner|popup|breadcrumb|tags|author-bio|recommend', re.I)
+POSITIVE_HINTS = re.compile(r'article|content|story|body|post|entry|main|text', re.I)
+MIN_PARAGRAPH_CHARS = 25
+MAX_LINK_DENSITY = 0.5
+
+STOPWORDS = {
+    'the', 'and', 'for', 'with', 'from', 'that', 'this', 'over', 'after', 'into', 'amid', 'about',
+    'says', 'said', 'will', 'have', 'has', 'had', 'are', 'was', 'were', 'its', 'his', 'her', 'their',
+    'they', 'them', 'been', 'being', 'but', 'not', 'also', 'which', 'who', 'what', 'when', 'would',
+    'could', 'there', 'than', 'then', 'more', 'most', 'some', 'such', 'other', 'our', 'you', 'your',
+}
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])["”\']?\s+(?=["“]?[A-Z0-9])')
+
+stats = {'pages': 0, 'truncated': 0, 'bytes': 0, 'chars_in': 0, 'chars_out': 0}
+_stats_lock = threading.Lock()
+
+def _count(**deltas):
+    with _stats_lock:
+        for name, n in deltas.items():
+            stats[name] += n
+
+def estimate_tokens(text):
+    return len(text or "") // 4
+
+# --- Download ---
+def fetch_html(url, timeout=10, max_bytes=None):
+    """
+    Streams a page, stopping after max_bytes (ARTICLE_MAX_BYTES): article text and
+    meta tags sit well inside the cap, trackers and inline assets past it are never read.
+    Returns the (possibly truncated) body bytes. Raises on HTTP errors.
+    """
+    max_bytes = max_bytes or ARTICLE_MAX_BYTES
+    response = requests.get(url, headers=HEADERS, timeout=timeout, stream=True, allow_redirects=True)
+    try:
+        response.raise_for_status()
+        chunks, size, truncated = [], 0, False
+        for chunk in response.iter_content(CHUNK_SIZE):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= max_bytes:
+                truncated = True
+                break
+        _count(pages=1, truncated=int(truncated), bytes=min(size, max_bytes))
+        return b"".join(chunks)[:max_bytes]
+    finally:
+        response.close()
+
+# --- Boilerplate removal ---
+def _text(tag):
+    return re.sub(r'\s+', ' ', tag.get_text(" ", strip=True))
+
+def _link_density(tag, text_len):
+    if not text_len:
+        return 1.0
+    return sum(len(a.get_text(strip=True)) for a in tag.find_all('a')) / text_len
+
+def _class_weight(tag):
+    hints = " ".join(tag.get('class') or []) + " " + (tag.get('id') or "")
+    weight = 0
+    if NEGATIVE_HINTS.search(hints):
+        weight -= 25
+    if POSITIVE_HINTS.search(hints):
+        weight += 25
+    return weight
+
+def _in_boilerplate(p, container):
+    """True if p sits in a negatively hinted block (related links, comments...) inside container."""
+    for parent in p.parents:
+        if parent is container:
+            return False
+        if _class_weight(parent) < 0:
+            return True
+    return False
+
+def extract_body(soup):
+    """
+    Main article text of a parsed page (BeautifulSoup). Paragraphs score their parent
+    (and half to the grandparent) by length and commas; containers are weighted by
+    class/id hints and link density, and the best one's paragraphs are returned.
+    Note: strips boilerplate tags from `soup` in place.
+    """
+    for tag in soup.find_all(BOILERPLATE_TAGS):
+        tag.decompose()
+
+    candidates = {} # id(container) -> [container, score]
+    for p in soup.find_all('p'):
+        text = _text(p)
+        if len(text) < MIN_PARAGRAPH_CHARS or _link_density(p, len(text)) > MAX_LINK_DENSITY:
+            continue
+        score = 1 + text.count(',') + min(len(text) / 100, 3)
+        for container, share in ((p.parent, 1.0), (p.parent.parent if p.parent else None, 0.5)):
+            if container is None or container.name in (None, '[document]'):
+                continue
+            entry = candidates.setdefault(id(container), [container, _class_weight(container)])
+            entry[1] += score * share
+
+    if not candidates:
+        return ""
+
+    def final_score(entry):
+        container, score = entry
+        return score * (1 - _link_density(container, len(_text(container))))
+
+    best = max(candidates.values(), key=final_score)[0]
+    paragraphs = []
+    for p in best.find_all('p'):
+        text = _text(p)
+        if len(text) < MIN_PARAGRAPH_CHARS or _link_density(p, len(text)) > MAX_LINK_DENSITY:
+            continue
+        if _in_boilerplate(p, best):
+            continue
+        paragraphs.append(text)
+    return "\n".join(paragraphs)[:MAX_BODY_CHARS]
+
+def extract_from_html(html):
+    return extract_body(BeautifulSoup(html, 'html.parser'))
+
+# --- Sentence selection ---
+def split_sentences(text):
+    sentences = []
+    for block in re.split(r'\n+', text or ""):
+        sentences.extend(s.strip() for s in _SENTENCE_SPLIT.split(block.strip()) if s.strip())
+    return sentences
+
+def _content_words(text):
+    return [w for w in re.findall(r'\w+', text.lower()) if len(w) > 2 and w not in STOPWORDS]
+
+def select_sentences(text, title="", budget_tokens=DEFAULT_BUDGET):
+    """
+    Most informative sentences of `text` within budget_tokens, in their original order.
+    Scored by document word frequency, overlap with the title, figures/names and position.
+    """
+    text = (text or "").strip()
+    if estimate_tokens(text) <= budget_tokens:
+        return text
+
+    sentences = split_sentences(text)
+    frequencies = Counter(_content_words(text))
+    title_words = set(_content_words(title))
+
+    scored = []
+    for i, sentence in enumerate(sentences):
+        words = _content_words(sentence)
+        if not words:
+            continue
+        score = sum(frequencies[w] for w in words) / math.sqrt(len(words))
+        score += 2 * len(title_words.intersection(words))
+        score += 0.5 * len(re.findall(r'\d+|\b[A-Z][a-z]+', sentence[1:]))
+        score *= 1.5 if i == 0 else 1 / (1 + i * 0.05)
+        scored.append((score, i, sentence))
+
+    budget_chars = budget_tokens * 4
+    chosen, used = [], 0
+    for score, i, sentence in sorted(scored, reverse=True):
+        if used + len(sentence) + 1 > budget_chars:
+            continue
+        chosen.append((i, sentence))
+        used += len(sentence) + 1
+
+    if not chosen: # a single sentence longer than the whole budget
+        return text[:budget_chars].rsplit(' ', 1)[0]
+    return " ".join(sentence for _, sentence in sorted(chosen))
+
+def context_for(family, title, text):
+    """Article context for a prompt of `family`, cut to that family's CONTEXT_BUDGETS entry."""
+    text = (text or "").strip()
+    if not text:
+        return ""
+    selected = select_sentences(text, title, CONTEXT_BUDGETS.get(family, DEFAULT_BUDGET))
+    _count(chars_in=len(text), chars_out=len(selected))
+    return selected
+
+def report():
+    saved = 1 - stats['chars_out'] / stats['chars_in'] if stats['chars_in'] else 0.0
+    return (f"Article context: {stats['pages']} pages streamed ({stats['truncated']} hit the byte cap, "
+            f"{stats['bytes'] / 1024:.0f} KB), prompt context {saved:.0%} smaller "
+            f"({stats['chars_in']} -> {stats['chars_out']} chars)")
@@ -1,9 +1,12 @@
 import logging
 import asyncio
+import os
+from functools import partial
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputFile
-from telegram.ext import ApplicationBuilder, ContextTypes, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ConversationHandler
+from telegram.ext import ApplicationBuilder, ContextTypes, CommandHandler, CallbackQueryHandler, MessageHandler, TypeHandler, filters, ConversationHandler
 from src import database as db
-from src import fetcher, x_fetcher, gemini_utils, image_generator, image_searcher, video_fetcher, video_generator, image_picker
+from src import fetcher, x_fetcher, gemini_utils, image_generator, image_searcher, video_fetcher, video_generator, image_picker, image_verifier, image_scoring, article_extractor
+from src import task_queue, render_jobs, render_pool, render_client, media_cache, llm_cache, singleflight, precompute, llm_governor, llm_metrics, prompt_cache, verdict_cache, message_stream
 from src.config import TELEGRAM_TOKEN
 from src.edit_handler import edit_conv_handler
 # Updated logger
@@ -135,46 +138,36 @@ async def create_handle_color(update: Update, context: ContextTypes.DEFAULT_TYPE
             # Video Flow
             import os
             
-            # 1. Create Overlay
-            await safe_edit_text(status_msg, "🎨 Creating overlay...")
-            overlay_io = image_generator.create_overlay_image(
-                title=title,
-                summary=sub,
-                date_str="", # Hide date for video
-                source="Manual",
-                manual_color=color_input
-            )
+            # 1+2. Overlay + ffmpeg run as a durable job (survives restarts)
+            await safe_edit_text(status_msg, "🎬 Processing video (Crop & Merge)...")
+            job = await run_render_job('video_overlay', {
+                'video_path': manual_video,
+                'title': title,
+                'summary': sub,
+                'date_str': "", # Hide date for video
+                'source': "Manual",
+                'manual_color': color_input,
+                'caption': "✨ Here is your custom video!"
+            }, update.message.chat_id)
             
-            if overlay_io:
-                # 2. Process Video
-                await safe_edit_text(status_msg, "🎬 Processing video (Crop & Merge)...")
-                final_video_path = video_generator.process_video_with_overlay(manual_video, overlay_io)
-                
-                if final_video_path and os.path.exists(final_video_path):
-                    await status_msg.delete()
-                    await update.message.reply_video(video=open(final_video_path, 'rb'), caption="✨ Here is your custom video!")
-                    # Cleanup final video (and maybe raw video if needed)
-                    # For now keep raw if we want to support edit, but manual flow ends here.
-                else:
-                    await status_msg.edit_text("❌ Video processing failed.")
-            else:
-                await status_msg.edit_text("❌ Overlay generation failed.")
+            await render_jobs.reply_with_job(update.message, status_msg, job, "✨ Here is your custom video!", safe_edit_text, fail_text="❌ Video processing failed.")
                 
         else:
-            # Image Flow
-            img_io = image_generator.create_news_image(
+            # Image Flow (rendered in the worker pool)
+            img_io = await asyncio.to_thread(
+                render_client.render_news_image,
+                background=manual_img,
                 title=title,
                 source="Manual",
                 date_str=date_str,
                 image_url=None, 
                 summary=sub,
-                manual_image=manual_img,
                 manual_color=color_input
             )
             
             if img_io:
                 await status_msg.delete()
-                await update.message.reply_photo(photo=img_io, caption="✨ Here is your custom post!")
+                await media_cache.send_photo_cached(update.message.reply_photo, img_io, caption="✨ Here is your custom post!")
             else:
                 await status_msg.edit_text("❌ Generation failed.")
             
@@ -233,6 +226,15 @@ async def reset_bot(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # --- Command Handlers ---
 # Note: /start is handled by onboarding_conv_handler
 
+async def track_llm_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Runs before every handler: Gemini usage of this update is billed to its user."""
+    llm_metrics.set_user(update.effective_user.id if update.effective_user else None)
+
+async def usage_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Today's Gemini usage for this user."""
+    rows = llm_metrics.daily_usage(user_id=update.effective_user.id)
+    await update.message.reply_text(f"📊 Gemini usage today:\n{llm_metrics.format_usage(rows)}")
+
 async def update_news_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Manual trigger for news update."""
     await update.message.reply_text("Checking for news updates...")
@@ -255,6 +257,8 @@ async def update_news_command(update: Update, context: ContextTypes.DEFAULT_TYPE
             items = items[:5]
             await update.message.reply_text(f"Found {len(items)}+ updates. Showing top 5:")
 
+        precompute.schedule(context.application, items)
+
         for item in items:
             summary_part = f"\n\n_{item.get('summary', '')}_" if item.get('summary') else ""
             msg = f"*{item['title']}*{summary_part}\n\n{item['published']}\n[Read more]({item['link']})"
@@ -286,6 +290,67 @@ async def safe_edit_text(message, text):
     except Exception as e:
         logger.warning(f"Safe edit ignored: {e}")
 
+# --- Render Jobs ---
+async def run_render_job(kind, payload, chat_id):
+    """Queues the render durably and runs it now (see render_jobs.run_now). Returns the job dict."""
+    return await render_jobs.run_now(kind, payload, chat_id)
+
+def edit_keyboard(label="✏️ Edit"):
+    return InlineKeyboardMarkup([[InlineKeyboardButton(label, callback_data='edit_start')]])
+
+async def deliver_render_job(application, job):
+    """Sends a finished (or permanently failed) job to its chat, editable like an inline result."""
+    bot = application.bot
+    payload = job['payload']
+    try:
+        if render_jobs.result_ready(job):
+            caption = payload.get('caption') or "✨ Here is your render!"
+            reply_markup = None
+            if payload.get('edit_user'):
+                application.user_data[payload['edit_user']]['last_gen_params'] = render_jobs.edit_params(payload)
+                reply_markup = edit_keyboard()
+            await render_jobs.send_result(job, partial(bot.send_photo, chat_id=job['chat_id']),
+                                          partial(bot.send_video, chat_id=job['chat_id']), caption, reply_markup)
+        elif job['state'] == task_queue.STATE_DONE:
+            # Result file cleaned up before it was sent: render again, delivered on a later tick
+            render_jobs.requeue(job)
+            return
+        elif job['state'] == task_queue.STATE_FAILED:
+            await bot.send_message(chat_id=job['chat_id'], text=f"❌ Render failed: {payload.get('title', '')[:50]}")
+    except Exception as e:
+        logger.error(f"Failed to deliver job {job['job_id'][:12]}: {e}")
+        return
+    task_queue.mark_job_delivered(job['job_id'])
+
+async def process_render_jobs(context: ContextTypes.DEFAULT_TYPE):
+    """In-process worker: delivers orphaned results and runs queued / retrying / reclaimed jobs."""
+    # 1. Results that finished but were never sent (e.g. restart between render and send)
+    for job in task_queue.get_undelivered_jobs(finished_before=60):
+        await deliver_render_job(context.application, job)
+
+    # 2. One due job per tick, under a worker id of its own
+    worker_id = task_queue.make_worker_id("bot-queue")
+    job = task_queue.claim_next_job(worker_id, lease_seconds=max(render_jobs.JOB_LEASES.values()))
+    if job:
+        await asyncio.to_thread(render_jobs.execute_claimed_job, job, worker_id)
+        job = task_queue.get_job(job['job_id'])
+        if job['state'] in (task_queue.STATE_DONE, task_queue.STATE_FAILED) and job['chat_id']:
+            await deliver_render_job(context.application, job)
+
+    metrics = task_queue.get_queue_metrics()
+    if metrics['depth'][task_queue.STATE_QUEUED] or metrics['depth'][task_queue.STATE_RUNNING]:
+        logger.info(f"Render queue: {metrics}")
+
+async def check_render_pool(context: ContextTypes.DEFAULT_TYPE):
+    """Pings local render workers and remote render nodes; the pool respawns itself if one is stuck or dead."""
+    pool = render_pool.get_render_pool()
+    if pool:
+        await asyncio.to_thread(pool.check_health)
+    client = render_client.get_render_client()
+    if client:
+        healthy = await asyncio.to_thread(client.refresh_health)
+        logger.info(f"Render nodes healthy: {healthy}/{len(client.nodes)}")
+
 # --- Handlers ---
 
 # --- New Helper for Image Selection ---
@@ -304,40 +369,40 @@ async def send_image_selection_menu(update: Update, context: ContextTypes.DEFAUL
         await status_msg.edit_text("⚠️ No more unique images found. Please pick from previous or skip.")
         return # Should probably show "Skip" button here at least, but let's assume valid flow
         
+    # Validate + downscale in parallel so dead links never reach Telegram
+    await safe_edit_text(status_msg, "🖼️ Checking images...")
+    previews = await picker.prepare_previews(images)
+    
+    if not previews:
+        await status_msg.edit_text(
+            "⚠️ None of these images could be loaded.",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton("🔄 Show 5 More", callback_data='img_more')],
+                [InlineKeyboardButton("⏩ Skip / Use AI", callback_data='img_skip')]
+            ])
+        )
+        return
+        
+    images = [url for url, _ in previews]
     context.user_data['current_batch_images'] = images
     await status_msg.delete()
     
-    # Send Images as an album or individual? 
-    # User said "presented with 5 images... then continues"
-    # Sending 5 images individually might be spammy but ensures visibility. 
-    # Use MediaGroup if possible? But they need to be numbered.
-    # Easiest: Send 5 individual photos with numbers in caption? Or just send them and then the menu.
-    
-    from telegram import InputMediaPhoto
-    media_group = []
-    
-    # Actually, to let user pick "1, 2, 3", the images need to be easily identified.
-    # Sending 5 individual images with "Option 1", "Option 2" is clearest.
-    
-    # Calculate global start index for this batch
+    # Calculate global start index for this batch (broken candidates were dropped from the picker)
     global_start_idx = len(picker.cached_images) - len(images)
+    captions = [f"Option {global_start_idx + i + 1}" for i in range(len(images))]
     
-    # Send Images
-    for i, url in enumerate(images):
-        global_idx = global_start_idx + i
-        
-        try:
-             # Caption with global option number
-             caption = f"Option {global_idx + 1}"
-             # Create individual select button with Global Index
-             btn = InlineKeyboardButton(f"✅ Select Option {global_idx + 1}", callback_data=f'img_pick_{global_idx}')
-             await update.effective_message.reply_photo(
-                 photo=url, 
-                 caption=caption,
-                 reply_markup=InlineKeyboardMarkup([[btn]])
-             )
-        except Exception as e:
-            logger.error(f"Failed to send image {url}: {e}")
+    # One album instead of N separate uploads (albums need 2+ items)
+    try:
+        if len(previews) == 1:
+            await media_cache.send_photo_cached(update.effective_message.reply_photo, previews[0][1], caption=captions[0])
+        else:
+            await media_cache.send_photo_group_cached(
+                update.effective_message.reply_media_group,
+                [data for _, data in previews],
+                captions
+            )
+    except Exception as e:
+        logger.error(f"Failed to send image album: {e}")
             
     # Send Selection Keyboard with Global Indices
     # Map buttons 1-5 to the current batch's global indices
@@ -393,40 +458,30 @@ async def perform_final_render(update: Update, context: ContextTypes.DEFAULT_TYP
     # Auto Search if needed
     if auto_search and not final_image_url:
         await safe_edit_text(status_msg, "🔍 AI is picking an image...")
-        serp_candidates = image_searcher.search_google_images(title)
+        serp_candidates = await image_searcher.search_google_images_async(title)
         if serp_candidates:
-            # Simple validation logic (copied from original)
-            for url in serp_candidates:
-                 # We skip strict validation for speed/robustness here or use verify_image_usability
-                if gemini_utils.verify_image_usability(url, title):
-                    final_image_url = url
-                    break
+            # Candidates are checked concurrently; first one that passes wins
+            final_image_url = await image_verifier.pick_first_good(serp_candidates, title)
     
     # Render
     await safe_edit_text(status_msg, "🎨 Rendering Image...")
-    img_io = image_generator.create_news_image(title, "Newsu", date_str, final_image_url, summary=summary)
-    
-    if img_io:
-        await status_msg.delete()
-        
-        context.user_data['last_gen_params'] = {
-            'title': title,
-            'summary': summary,
-            'source': "Newsu",
-            'date_str': date_str,
-            'image_url': final_image_url,
-            'manual_image': None,
-            'manual_color': None
-        }
-        
-        caption = f"Generated ({style_name}): {summary}"
-        if style_name == 'Custom':
-            caption = "✨ Draft. Click 'Edit' to customize text!"
-        
-        keyboard = [[InlineKeyboardButton("✏️ Edit", callback_data='edit_start')]]
-        await query.message.reply_photo(photo=img_io, caption=caption, reply_markup=InlineKeyboardMarkup(keyboard))
-    else:
-        await safe_edit_text(status_msg, "❌ Render failed.")
+    caption = f"Generated ({style_name}): {summary}"
+    if style_name == 'Custom':
+        caption = "✨ Draft. Click 'Edit' to customize text!"
+        
+    job = await run_render_job('news_image', {
+        'title': title,
+        'source': "Newsu",
+        'date_str': date_str,
+        'image_url': final_image_url,
+        'summary': summary,
+        'caption': caption,
+        'edit_user': update.effective_user.id
+    }, query.message.chat_id)
+    
+    if job and job['state'] == task_queue.STATE_DONE:
+        context.user_data['last_gen_params'] = render_jobs.edit_params(job['payload'])
+    await render_jobs.reply_with_job(query.message, status_msg, job, caption, safe_edit_text, reply_markup=edit_keyboard())
 
 # --- Callback Handlers ---
 async def button(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -447,8 +502,12 @@ async def button(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if message_text:
             lines = message_text.split('\n')
             title = lines[0]
-            summary = gemini_utils.generate_copy(title, "News Source")
-            await safe_edit_text(status_msg, f"📝 *Copy Suggestion:*\n\n{summary}")
+            # Stream the copy into the status message as it is generated
+            editor = message_stream.ThrottledEditor(status_msg, prefix="📝 *Copy Suggestion:*\n\n")
+            summary = None
+            async for summary in gemini_utils.stream_copy_async(title, "News Source"):
+                await editor.update(summary)
+            await editor.finish(summary)
         else:
             await safe_edit_text(status_msg, "❌ Could not read original message.")
             
@@ -479,8 +538,8 @@ async def button(update: Update, context: ContextTypes.DEFAULT_TYPE):
                      date_str = l
                      break
         
-        # Call Gemini for 4 variations
-        variations = gemini_utils.generate_all_variations(title, context_text)
+        # 4 variations (usually precomputed when the item was delivered)
+        variations = await precompute.get_variations(title, context_text)
         
         if not variations or not isinstance(variations, dict):
             await safe_edit_text(status_msg, "❌ Failed to generate styles.")
@@ -626,26 +685,21 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
                  
                  # Prepare content
                  title = data['caption'] or "Instagram Reel"
-                 refined_title = gemini_utils.refine_headline(title)
+                 refined_title = await gemini_utils.refine_headline_async(title)
                  summary = "Social Update" # Could generate from caption context
                  if data['caption']:
-                     summary = gemini_utils.clean_text(gemini_utils.generate_one_liner(refined_title, data['caption']))
+                     summary = gemini_utils.clean_text(await gemini_utils.generate_one_liner_async(refined_title, data['caption']))
                  
                  await safe_edit_text(status_msg, "🎬 Rendering Video...")
-                 overlay_io = image_generator.create_overlay_image(refined_title, summary, data['date'])
-                 
-                 if overlay_io:
-                    final_path = video_generator.process_video_with_overlay(video_path, overlay_io)
-                    if final_path:
-                        await status_msg.delete()
-                        await update.message.reply_video(
-                            video=open(final_path, 'rb'), 
-                            caption=f"🎥 **{refined_title}**\n_{summary}_"
-                        )
-                    else:
-                        await status_msg.edit_text("❌ Video rendering failed.")
-                 else:
-                    await status_msg.edit_text("❌ Overlay failed.")
+                 caption = f"🎥 **{refined_title}**\n_{summary}_"
+                 job = await run_render_job('video_overlay', {
+                     'video_path': video_path,
+                     'title': refined_title,
+                     'summary': summary,
+                     'date_str': data['date'],
+                     'caption': caption
+                 }, update.message.chat_id)
+                 await render_jobs.reply_with_job(update.message, status_msg, job, caption, safe_edit_text, fail_text="❌ Video rendering failed.")
                     
             # 2. Image/Text Post
             elif data['type'] == 'image' or data['type'] == 'POST' or data['type'] == 'post_text':
@@ -665,7 +719,7 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
                  date_str = data.get('date', "Latest News")
                  
                  # Generate Variations
-                 variations = gemini_utils.generate_all_variations(title[:200], context_text)
+                 variations = await gemini_utils.generate_all_variations_async(title[:200], context_text)
                  
                  if not variations or not isinstance(variations, dict):
                     await safe_edit_text(status_msg, "❌ Failed to generate styles.")
@@ -709,22 +763,20 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
                  await safe_edit_text(status_msg, "🔎 Analyzing video...")
                  item = fetcher.scrape_url_metadata(text)
                  title = item['title'] if item else "Video Update"
-                 refined_title = gemini_utils.refine_headline(title)
+                 refined_title = await gemini_utils.refine_headline_async(title)
                  date_str = item['published'] if item else "Latest"
                  summary = "Video Update"
                  
                  await safe_edit_text(status_msg, "🎬 Rendering...")
-                 overlay_io = image_generator.create_overlay_image(refined_title, summary, date_str)
-                 
-                 if overlay_io:
-                    final_path = video_generator.process_video_with_overlay(video_path, overlay_io)
-                    if final_path:
-                        await status_msg.delete()
-                        await update.message.reply_video(video=open(final_path, 'rb'), caption=f"🎥 **{refined_title}**")
-                    else:
-                        await status_msg.edit_text("❌ Render failed.")
-                 else:
-                    await status_msg.edit_text("❌ Overlay failed.")
+                 caption = f"🎥 **{refined_title}**"
+                 job = await run_render_job('video_overlay', {
+                     'video_path': video_path,
+                     'title': refined_title,
+                     'summary': summary,
+                     'date_str': date_str,
+                     'caption': caption
+                 }, update.message.chat_id)
+                 await render_jobs.reply_with_job(update.message, status_msg, job, caption, safe_edit_text)
             else:
                  await status_msg.edit_text("❌ Download failed.")
             return
@@ -736,6 +788,7 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         if item:
             context.user_data['last_scraped_item'] = item # Save for Context
+            precompute.schedule(context.application, [item])
             await status_msg.delete()
             summary_part = f"\n\n_{item.get('summary', '')}_" if item.get('summary') else ""
             msg = f"*{item['title']}*{summary_part}\n\n{item['published']}\n[Read more]({item['link']})"
@@ -779,6 +832,11 @@ async def scheduled_news_job(context: ContextTypes.DEFAULT_TYPE):
             if items: news_cache[unit] = items
         except Exception as e:
             logger.error(f"Error fetching for {unit}: {e}")
+
+    # Styles for the new items are generated in the background while we deliver
+    all_items = [item for items in news_cache.values() for item in items]
+    if all_items:
+        precompute.schedule(context.application, all_items)
             
     for user in active_users:
         unit = user['unit']
@@ -798,6 +856,22 @@ async def scheduled_news_job(context: ContextTypes.DEFAULT_TYPE):
                 
     # Cleanup
     db.cleanup_seen_news(days=3)
+    task_queue.cleanup_jobs(days=3)
+    media_cache.prune()
+    llm_cache.prune()
+    verdict_cache.prune()
+    logger.info(llm_cache.report())
+    logger.info(f"Single-flight: {singleflight.report()}")
+    logger.info(precompute.report())
+    logger.info(llm_governor.report())
+    logger.info(prompt_cache.report())
+    llm_metrics.flush()
+    llm_metrics.prune()
+    logger.info(llm_metrics.report())
+    llm_metrics.write_snapshot(os.path.join("logs", "llm_metrics.json"))
+    logger.info(article_extractor.report())
+    logger.info(image_scoring.report())
+    logger.info(verdict_cache.report())
 
 # --- Main Application ---
 def run_bot():
@@ -823,6 +897,7 @@ def run_bot():
     )
 
     # Handlers
+    application.add_handler(TypeHandler(Update, track_llm_user), group=-1)
     from src.onboarding import onboarding_conv_handler
     application.add_handler(onboarding_conv_handler)
     
@@ -834,6 +909,7 @@ def run_bot():
     application.add_handler(CommandHandler("start_news", start_news))
     application.add_handler(CommandHandler("stop_news", stop_news))
     application.add_handler(CommandHandler("update", update_news_command))
+    application.add_handler(CommandHandler("usage", usage_command))
     
     application.add_handler(CallbackQueryHandler(button))
     application.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), handle_text))
@@ -842,6 +918,9 @@ def run_bot():
     job_queue = application.job_queue
     # 15 minutes = 900 seconds
     job_queue.run_repeating(scheduled_news_job, interval=900, first=10)
+    # Durable render queue: retries, crash recovery and late delivery
+    job_queue.run_repeating(process_render_jobs, interval=30, first=15)
+    job_queue.run_repeating(check_render_pool, interval=60, first=20)
     
     logger.info("Bot is running...")
     application.run_polling()
@@ -1,73 +1,90 @@
-from PIL import Image, ImageDraw
+from PIL import Image, ImageOps
+import math
+import numpy as np
 import requests
 import io
 import logging
 
 logger = logging.getLogger(__name__)
 
-def create_gradient_overlay(width, height, config):
-    """
-    Creates a vertical gradient overlay based on config.
-    """
-    overlay = Image.new('RGBA', (width, height), (0, 0, 0, 0))
-    draw = ImageDraw.Draw(overlay)
-    
+# Gradient masks only depend on size + gradient settings, so they are built once
+_GRADIENT_CACHE = {}
+
+def _gradient_settings(config):
     # Check overrides in canvas OR gradient config
     grad_height_ratio = config.get('canvas', {}).get('gradient_height') or config.get('gradient', {}).get('height_ratio', 0.85)
-
     max_alpha = config.get('gradient', {}).get('max_alpha', 255)
     start_color = tuple(config.get('gradient', {}).get('start_color', [0,0,0]))
-    r, g, b = start_color
-    
-    gradient_height = int(height * grad_height_ratio) 
-    start_y = height - gradient_height
-    
-    # Optimization: Draw reduced steps instead of per-line if performance needed, but per-line is fine for single image.
-    for y in range(start_y, height):
-        ratio = (y - start_y) / gradient_height
-        alpha = int(ratio * max_alpha)
-        draw.line([(0, y), (width, y)], fill=(r, g, b, alpha))
-        
-    return overlay
+    return grad_height_ratio, max_alpha, start_color
+
+def _cached(key, build):
+    if key not in _GRADIENT_CACHE:
+        if len(_GRADIENT_CACHE) > 32:
+            _GRADIENT_CACHE.clear()
+        _GRADIENT_CACHE[key] = build()
+    return _GRADIENT_CACHE[key]
+
+def gradient_mask(width, height, config):
+    """
+    Alpha of the gradient as an 'L' image plus its colour: transparent above the
+    gradient, then a linear ramp to max_alpha at the bottom edge.
+    Built as one vectorized column; cached and shared, treat it as read-only.
+    """
+    grad_height_ratio, max_alpha, start_color = _gradient_settings(config)
+
+    def build():
+        gradient_height = max(1, int(height * grad_height_ratio))
+        start_y = height - gradient_height
+        rows = np.arange(height) - start_y
+        alpha = np.where(rows >= 0, rows / gradient_height * max_alpha, 0).astype(np.uint8)
+        column = Image.fromarray(alpha.reshape(height, 1), 'L')
+        return column.resize((width, height), Image.Resampling.NEAREST)
+
+    return _cached(('mask', width, height, grad_height_ratio, max_alpha), build), start_color
+
+# Modes Image.reduce() averages as pixel values (not e.g. palette indices)
+REDUCIBLE_MODES = ('L', 'LA', 'RGB', 'RGBA', 'CMYK')
+
+def fit_background(source, width, height):
+    """
+    Scales and center-crops `source` to cover width x height (RGB).
+    A not yet loaded JPEG is decoded at the smallest DCT scale (1/2, 1/4, 1/8) that
+    still covers the target (Image.draft), other formats are box-reduced first, then
+    one LANCZOS resize-and-crop. draft() changes how `source` loads: pass a freshly
+    opened image, not one the caller keeps using.
+    """
+    scale = max(width / source.width, height / source.height)
+    cover = (math.ceil(source.width * scale), math.ceil(source.height * scale))
+    if scale < 1:
+        if source.format == 'JPEG':
+            source.draft('RGB', cover)
+        else:
+            factor = int(min(source.width / cover[0], source.height / cover[1]))
+            if factor >= 2:
+                if source.mode not in REDUCIBLE_MODES: # palette / bilevel / 16-bit: reduce() can't (or shouldn't) average them
+                    source = source.convert('RGB')
+                source = source.reduce(factor)
+    if source.mode != 'RGB':
+        source = source.convert('RGB')
+    return ImageOps.fit(source, (width, height), Image.Resampling.LANCZOS)
 
 def prepare_background(image_url, width, height, bg_color):
     """
     Fetches, resizes, and crops the background image.
     Returns: processed_image (Image)
     """
-    bg_img = Image.new('RGB', (width, height), color=tuple(bg_color))
-    
     if not image_url:
-        return bg_img
+        return Image.new('RGB', (width, height), color=tuple(bg_color))
         
     try:
         headers = {'User-Agent': 'Mozilla/5.0'}
         response = requests.get(image_url, headers=headers, timeout=5)
         if response.status_code == 200:
-            downloaded_img = Image.open(io.BytesIO(response.content)).convert('RGB')
-            
-            # Target Resize (Cover)
-            img_ratio = downloaded_img.width / downloaded_img.height
-            target_ratio = width / height
-            
-            if img_ratio > target_ratio:
-                # Too wide
-                scale_height = height
-                scale_width = int(scale_height * img_ratio)
-                downloaded_img = downloaded_img.resize((scale_width, scale_height), Image.Resampling.LANCZOS)
-                left = (scale_width - width) // 2
-                downloaded_img = downloaded_img.crop((left, 0, left + width, height))
-            else:
-                # Too tall
-                scale_width = width
-                scale_height = int(scale_width / img_ratio)
-                downloaded_img = downloaded_img.resize((scale_width, scale_height), Image.Resampling.LANCZOS)
-                top = (scale_height - height) // 2
-                downloaded_img = downloaded_img.crop((0, top, width, top + height))
-                
-            return downloaded_img
+            # Target Resize (Cover); the full-size source is released on leaving the block
+            with Image.open(io.BytesIO(response.content)) as downloaded_img:
+                return fit_background(downloaded_img, width, height)
             
     except Exception as e:
         logger.error(f"Failed to process background image: {e}")
         
-    return bg_img
+    return Image.new('RGB', (width, height), color=tuple(bg_color))
@@ -0,0 +1,104 @@
+from PIL import ImageFont
+from functools import lru_cache
+import logging
+import os
+import threading
+
+from src.config import HEADLINE_FONT_FALLBACKS, BODY_FONT_FALLBACKS
+
+logger = logging.getLogger(__name__)
+
+FACE_CACHE_SIZE = 128
+USER_FONT_NAME = "headline_font.ttf" # saved by onboarding under users_data/<id>/
+
+FALLBACKS = {
+    'headline': HEADLINE_FONT_FALLBACKS,
+    'body': BODY_FONT_FALLBACKS,
+}
+
+_system_fonts = {} # bare font name -> resolved file path, or None if not installed
+_warned = set()
+_lock = threading.Lock()
+
+def user_font_path(user_id):
+    return os.path.join("users_data", str(user_id), USER_FONT_NAME)
+
+def _lookup_system_font(name):
+    """
+    Resolves a bare font name (e.g. 'DejaVuSans.ttf') through Pillow's system font
+    search once; the directory walk and the OSError for missing fonts are not repeated.
+    """
+    with _lock:
+        if name in _system_fonts:
+            return _system_fonts[name]
+        try:
+            path = ImageFont.truetype(name, 10).path
+        except OSError:
+            path = None
+        _system_fonts[name] = path
+        return path
+
+def _locate(candidate):
+    if not candidate:
+        return None
+    if os.path.isfile(candidate):
+        return candidate
+    if os.sep in candidate or '/' in candidate:
+        return None # a missing file, not a font name
+    return _lookup_system_font(candidate)
+
+def candidates(path, role='body', user_id=None):
+    """The fallback chain for a font request: configured path, the user's upload (headlines), role fallbacks."""
+    chain = [path]
+    if role == 'headline' and user_id:
+        chain.append(user_font_path(user_id))
+    chain.extend(FALLBACKS.get(role, BODY_FONT_FALLBACKS))
+    return chain
+
+def resolve(path, role='body', user_id=None):
+    """First existing font file of the chain, or None (Pillow's built-in font is used)."""
+    for candidate in candidates(path, role, user_id):
+        resolved = _locate(candidate)
+        if resolved:
+            if candidate != path and path not in _warned:
+                _warned.add(path)
+                logger.warning(f"Font {path} not found, using {resolved}")
+            return resolved
+    return None
+
+@lru_cache(maxsize=FACE_CACHE_SIZE)
+def _face(path, size, mtime):
+    # mtime in the key: a re-uploaded font file is loaded again
+    return ImageFont.truetype(path, size)
+
+@lru_cache(maxsize=16)
+def _default_face(size):
+    return ImageFont.load_default(size)
+
+def face(resolved, size):
+    """Shared face for an already resolved path (None: Pillow's built-in font)."""
+    if resolved:
+        try:
+            return _face(resolved, size, os.path.getmtime(resolved))
+        except OSError as e:
+            logger.error(f"Failed to load font {resolved}: {e}")
+    return _default_face(size)
+
+def get_font(path, size, role='body', user_id=None):
+    """
+    Shared FreeTypeFont for (resolved path, size, mtime). Never raises: falls back
+    along the chain and finally to Pillow's built-in font at `size`.
+    """
+    return face(resolve(path, role, user_id), size)
+
+def preload(config, user_id=None):
+    """Warms the face cache with every size the headline fitting can pick, plus the subheading font."""
+    cfg_fonts = config.get('fonts', {})
+    headline_path = cfg_fonts.get('headline_path', 'arialbd.ttf')
+    for size in range(cfg_fonts.get('headline_size_min', 35), cfg_fonts.get('headline_size_start', 65) + 1):
+        get_font(headline_path, size, 'headline', user_id)
+    sub_cfg = config.get('subheading', {})
+    get_font(sub_cfg.get('font_path', 'arial.ttf'), sub_cfg.get('font_size', 35), 'body', user_id)
+
+def cache_info():
+    return _face.cache_info()
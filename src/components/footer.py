@@ -1,20 +1,22 @@
-from PIL import ImageDraw, ImageFont
 import logging
+from src.components import text_layout
+from src.components.fonts import face, resolve as resolve_font
 
 logger = logging.getLogger(__name__)
 
-def draw_footer(draw, image_width, image_height, text, config):
+def draw_footer(draw, image_width, image_height, text, config, user_id=None, font_file=None):
     """
     Draws the summary/subheading on the image.
+    font_file: already resolved font (compiled template); resolved from config otherwise.
     Returns the Y position where the footer text starts (for relative positioning).
     """
     sub_cfg = config.get('subheading', {})
     
-    # Load Font
-    try:
-        font = ImageFont.truetype(sub_cfg.get('font_path', 'arial.ttf'), sub_cfg.get('font_size', 35))
-    except OSError:
-        font = ImageFont.load_default()
+    # Load Font (shared face, resolved along the fallback chain)
+    if font_file is None:
+        font_file = resolve_font(sub_cfg.get('font_path', 'arial.ttf'), 'body', user_id)
+    font_size = sub_cfg.get('font_size', 35)
+    font = face(font_file, font_size)
         
     color = tuple(sub_cfg.get('color', [200, 200, 200]))
     margin_bottom = sub_cfg.get('margin_bottom', 120)
@@ -24,11 +26,8 @@ def draw_footer(draw, image_width, image_height, text, config):
     # Calculate Max Width
     max_width = image_width - (safe_margin * 2)
     
-    # Wrap Text
-    import textwrap
-    chars_limit = int(max_width / (sub_cfg.get('font_size', 35) * 0.5))
-    wrapper = textwrap.TextWrapper(width=chars_limit)
-    lines = wrapper.wrap(text)
+    # Wrap Text (pixel accurate, memoized)
+    lines = text_layout.wrap_text(text, font_file, font_size, max_width).lines
     
     # Draw Lines (Centered)
     # Start drawing at footer_y. If multiple lines, we might need to adjust logic, 
@@ -46,11 +45,7 @@ def draw_footer(draw, image_width, image_height, text, config):
     # The existing code did `footer_y = h - margin`. So text starts there and goes down.
     # If I wrap, I continue going down.
     
-    for line in lines:
-        bbox = draw.textbbox((0, 0), line, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        
+    for line, text_width, text_height in lines:
         x = (image_width - text_width) // 2
         
         draw.text((x, current_y), line, font=font, fill=color)
@@ -1,9 +1,10 @@
-from PIL import ImageDraw, ImageFont
-import textwrap
+from src.components import text_layout
+from src.components.fonts import face, resolve as resolve_font
 
-def draw_headline(draw, width, reference_y, text, dominant_color, config, highlight_text=None, highlight_padding=None):
+def draw_headline(draw, width, reference_y, text, dominant_color, config, highlight_text=None, highlight_padding=None, user_id=None, font_file=None):
     """
     Draws the headline.
+    font_file: already resolved headline font (compiled template); resolved from config otherwise.
     """
     cfg_fonts = config.get('fonts', {})
     cfg_layout = config.get('layout', {})
@@ -62,59 +63,13 @@ def draw_headline(draw, width, reference_y, text, dominant_color, config, highli
         # Legacy: Will highlight Line 0 later
         pass
 
-    # Dynamic Sizing & Wrapping Loop
-    final_font = None
-    final_lines = [] 
-    current_size = start_size
-    
-    while current_size >= min_size:
-        try:
-            font = ImageFont.truetype(font_path, current_size)
-        except OSError:
-            font = ImageFont.load_default()
-            break
-            
-        space_w = draw.textlength(" ", font=font)
-        
-        lines = []
-        current_line = []
-        current_line_w = 0
-        all_fits = True
-        
-        current_word_idx = 0
-        
-        for w_str in words:
-            w_w = draw.textlength(w_str, font=font)
-            added_w = w_w + (space_w if current_line else 0)
-            
-            if current_line_w + added_w <= max_width:
-                current_line.append({'text': w_str, 'w': w_w, 'idx': current_word_idx})
-                current_line_w += added_w
-            else:
-                if not current_line: 
-                    all_fits = False 
-                    break 
-                
-                lines.append(current_line)
-                current_line = [{'text': w_str, 'w': w_w, 'idx': current_word_idx}]
-                current_line_w = w_w
-                
-            current_word_idx += 1
-            
-        if current_line:
-            lines.append(current_line)
-            
-        if all_fits and len(lines) <= 4:
-            final_lines = lines
-            final_font = font
-            break
-            
-        current_size -= 4 
-        
-    if not final_font:
-        if not final_lines: 
-            final_font = ImageFont.load_default()
-            final_lines = [[{'text': w, 'w': 10, 'idx': i} for i, w in enumerate(words)]]
+    # Dynamic Sizing & Wrapping (largest size that fits in 4 lines, see text_layout)
+    if font_file is None:
+        font_file = resolve_font(font_path, 'headline', user_id)
+    layout = text_layout.fit_lines(text, font_file, max_width, max_lines=4, min_size=min_size, max_size=start_size)
+    final_font = face(font_file, layout.size)
+    space_w = layout.space
+    final_lines = [[{'text': w_str, 'w': w_w, 'idx': idx} for idx, w_str, w_w in line] for line in layout.lines]
     
     # Calculate Heights
     ascent, descent = final_font.getmetrics()
@@ -162,6 +117,11 @@ def draw_headline(draw, width, reference_y, text, dominant_color, config, highli
             width_range = sum(w['w'] + space_w for w in line_words[r_start:r_end+1]) - space_w
             px_end = px_start + width_range
             
+            # Glyph ink can overhang its advance (e.g. a trailing 'f' or a leading 'J'): keep it inside the box
+            first_word, last_word = line_words[r_start], line_words[r_end]
+            px_start += min(0, final_font.getbbox(first_word['text'])[0])
+            px_end += max(0, final_font.getbbox(last_word['text'])[2] - last_word['w'])
+            
             box_x0 = px_start - padding_x
             box_y0 = current_y - padding_y_box
             box_x1 = px_end + padding_x
@@ -0,0 +1,90 @@
+from PIL import Image
+import logging
+import threading
+
+from src import config_store
+from src.components import fonts
+from src.components.background import gradient_mask
+from src.components.logo import load_logo
+
+logger = logging.getLogger(__name__)
+
+MAX_TEMPLATES = 16 # compiled layers are ~6 MB each at 1080x1350
+
+_templates = {} # user_id (None: default template) -> CompiledTemplate
+_lock = threading.Lock()
+_stats = {'hits': 0, 'compiles': 0, 'invalidations': 0}
+
+class CompiledTemplate:
+    """
+    Everything about a template that does not change between renders: parsed
+    settings, resolved font files and the gradient + logo layer, composited once.
+    The layer is kept as RGB plus its alpha ('L') so it pastes straight onto RGB backgrounds.
+    """
+
+    def __init__(self, config, user_id, version):
+        self.config = config
+        self.user_id = user_id
+        self.version = version
+
+        canvas = config.get('canvas', {})
+        self.size = (canvas.get('width', 1080), canvas.get('height', 1350))
+        self.bg_color = tuple(canvas.get('bg_color', [20, 20, 20]))
+        self.accent = tuple(config.get('colors', {}).get('accent_default', [0, 120, 215]))
+
+        cfg_fonts = config.get('fonts', {})
+        sub_cfg = config.get('subheading', {})
+        self.headline_font = fonts.resolve(cfg_fonts.get('headline_path', 'arialbd.ttf'), 'headline', user_id)
+        self.body_font = fonts.resolve(sub_cfg.get('font_path', 'arial.ttf'), 'body', user_id)
+
+        mask, start_color = gradient_mask(self.size[0], self.size[1], config)
+        layer = Image.new('RGBA', self.size, start_color + (0,))
+        layer.putalpha(mask)
+        logo = load_logo(config)
+        if logo:
+            logo_img, position = logo
+            layer.alpha_composite(logo_img, position)
+        self.layer = layer.convert('RGB')
+        self.mask = layer.getchannel('A')
+
+    def apply(self, image):
+        """Composites the static layer onto an RGB image of the template size, in place."""
+        image.paste(self.layer, (0, 0), self.mask)
+        return image
+
+    def overlay(self):
+        """A fresh RGBA copy of the static layer (transparent canvas for video overlays)."""
+        return Image.merge('RGBA', self.layer.split() + (self.mask,))
+
+def _version(snapshot):
+    """(config snapshot version, logo mtime): a new config or logo file recompiles."""
+    logo_path = snapshot.config.get('logo', {}).get('path', '')
+    return (snapshot.version, config_store.mtime(logo_path))
+
+def get(user_id=None):
+    """Compiled template for a user (None: the default one), recompiled when its config or logo file changes."""
+    snapshot = config_store.snapshot(user_id)
+    with _lock:
+        cached = _templates.get(user_id)
+    if cached and _version(snapshot) == cached.version:
+        _stats['hits'] += 1
+        return cached
+
+    compiled = CompiledTemplate(snapshot.config, user_id, _version(snapshot))
+    with _lock:
+        if len(_templates) >= MAX_TEMPLATES and user_id not in _templates:
+            _templates.pop(next(iter(_templates)))
+        _templates[user_id] = compiled
+        _stats['compiles'] += 1
+    logger.info(f"Compiled template for user {user_id}")
+    return compiled
+
+def invalidate(user_id=None):
+    """Drops a user's compiled template (called when onboarding saves a config)."""
+    with _lock:
+        if _templates.pop(user_id, None) is not None:
+            _stats['invalidations'] += 1
+
+def cache_info():
+    with _lock:
+        return dict(_stats, templates=len(_templates))
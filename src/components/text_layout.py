@@ -0,0 +1,155 @@
+from collections import namedtuple
+from functools import lru_cache
+import os
+import threading
+
+from src.components import fonts
+
+# Word advances are measured once at this size and scaled to search for the size; scaled advances
+# run up to ~2.5% narrower than real ones (per-glyph hinting), so the chosen size is laid out
+# again with real advances
+REFERENCE_SIZE = 100
+MAX_ADVANCES = 50000
+
+Layout = namedtuple('Layout', 'size space lines fits')    # lines: ((word_idx, text, real advance), ...) per line
+TextBlock = namedtuple('TextBlock', 'lines')                # lines: ((text, ink width, ink height), ...)
+
+_advances = {} # (path, mtime, word) -> advance at REFERENCE_SIZE
+_lock = threading.Lock()
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path) if path else None
+    except OSError:
+        return None
+
+def _reference_advances(path, mtime, words):
+    reference = fonts.face(path, REFERENCE_SIZE)
+    out = []
+    with _lock:
+        if len(_advances) > MAX_ADVANCES:
+            _advances.clear()
+        for word in words:
+            key = (path, mtime, word)
+            width = _advances.get(key)
+            if width is None:
+                width = _advances[key] = reference.getlength(word)
+            out.append(width)
+    return out
+
+def _wrap(widths, space, max_width):
+    """Greedy wrap of word widths into lines of word indices; None if one word alone is too wide."""
+    lines, line, line_w = [], [], 0
+    for i, w in enumerate(widths):
+        added = w + (space if line else 0)
+        if line_w + added <= max_width:
+            line.append(i)
+            line_w += added
+        else:
+            if not line:
+                return None
+            lines.append(line)
+            line, line_w = [i], w
+    if line:
+        lines.append(line)
+    return lines
+
+def _fits(lines, max_lines):
+    return lines is not None and len(lines) <= max_lines
+
+def _scaled_wrap(ref_widths, ref_space, size, max_width):
+    scale = size / REFERENCE_SIZE
+    widths = [w * scale for w in ref_widths]
+    return widths, ref_space * scale, _wrap(widths, ref_space * scale, max_width)
+
+def _real_wrap(path, size, words, max_width):
+    """Wrap with the advances words are drawn with at `size` (hinting included)."""
+    font = fonts.face(path, size)
+    widths = [font.getlength(w) for w in words]
+    space = font.getlength(" ")
+    return widths, space, _wrap(widths, space, max_width)
+
+def fit_lines(text, path, max_width, max_lines=4, min_size=35, max_size=65):
+    """
+    Largest integer size in [min_size, max_size] at which `text` wraps into at most
+    `max_lines` lines of `max_width` px, for the resolved font file `path` (None: built-in).
+    Memoized by (text, font file, size range, width).
+    """
+    return _fit_lines(text, path, _mtime(path), max_width, max_lines, min_size, max_size)
+
+@lru_cache(maxsize=1024)
+def _fit_lines(text, path, mtime, max_width, max_lines, min_size, max_size):
+    words = text.split()
+    reference = _reference_advances(path, mtime, words + [" "])
+    ref_widths, ref_space = reference[:-1], reference[-1]
+
+    # Binary search on the scaled estimates (line count only grows with size)
+    low, high = min_size, max_size
+    best = min_size
+    while low <= high:
+        mid = (low + high) // 2
+        if _fits(_scaled_wrap(ref_widths, ref_space, mid, max_width)[2], max_lines):
+            best, low = mid, mid + 1
+        else:
+            high = mid - 1
+
+    # Real layout at the chosen size; hinting can make a size slightly wider than scaled
+    size = best
+    widths, space, lines = _real_wrap(path, size, words, max_width)
+    while size > min_size and not _fits(lines, max_lines):
+        size -= 1
+        widths, space, lines = _real_wrap(path, size, words, max_width)
+
+    fits = _fits(lines, max_lines)
+    if lines is None: # a word wider than the line even at min_size: one word per line
+        lines = [[i] for i in range(len(words))]
+    return Layout(size, space, tuple(tuple((i, words[i], widths[i]) for i in line) for line in lines), fits)
+
+def wrap_text(text, path, size, max_width):
+    """Pixel-accurate wrap of `text` at `size` into lines of at most `max_width` px (when words allow)."""
+    return _wrap_text(text, path, _mtime(path), size, max_width)
+
+@lru_cache(maxsize=1024)
+def _wrap_text(text, path, mtime, size, max_width):
+    words = text.split()
+    if not words:
+        return TextBlock(())
+    scale = size / REFERENCE_SIZE
+    reference = _reference_advances(path, mtime, words + [" "])
+    lines = _wrap_overlong([w * scale for w in reference[:-1]], reference[-1] * scale, max_width)
+
+    # Exact check per line: push trailing words down while a line measures too wide
+    font = fonts.face(path, size)
+    out = []
+    pending = [[words[i] for i in line] for line in lines]
+    while pending:
+        line = pending.pop(0)
+        text_line = " ".join(line)
+        while len(line) > 1 and font.getlength(text_line) > max_width:
+            moved = line.pop()
+            if pending:
+                pending[0].insert(0, moved)
+            else:
+                pending.append([moved])
+            text_line = " ".join(line)
+        left, top, right, bottom = font.getbbox(text_line)
+        out.append((text_line, right - left, bottom - top))
+    return TextBlock(tuple(out))
+
+def _wrap_overlong(widths, space, max_width):
+    """Like _wrap, but a word wider than max_width gets a line of its own."""
+    lines, line, line_w = [], [], 0
+    for i, w in enumerate(widths):
+        added = w + (space if line else 0)
+        if line and line_w + added > max_width:
+            lines.append(line)
+            line, line_w = [], 0
+            added = w
+        line.append(i)
+        line_w += added
+    if line:
+        lines.append(line)
+    return lines
+
+def cache_info():
+    return {'fit': _fit_lines.cache_info(), 'wrap': _wrap_text.cache_info(), 'advances': len(_advances)}
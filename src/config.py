@@ -10,3 +10,52 @@ X_ACCESS_TOKEN = os.getenv("X_ACCESS_TOKEN")
 X_ACCESS_TOKEN_SECRET = os.getenv("X_ACCESS_TOKEN_SECRET")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# Render Workers (0 disables the process pool and renders in the bot process)
+RENDER_POOL_WORKERS = int(os.getenv("RENDER_POOL_WORKERS", min(4, os.cpu_count() or 1)))
+
+# Remote Render Nodes (comma separated base URLs, e.g. http://10.0.0.5:8101). Empty = render locally.
+RENDER_NODES = [u.strip().rstrip('/') for u in os.getenv("RENDER_NODES", "").split(",") if u.strip()]
+# Max concurrent requests a render node accepts before answering 503
+RENDER_NODE_CAPACITY = int(os.getenv("RENDER_NODE_CAPACITY", max(1, RENDER_POOL_WORKERS) * 2))
+
+# LLM Response Cache (seconds, 0 disables). Opt out per function with a comma list, e.g. "copy,vision"
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600))
+LLM_CACHE_DISABLED = {f.strip() for f in os.getenv("LLM_CACHE_DISABLED", "").split(",") if f.strip()}
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", 5000))
+
+# Batched Variation Precompute (headlines per Gemini request / new items precomputed per fetch cycle)
+VARIATION_BATCH_SIZE = int(os.getenv("VARIATION_BATCH_SIZE", 10))
+PRECOMPUTE_MAX_ITEMS = int(os.getenv("PRECOMPUTE_MAX_ITEMS", 30))
+# Estimated Gemini tokens speculative precompute may spend per cycle (the 15 min fetch interval)
+PRECOMPUTE_TOKEN_BUDGET = int(os.getenv("PRECOMPUTE_TOKEN_BUDGET", 20000))
+PRECOMPUTE_CYCLE_SECONDS = int(os.getenv("PRECOMPUTE_CYCLE_SECONDS", 900))
+
+# Gemini Rate Governor (requests per minute / burst size matched to the API quota)
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", 60))
+GEMINI_BURST = int(os.getenv("GEMINI_BURST", 10))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", 3))
+# Lighter model raced against slow calls once they pass their deadline
+GEMINI_HEDGE_MODEL = os.getenv("GEMINI_HEDGE_MODEL", "gemini-2.0-flash-lite")
+
+# Auto Image Pick (candidates verified concurrently / seconds before settling for the best candidate)
+IMAGE_VERIFY_FAN_OUT = int(os.getenv("IMAGE_VERIFY_FAN_OUT", 3))
+IMAGE_VERIFY_DEADLINE = float(os.getenv("IMAGE_VERIFY_DEADLINE", 20))
+
+# Image Verification Verdict Cache (seconds)
+IMAGE_VERDICT_TTL = int(os.getenv("IMAGE_VERDICT_TTL", 3 * 24 * 3600))
+
+# Vision Payloads (long edge in px and JPEG quality of images sent for verification)
+VISION_MAX_EDGE = int(os.getenv("VISION_MAX_EDGE", 768))
+VISION_JPEG_QUALITY = int(os.getenv("VISION_JPEG_QUALITY", 80))
+
+# Gemini Context Caching of the static prompt instructions (opt-in: cached instructions are sent as a
+# system instruction instead of inline with the prompt; prefixes below the model's minimum stay inline)
+GEMINI_CONTEXT_CACHE = os.getenv("GEMINI_CONTEXT_CACHE", "false").lower() == "true"
+GEMINI_CONTEXT_CACHE_TTL = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", 3600))
+
+# Article Extraction (bytes of a linked page read before the download is cut off)
+ARTICLE_MAX_BYTES = int(os.getenv("ARTICLE_MAX_BYTES", 1024 * 1024))
+
+# Font Fallbacks (tried in order when a template font is missing; file paths or system font names)
+HEADLINE_FONT_FALLBACKS = [f.strip() for f in os.getenv("HEADLINE_FONT_FALLBACKS", "assets/Poppins-Bold.ttf,DejaVuSans-Bold.ttf").split(",") if f.strip()]
+BODY_FONT_FALLBACKS = [f.strip() for f in os.getenv("BODY_FONT_FALLBACKS", "DejaVuSans.ttf,LiberationSans-Regular.ttf,assets/Poppins-Bold.ttf").split(",") if f.strip()]
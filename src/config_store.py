@@ -0,0 +1,175 @@
+import copy
+import itertools
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.join(os.getcwd(), 'config', 'template_config.json')
+USER_DATA_DIR = "users_data"
+CONFIG_NAME = "template_config.json"
+# A cached stat is trusted this long; saves made by another process (render
+# workers, a second bot) show up within it. Saves in this process apply at once.
+CHECK_INTERVAL = 2.0
+
+Snapshot = namedtuple('Snapshot', 'config version path') # config: read-only (mappingproxy / tuple) tree
+
+_snapshots = {} # user_id (None: default template) -> (Snapshot, (user file mtime, default file mtime))
+_mtimes = {}    # path -> (checked_at, mtime_ns or None)
+_versions = itertools.count(1)
+_lock = threading.RLock()
+_stats = {'hits': 0, 'loads': 0, 'saves': 0}
+
+def user_config_path(user_id):
+    return os.path.join(USER_DATA_DIR, str(user_id), CONFIG_NAME)
+
+def mtime(path):
+    """stat mtime (ns) of a file, or None if missing; re-checked at most every CHECK_INTERVAL seconds."""
+    if not path:
+        return None
+    now = time.monotonic()
+    with _lock:
+        cached = _mtimes.get(path)
+        if cached and now - cached[0] < CHECK_INTERVAL:
+            return cached[1]
+    try:
+        value = os.stat(path).st_mtime_ns
+    except OSError:
+        value = None
+    with _lock:
+        _mtimes[path] = (now, value)
+    return value
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+def thaw(value):
+    """Plain dict/list copy of a snapshot config (for editing and saving)."""
+    if isinstance(value, (dict, MappingProxyType)):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(v) for v in value]
+    return value
+
+def _merge(defaults, overrides):
+    """Deep merge: keys missing from a user template fall back to the default template."""
+    merged = copy.deepcopy(defaults)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+def _read(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def _load(user_id):
+    """(Snapshot, mtime) built from disk: the default template, with the user's file merged over it."""
+    default_mtime = mtime(DEFAULT_PATH)
+    defaults = {}
+    if default_mtime is not None:
+        try:
+            defaults = _read(DEFAULT_PATH)
+        except Exception as e:
+            logger.error(f"Failed to load default config: {e}")
+
+    if user_id:
+        path = user_config_path(user_id)
+        user_mtime = mtime(path)
+        if user_mtime is not None:
+            try:
+                config = _merge(defaults, _read(path))
+                return Snapshot(_freeze(config), next(_versions), path), (user_mtime, default_mtime)
+            except Exception as e:
+                logger.error(f"Failed to load user config for {user_id}: {e}")
+    return Snapshot(_freeze(defaults), next(_versions), DEFAULT_PATH), (None, default_mtime)
+
+def version(user_id=None):
+    """(user file mtime, default file mtime): what a user's snapshot is built from."""
+    user_mtime = mtime(user_config_path(user_id)) if user_id else None
+    return (user_mtime, mtime(DEFAULT_PATH))
+
+def revalidate(user_id, expected):
+    """
+    Takes `expected` (a version() from the process that saves configs, e.g. sent
+    with a render request) as authoritative: when it differs from what this
+    process has cached, the throttled stats and the snapshot are dropped so the
+    next snapshot() reads the files again instead of waiting out CHECK_INTERVAL.
+    """
+    expected = tuple(expected)
+    with _lock:
+        cached = _snapshots.get(user_id)
+        if cached and cached[1] == expected:
+            return
+        if user_id:
+            _mtimes.pop(user_config_path(user_id), None)
+        _mtimes.pop(DEFAULT_PATH, None)
+        _snapshots.pop(user_id, None)
+
+def snapshot(user_id=None):
+    """
+    Current config of a user (None or no saved template: the default one) as an
+    immutable Snapshot. Repeated calls return the same object until the file changes.
+    """
+    with _lock:
+        cached = _snapshots.get(user_id)
+    if cached and cached[1] == version(user_id):
+        _stats['hits'] += 1
+        return cached[0]
+
+    with _lock:
+        entry = _load(user_id)
+        _snapshots[user_id] = entry
+        _stats['loads'] += 1
+    return entry[0]
+
+def get(user_id=None):
+    """Read-only config (mappingproxy) of a user; use load() for an editable copy."""
+    return snapshot(user_id).config
+
+def load(user_id=None):
+    """Editable (plain dict) copy of a user's config, defaults merged in."""
+    return thaw(get(user_id))
+
+def save(user_id, config):
+    """
+    Writes a user's config atomically (temp file + rename, so readers never see a
+    partial file); the next snapshot() picks it up. Returns True on success.
+    """
+    path = user_config_path(user_id)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(thaw(config), f, indent=4)
+            os.chmod(tmp_path, 0o644) # mkstemp creates 0600
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except Exception as e:
+        logger.error(f"Failed to save config for {user_id}: {e}")
+        return False
+
+    with _lock:
+        _mtimes.pop(path, None)
+        _snapshots.pop(user_id, None)
+        _stats['saves'] += 1
+    return True
+
+def cache_info():
+    with _lock:
+        return dict(_stats, snapshots=len(_snapshots))
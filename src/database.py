@@ -32,7 +32,93 @@ def init_db():
             seen_at DATETIME
         )
     ''')
-    
+
+    # Durable render/video jobs (see src/task_queue.py)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS render_jobs (
+            job_id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            chat_id INTEGER,
+            state TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            worker_id TEXT,
+            lease_expires_at REAL,
+            available_at REAL NOT NULL,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            delivered_at REAL,
+            result_path TEXT,
+            last_error TEXT
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_render_jobs_state ON render_jobs (state, available_at)')
+
+    # Telegram file_ids of media we already uploaded (see src/media_cache.py)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS media_file_ids (
+            media_key TEXT PRIMARY KEY,
+            file_id TEXT NOT NULL,
+            media_type TEXT,
+            last_used REAL
+        )
+    ''')
+
+    # Gemini responses keyed by prompt hash (see src/llm_cache.py)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            cache_key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            tokens INTEGER DEFAULT 0,
+            expires_at REAL NOT NULL
+        )
+    ''')
+
+    # Image verification verdicts by URL and perceptual hash (see src/verdict_cache.py)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS image_verdicts (
+            url TEXT NOT NULL,
+            phash TEXT,
+            topic TEXT NOT NULL,
+            ok INTEGER NOT NULL,
+            reason TEXT,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL,
+            PRIMARY KEY (url, topic)
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_image_verdicts_phash ON image_verdicts (phash)')
+    # pHash split in 16-bit bands (band * 65536 + value), so near-duplicate lookups probe an index
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS image_verdict_bands (
+            band_key INTEGER NOT NULL,
+            url TEXT NOT NULL,
+            topic TEXT NOT NULL
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_image_verdict_bands_key ON image_verdict_bands (band_key)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_image_verdict_bands_row ON image_verdict_bands (url, topic)')
+
+    # Gemini usage per day, user and call site (see src/llm_metrics.py)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS llm_usage (
+            day TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            call_site TEXT NOT NULL,
+            calls INTEGER DEFAULT 0,
+            requests INTEGER DEFAULT 0,
+            prompt_tokens INTEGER DEFAULT 0,
+            response_tokens INTEGER DEFAULT 0,
+            cache_hits INTEGER DEFAULT 0,
+            errors INTEGER DEFAULT 0,
+            latency_total REAL DEFAULT 0,
+            cost REAL DEFAULT 0,
+            PRIMARY KEY (day, user_id, call_site)
+        )
+    ''')
+
     conn.commit()
     conn.close()
     logger.info("Database initialized.")
@@ -1,8 +1,9 @@
 import logging
 import re
+import asyncio
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, CallbackQueryHandler, MessageHandler, filters, CommandHandler
-from src import image_generator, video_generator
+from src import image_generator, video_generator, render_client, render_jobs, media_cache
 
 # Logger
 logger = logging.getLogger(__name__)
@@ -126,10 +127,8 @@ async def handle_edit_img(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif update.message.photo:
         photo_file = await update.message.photo[-1].get_file()
         file_bytearray = await photo_file.download_as_bytearray()
-        from PIL import Image
-        import io
-        image_obj = Image.open(io.BytesIO(file_bytearray))
-        context.user_data['last_gen_params']['manual_image'] = image_obj
+        # Kept encoded: each render decodes it near the canvas scale (see fit_background)
+        context.user_data['last_gen_params']['manual_image'] = bytes(file_bytearray)
         context.user_data['last_gen_params']['image_url'] = None
         context.user_data['last_gen_params']['manual_video'] = None # Clear video
         context.user_data['last_gen_params']['create_video_path'] = None
@@ -284,40 +283,36 @@ async def re_render_image(update: Update, context: ContextTypes.DEFAULT_TYPE):
             # Hide date for videos
             date_str = "" 
             
-            overlay_io = image_generator.create_overlay_image(
-                title=params.get('title'),
-                summary=params.get('summary'),
-                date_str=date_str,
-                source=params.get('source', 'Edited'),
-                manual_color=params.get('manual_color'),
-                highlight_text=params.get('highlight_text'),
-                highlight_padding=params.get('highlight_padding')
-            )
+            caption = f"✨ Updated Video: {params.get('summary')}"
+            job = await render_jobs.run_now('video_overlay', {
+                'video_path': manual_video,
+                'title': params.get('title'),
+                'summary': params.get('summary'),
+                'date_str': date_str,
+                'source': params.get('source', 'Edited'),
+                'manual_color': params.get('manual_color'),
+                'highlight_text': params.get('highlight_text'),
+                'highlight_padding': params.get('highlight_padding'),
+                'caption': caption,
+                'edit_user': update.effective_user.id
+            }, query.message.chat_id)
             
-            if overlay_io:
-                final_path = video_generator.process_video_with_overlay(manual_video, overlay_io)
-                if final_path:
-                    await status_msg.delete()
-                    keyboard = [[InlineKeyboardButton("✏️ Edit Again", callback_data='edit_start')]]
-                    await query.message.reply_video(
-                        video=open(final_path, 'rb'),
-                        caption=f"✨ Updated Video: {params.get('summary')}",
-                        reply_markup=InlineKeyboardMarkup(keyboard)
-                    )
-                else:
-                    await safe_edit_text(status_msg, "❌ Video processing failed.")
-            else:
-                 await safe_edit_text(status_msg, "❌ Overlay generation failed.")
+            keyboard = [[InlineKeyboardButton("✏️ Edit Again", callback_data='edit_start')]]
+            await render_jobs.reply_with_job(query.message, status_msg, job, caption, safe_edit_text,
+                                             fail_text="❌ Video processing failed.",
+                                             pending_text="⏳ Video is still processing. I'll send it when ready.",
+                                             reply_markup=InlineKeyboardMarkup(keyboard))
                  
         else:
-            # Re-render Image
-            img_io = image_generator.create_news_image(
+            # Re-render Image (in the worker pool)
+            img_io = await asyncio.to_thread(
+                render_client.render_news_image,
+                background=params.get('manual_image'),
                 title=params.get('title'),
                 source=params.get('source', 'Edited'),
                 date_str=params.get('date_str', ''),
                 image_url=params.get('image_url'),
                 summary=params.get('summary'),
-                manual_image=params.get('manual_image'),
                 manual_color=params.get('manual_color'),
                 highlight_text=params.get('highlight_text'),
                 highlight_padding=params.get('highlight_padding')
@@ -327,8 +322,9 @@ async def re_render_image(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 await status_msg.delete()
                 # Send new photo with Edit button again
                 keyboard = [[InlineKeyboardButton("✏️ Edit Again", callback_data='edit_start')]]
-                await query.message.reply_photo(
-                    photo=img_io, 
+                await media_cache.send_photo_cached(
+                    query.message.reply_photo,
+                    img_io, 
                     caption=f"✨ Updated: {params.get('summary')}",
                     reply_markup=InlineKeyboardMarkup(keyboard)
                 )
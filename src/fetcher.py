@@ -7,6 +7,7 @@ from datetime import datetime, timedelta
 from time import mktime
 import logging
 from src.database import is_news_seen
+from src import article_extractor
 
 logger = logging.getLogger(__name__)
 
@@ -123,20 +124,17 @@ def get_article_image(url):
     Scrapes the og:image from the article URL.
     """
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        # Follow redirects (often RSS links are redirects)
-        response = requests.get(url, headers=headers, timeout=5, allow_redirects=True)
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.content, 'html.parser')
+        # Follow redirects (often RSS links are redirects); meta tags sit in the first bytes
+        html = article_extractor.fetch_html(url, timeout=5)
+        if html:
+            soup = BeautifulSoup(html, 'html.parser')
             # Try og:image
             og_image = soup.find('meta', property='og:image')
             if og_image and og_image.get('content'):
                 return og_image['content']
             
             # Try twitter:image
-            tw_image = soup.find('meta', name='twitter:image')
+            tw_image = soup.find('meta', attrs={'name': 'twitter:image'})
             if tw_image and tw_image.get('content'):
                 return tw_image['content']
                 
@@ -147,17 +145,11 @@ def get_article_image(url):
 
 def scrape_url_metadata(url):
     """
-    Scrapes metadata (Title, Description, Image) from a direct news link.
+    Scrapes metadata (Title, Description, Image) and the article body from a direct news link.
     Returns a dict consistent with specific news items.
     """
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
+        soup = BeautifulSoup(article_extractor.fetch_html(url, timeout=10), 'html.parser')
         
         # Title
         title = None
@@ -177,20 +169,26 @@ def scrape_url_metadata(url):
         summary = ""
         if soup.find('meta', property='og:description'):
             summary = soup.find('meta', property='og:description')['content']
-        elif soup.find('meta', name='description'):
-            summary = soup.find('meta', name='description')['content']
+        elif soup.find('meta', attrs={'name': 'description'}):
+            summary = soup.find('meta', attrs={'name': 'description'})['content']
             
         # Image
         image_url = None
         if soup.find('meta', property='og:image'):
             image_url = soup.find('meta', property='og:image')['content']
-        elif soup.find('meta', name='twitter:image'):
-            image_url = soup.find('meta', name='twitter:image')['content']
+        elif soup.find('meta', attrs={'name': 'twitter:image'}):
+            image_url = soup.find('meta', attrs={'name': 'twitter:image'})['content']
             
         if not title:
             return None
             
-        from datetime import datetime
+        # Article body (for better Gemini Context); prompts select from it within their token budget
+        try:
+            content = article_extractor.extract_body(soup)
+        except Exception as e:
+            logger.warning(f"Article extraction failed for {url}: {e}")
+            content = ""
+            
         return {
             'title': title.strip(),
             'link': url,
@@ -198,20 +196,9 @@ def scrape_url_metadata(url):
             'source': urllib.parse.urlparse(url).netloc.replace('www.', ''),
             'image_url': image_url,
             'summary': summary.strip(),
-            'content': '' # Fallback
+            'content': content or summary.strip()
         }
         
-        # Extended Text Scraping (for better Gemini Context)
-        try:
-            paragraphs = soup.find_all('p')
-            text_content = " ".join([p.get_text().strip() for p in paragraphs])
-            # Limit to 3000 chars to avoid token limits
-            data['content'] = text_content[:3000].strip() or summary.strip()
-        except Exception:
-            data['content'] = summary.strip()
-            
-        return data
-        
     except Exception as e:
         logger.error(f"Scrape URL failed: {e}")
         return None
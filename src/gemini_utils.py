@@ -1,8 +1,16 @@
 from google import genai
+from google.genai import types
+from PIL import Image
+import asyncio
+import io
+import json
 import logging
 import os
 import re # Added import for re module
-from src.config import GEMINI_API_KEY
+import threading
+import time
+from src.config import GEMINI_API_KEY, VARIATION_BATCH_SIZE, VISION_MAX_EDGE, VISION_JPEG_QUALITY
+from src import article_extractor, image_scoring, llm_cache, llm_governor, llm_metrics, prompt_cache, singleflight, verdict_cache
 
 logger = logging.getLogger(__name__)
 
@@ -13,28 +21,164 @@ SOURCE_BLACKLIST = [
     "Business Standard", "Economic Times", "Mint", "Zee News"
 ]
 
+# Case insensitive source names WITH WORD BOUNDARIES
+# prevents stripping "Mint" from "Commitment" etc.
+_SOURCE_PATTERNS = [re.compile(r'\b' + re.escape(source) + r'\b', re.IGNORECASE) for source in SOURCE_BLACKLIST]
+# Streamed text this close to the end may still be the start of a source name
+STREAM_HOLDBACK = max(len(source) for source in SOURCE_BLACKLIST)
+
+def strip_sources(text):
+    for pattern in _SOURCE_PATTERNS:
+        text = pattern.sub("", text)
+    return text
+
 def clean_text(text):
     """Removes known source names from text."""
-    for source in SOURCE_BLACKLIST:
-        # Case insensitive replace of source name WITH WORD BOUNDARIES
-        # prevents stripping "Mint" from "Commitment" etc.
-        pattern = re.compile(r'\b' + re.escape(source) + r'\b', re.IGNORECASE)
-        text = pattern.sub("", text)
+    text = strip_sources(text)
     
     # Strip trailing periods as per user request
     text = text.rstrip('.')
     return text
 
-def generate_copy(title, source):
+class StreamCleaner:
     """
-    Generates viral social media copy using Gemini.
+    clean_text for a response arriving in chunks. feed() returns the text that is
+    safe to show so far: everything up to the last word break before the final
+    STREAM_HOLDBACK chars, so a half-received source name never flashes on screen.
     """
-    if not GEMINI_API_KEY:
-        return "Gemini API Key missing. Check .env"
-        
+
+    def __init__(self):
+        self.raw = ""
+        self._stable_end = 0
+        self._stable_clean = ""
+
+    def feed(self, chunk):
+        self.raw += chunk
+        limit = len(self.raw) - STREAM_HOLDBACK
+        if limit <= self._stable_end:
+            return self._stable_clean
+        cut = max(self.raw.rfind(" ", 0, limit), self.raw.rfind("\n", 0, limit))
+        if cut > self._stable_end:
+            self._stable_end = cut
+            self._stable_clean = strip_sources(self.raw[:cut]).strip()
+        return self._stable_clean
+
+    def finish(self):
+        return clean_text(self.raw.strip())
+
+# --- Shared Client ---
+MODEL = 'gemini-2.0-flash'
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """
+    Lazily created, process-wide Gemini client.
+    Reusing it keeps the underlying HTTP connections alive between calls.
+    Async callers use get_client().aio.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = genai.Client(api_key=GEMINI_API_KEY)
+    return _client
+
+def _prompt_text(request):
+    """Full prompt of a text request: family instructions (if any) + per-call contents."""
+    family = request.get('family')
+    if family:
+        return prompt_cache.inline_contents(family, request['contents'])
+    return request['contents']
+
+def _cache_key(call_site, request):
+    # Only text prompts are cached; vision requests carry image data
+    if isinstance(request['contents'], str) and llm_cache.is_enabled(call_site):
+        return llm_cache.make_key(call_site, MODEL, _prompt_text(request))
+    return None
+
+def _store(key, result, response):
+    # Fallbacks never reach here; empty parses (e.g. bad JSON) are not worth keeping
+    if key and result:
+        usage = getattr(response, 'usage_metadata', None)
+        llm_cache.put(key, result, tokens=getattr(usage, 'total_token_count', 0) or 0)
+
+def _flight_key(call_site, request):
+    contents = request['contents']
+    if not isinstance(contents, str):
+        return None
+    return singleflight.content_key(call_site, MODEL, _prompt_text(request), request.get('config'))
+
+def _generate(model, request):
+    """One generate_content call. Prompt families take their instructions from the context cache."""
+    if request.get('family'):
+        return prompt_cache.generate(get_client(), request['family'], model, request['contents'], request.get('config'))
+    return get_client().models.generate_content(model=model, contents=request['contents'], config=request.get('config'))
+
+async def _generate_async(model, request):
+    if request.get('family'):
+        return await prompt_cache.generate_async(get_client(), request['family'], model, request['contents'], request.get('config'))
+    return await get_client().aio.models.generate_content(model=model, contents=request['contents'], config=request.get('config'))
+
+def _fetch(call_site, request, parse, fallback, key):
     try:
-        client = genai.Client(api_key=GEMINI_API_KEY)
-        prompt = f"""
+        response = llm_governor.call(call_site, lambda model: _generate(model, request), MODEL)
+        llm_metrics.note_response(response)
+        result = parse(response.text)
+        _store(key, result, response)
+        return result
+    except Exception as e:
+        logger.error(f"Gemini {call_site} failed: {e}")
+        llm_governor.record_fallback(call_site)
+        llm_metrics.note_fallback()
+        return fallback
+
+async def _fetch_async(call_site, request, parse, fallback, key):
+    try:
+        response = await llm_governor.call_async(call_site, lambda model: _generate_async(model, request), MODEL)
+        llm_metrics.note_response(response)
+        result = parse(response.text)
+        _store(key, result, response)
+        return result
+    except Exception as e:
+        logger.error(f"Gemini {call_site} failed: {e}")
+        llm_governor.record_fallback(call_site)
+        llm_metrics.note_fallback()
+        return fallback
+
+def _call(call_site, request, parse, fallback):
+    """
+    Runs one generate_content request (blocking). Returns parse(text) or fallback on any error.
+    Cached answers are returned directly; identical requests already in flight are joined.
+    """
+    key = _cache_key(call_site, request)
+    if key:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            llm_metrics.note_cache_hit()
+            return cached
+    flight = _flight_key(call_site, request)
+    if flight:
+        return singleflight.llm.do(flight, lambda: _fetch(call_site, request, parse, fallback, key))
+    return _fetch(call_site, request, parse, fallback, key)
+
+async def _call_async(call_site, request, parse, fallback):
+    """Async twin of _call, so handlers can await several LLM calls concurrently."""
+    key = _cache_key(call_site, request)
+    if key:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            llm_metrics.note_cache_hit()
+            return cached
+    flight = _flight_key(call_site, request)
+    if flight:
+        return await singleflight.llm.do_async(flight, lambda: _fetch_async(call_site, request, parse, fallback, key))
+    return await _fetch_async(call_site, request, parse, fallback, key)
+
+# --- Copy ---
+def _copy_request(title):
+    prompt = f"""
         Act as a social media news manager. 
         Write a short, engaging 3-line copy for this news headline:
         "{title}"
@@ -46,64 +190,157 @@ def generate_copy(title, source):
         4. No emojis at start of lines.
         5. NEVER mention source names.
         """
-        
-        response = client.models.generate_content(
-            model='gemini-2.0-flash', 
-            contents=prompt
-        )
-        text = response.text.strip()
-        
-        # Strict Cleaning
-        text = clean_text(text)
-        
-        return text
-    except Exception as e:
-        logger.error(f"Gemini generation failed: {e}")
-        return "Sorry, I couldn't generate the copy right now."
+    return {'contents': prompt}
 
-def generate_one_liner(title, context_text="", style="Simple"):
-    """Generates a short <12 words summary for the image footer."""
+def _parse_copy(text):
+    # Strict Cleaning
+    return clean_text(text.strip())
+
+COPY_FALLBACK = "Sorry, I couldn't generate the copy right now."
+
+@llm_metrics.instrumented('copy', MODEL)
+def generate_copy(title, source):
+    """
+    Generates viral social media copy using Gemini.
+    """
     if not GEMINI_API_KEY:
-        return "Breaking News"
-        
+        return "Gemini API Key missing. Check .env"
+    return _call('copy', _copy_request(title), _parse_copy, COPY_FALLBACK)
+
+@llm_metrics.instrumented('copy', MODEL)
+async def generate_copy_async(title, source):
+    if not GEMINI_API_KEY:
+        return "Gemini API Key missing. Check .env"
+    return await _call_async('copy', _copy_request(title), _parse_copy, COPY_FALLBACK)
+
+@llm_metrics.instrumented('copy', MODEL)
+async def stream_copy_async(title, source):
+    """
+    generate_copy over generate_content_stream. Yields the cleaned text shown so far
+    as chunks arrive; the last value yielded is the final copy.
+    """
+    if not GEMINI_API_KEY:
+        yield "Gemini API Key missing. Check .env"
+        return
+
+    request = _copy_request(title)
+    key = _cache_key('copy', request)
+    if key:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            llm_metrics.note_cache_hit()
+            yield cached
+            return
+
+    cleaner = StreamCleaner()
+    shown = ""
+    usage = None
+    start = time.monotonic()
+    first_chunk = None
     try:
-        client = genai.Client(api_key=GEMINI_API_KEY)
-        
-        context_block = ""
-        if context_text and len(context_text) > 10:
-            context_block = f"\nNews Context/Details: {context_text}\n"
-            
-        style_instruction = "Tone: Informative, objective, simple English (NO opinion)."
-        if style.lower() == 'professional':
-            style_instruction = "Tone: Formal, objective, authoritative journalistic standard."
-        elif style.lower() == 'narrative':
-            style_instruction = "Tone: Story-telling, engaging, setting the scene."
-        elif style.lower() == 'casual':
-            style_instruction = "Tone: Witty, conversational, social media slang allowed."
-            
-        prompt = f"""
-        Write a short, detailed subheading for this news.
-        - Rules:
-            1. Find the REASON or KEY DETAIL in the context.
-            2. Do NOT repeat what is already in the Headline.
-            3. {style_instruction}
-            4. Length: 5-10 words.
-            5. NO periods at the end.
-            6. Just give the output, no choices.
+        await llm_governor.bucket.acquire_async()
+        stream = await get_client().aio.models.generate_content_stream(model=MODEL, contents=request['contents'])
+        async for chunk in stream:
+            if first_chunk is None:
+                first_chunk = time.monotonic() - start
+            usage = getattr(chunk, 'usage_metadata', None) or usage
+            visible = cleaner.feed(chunk.text or "")
+            if visible and visible != shown:
+                shown = visible
+                yield visible
+    except Exception as e:
+        logger.error(f"Gemini copy stream failed: {e}")
+        llm_governor.record_stream('copy_stream', time.monotonic() - start, first_chunk, ok=False)
+        llm_metrics.note_fallback()
+        yield COPY_FALLBACK if not cleaner.raw else cleaner.finish()
+        return
+
+    llm_governor.record_stream('copy_stream', time.monotonic() - start, first_chunk, ok=True)
+    llm_metrics.note_usage(usage, MODEL)
+    final = cleaner.finish()
+    if key and final:
+        llm_cache.put(key, final, tokens=getattr(usage, 'total_token_count', 0) or 0)
+    yield final or COPY_FALLBACK
+
+# --- One Liner ---
+ONE_LINER_INSTRUCTIONS = """
+Write a short, detailed subheading for the news you are given.
+- Rules:
+    1. Find the REASON or KEY DETAIL in the context.
+    2. Do NOT repeat what is already in the Headline.
+    3. Use the Tone given with the news.
+    4. Length: 5-10 words.
+    5. NO periods at the end.
+    6. Just give the output, no choices.
+"""
+
+def _one_liner_request(title, context_text="", style="Simple"):
+    context_block = ""
+    context_text = article_extractor.context_for('one_liner', title, context_text)
+    if context_text and len(context_text) > 10:
+        context_block = f"\nNews Context/Details: {context_text}\n"
+        
+    style_instruction = "Tone: Informative, objective, simple English (NO opinion)."
+    if style.lower() == 'professional':
+        style_instruction = "Tone: Formal, objective, authoritative journalistic standard."
+    elif style.lower() == 'narrative':
+        style_instruction = "Tone: Story-telling, engaging, setting the scene."
+    elif style.lower() == 'casual':
+        style_instruction = "Tone: Witty, conversational, social media slang allowed."
+        
+    prompt = f"""
+        {style_instruction}
         
         Headline: '{title}'
         {context_block}
         """
+    return {'contents': prompt, 'family': 'one_liner'}
+
+def _parse_short_text(text):
+    return clean_text(text.strip().replace('"', ''))
+
+@llm_metrics.instrumented('one_liner', MODEL)
+def generate_one_liner(title, context_text="", style="Simple"):
+    """Generates a short <12 words summary for the image footer."""
+    if not GEMINI_API_KEY:
+        return "Breaking News"
+    return _call('one_liner', _one_liner_request(title, context_text, style), _parse_short_text, "Latest Update")
+
+@llm_metrics.instrumented('one_liner', MODEL)
+async def generate_one_liner_async(title, context_text="", style="Simple"):
+    if not GEMINI_API_KEY:
+        return "Breaking News"
+    return await _call_async('one_liner', _one_liner_request(title, context_text, style), _parse_short_text, "Latest Update")
+
+# --- Headline Refinement ---
+REFINE_INSTRUCTIONS = """
+Refine the Input headline into a news update in the requested style.
+
+Rules:
+1. Keep it SHORT (12-15 words max).
+2. KEEP specific names, places, and numbers.
+3. Follow the Style given with the headline.
+4. QUOTES: Put the quote FIRST, then the speaker.
+5. Return ONLY the refined text.
+"""
+
+def _refine_request(title, style="Simple"):
+    style_prompt = "Style: Simple, casual, easy to understand."
+    if style.lower() == 'professional':
+        style_prompt = "Style: Formal, precise, executive summary style."
+    elif style.lower() == 'narrative':
+        style_prompt = "Style: Compelling, story-driven, emotional hook."
+    elif style.lower() == 'casual':
+        style_prompt = "Style: Catchy, witty, viral social media style (Gen Z friendly)."
+    
+    prompt = f"""
+        Requested style: {style}. {style_prompt}
         
-        response = client.models.generate_content(
-            model='gemini-2.0-flash', 
-            contents=prompt
-        )
-        text = response.text.strip().replace('"', '')
-        return clean_text(text)
-    except Exception:
-        return "Latest Update"
+        Input: "{title}"
+        """
+    return {'contents': prompt, 'family': 'refine'}
 
+@llm_metrics.instrumented('refine', MODEL)
 def refine_headline(title, style="Simple"):
     """
     Refines the raw RSS headline for social media.
@@ -111,163 +348,378 @@ def refine_headline(title, style="Simple"):
     """
     if not GEMINI_API_KEY:
         return title 
-        
-    try:
-        client = genai.Client(api_key=GEMINI_API_KEY)
-        
-        style_prompt = "Style: Simple, casual, easy to understand."
-        if style.lower() == 'professional':
-            style_prompt = "Style: Formal, precise, executive summary style."
-        elif style.lower() == 'narrative':
-            style_prompt = "Style: Compelling, story-driven, emotional hook."
-        elif style.lower() == 'casual':
-            style_prompt = "Style: Catchy, witty, viral social media style (Gen Z friendly)."
-        
-        prompt = f"""
-        Refine this headline into a {style} news update.
-        
-        Input: "{title}"
-        
-        Rules:
-        1. Keep it SHORT (12-15 words max).
-        2. KEEP specific names, places, and numbers.
-        3. {style_prompt}
-        4. QUOTES: Put the quote FIRST, then the speaker.
-        5. Return ONLY the refined text.
-        """
-        
-        response = client.models.generate_content(
-            model='gemini-2.0-flash', 
-            contents=prompt
-        )
-        text = response.text.strip().replace('"', '')
-        return clean_text(text)
-    except Exception as e:
-        logger.error(f"Headline refinement failed: {e}")
+    return _call('refine', _refine_request(title, style), _parse_short_text, title)
+
+@llm_metrics.instrumented('refine', MODEL)
+async def refine_headline_async(title, style="Simple"):
+    if not GEMINI_API_KEY:
         return title
+    return await _call_async('refine', _refine_request(title, style), _parse_short_text, title)
+
+# --- Variations ---
+VARIATIONS_INSTRUCTIONS = """
+I need 4 different styles of Social Media updates for the news I give you.
+
+Styles:
+1. Professional: Formal, executive summary.
+2. Narrative: Story-telling, engaging.
+3. Simple: Direct, 5-year-old understandable.
+4. Casual: Witty, social media vibes.
 
+Format your response strictly as JSON:
+{
+    "Professional": { "headline": "...", "sub": "..." },
+    "Narrative": { "headline": "...", "sub": "..." },
+    "Simple": { "headline": "...", "sub": "..." },
+    "Casual": { "headline": "...", "sub": "..." }
+}
+
+Rules:
+- Headlines: Max 12 words.
+- Subheadings: Max 8 words, no periods.
+- No Source Names.
+"""
+
+def _variations_request(title, context_text=""):
+    prompt = f"""
+        Headline: "{title}"
+        Context: "{article_extractor.context_for('variations', title, context_text)}"
+        """
+    return {'contents': prompt, 'family': 'variations', 'config': {'response_mime_type': 'application/json'}}
+
+def _parse_json(text):
+    text = text.strip()
+    
+    # Cleanup Markdown Code Blocks if present
+    if text.startswith('```json'):
+        text = text[7:]
+    if text.endswith('```'):
+        text = text[:-3]
+    text = text.strip()
+    
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        logger.error(f"JSON Parse Error. Raw Text: {text}")
+        return {}
+
+STYLES = ['Professional', 'Narrative', 'Simple', 'Casual']
+
+def variation_key(title):
+    """Variation cache key for one news item (its headline)."""
+    return llm_cache.make_key('variations_item', MODEL, title)
+
+def get_cached_variations(title):
+    if not llm_cache.is_enabled('variations'):
+        return None
+    cached = llm_cache.get(variation_key(title))
+    if cached:
+        llm_metrics.note_cache_hit()
+    return cached
+
+def _remember_variations(title, variations, tokens=0):
+    """Shares one item's variations with batch / precompute readers; pass _valid_variations output only."""
+    if variations and llm_cache.is_enabled('variations'):
+        llm_cache.put(variation_key(title), variations, tokens=tokens)
+
+@llm_metrics.instrumented('variations', MODEL)
 def generate_all_variations(title, context_text=""):
     """Generates 4 variations of Headline+Subheading in one go."""
     if not GEMINI_API_KEY:
         return {}
-        
-    try:
-        client = genai.Client(api_key=GEMINI_API_KEY)
-        
-        prompt = f"""
-        I need 4 different styles of Social Media updates for this news.
-        
-        Headline: "{title}"
-        Context: "{context_text[:500]}"
-        
-        Styles:
-        1. Professional: Formal, executive summary.
-        2. Narrative: Story-telling, engaging.
-        3. Simple: Direct, 5-year-old understandable.
-        4. Casual: Witty, social media vibes.
-        
-        Format your response strictly as JSON:
-        {{
-            "Professional": {{ "headline": "...", "sub": "..." }},
-            "Narrative": {{ "headline": "...", "sub": "..." }},
-            "Simple": {{ "headline": "...", "sub": "..." }},
-            "Casual": {{ "headline": "...", "sub": "..." }}
-        }}
-        
-        Rules:
-        - Headlines: Max 12 words.
-        - Subheadings: Max 8 words, no periods.
-        - No Source Names.
-        """
-        
-        response = client.models.generate_content(
-            model='gemini-2.0-flash', 
-            contents=prompt,
-            config={'response_mime_type': 'application/json'}
-        )
-        import json
-        text = response.text.strip()
-        
-        # Cleanup Markdown Code Blocks if present
-        if text.startswith('```json'):
-            text = text[7:]
-        if text.endswith('```'):
-            text = text[:-3]
-        text = text.strip()
-        
-        try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            logger.error(f"JSON Parse Error. Raw Text: {text}")
-            return {}
-            
-    except Exception as e:
-        logger.error(f"Variation generation failed: {e}")
+    cached = get_cached_variations(title)
+    if cached:
+        return cached
+    variations = _call('variations', _variations_request(title, context_text), _parse_json, {})
+    # A partial or malformed reply is still returned, but never shared through the item cache
+    _remember_variations(title, _valid_variations(variations))
+    return variations
+
+@llm_metrics.instrumented('variations', MODEL)
+async def generate_all_variations_async(title, context_text=""):
+    if not GEMINI_API_KEY:
         return {}
+    cached = get_cached_variations(title)
+    if cached:
+        return cached
+    variations = await _call_async('variations', _variations_request(title, context_text), _parse_json, {})
+    # A partial or malformed reply is still returned, but never shared through the item cache
+    _remember_variations(title, _valid_variations(variations))
+    return variations
 
-def verify_image_usability(image_url, related_headline=None):
+# --- Batched Variations ---
+VARIATIONS_BATCH_INSTRUCTIONS = """
+I need 4 different styles of Social Media updates for EACH of the numbered news items I give you.
+
+Styles:
+1. Professional: Formal, executive summary.
+2. Narrative: Story-telling, engaging.
+3. Simple: Direct, 5-year-old understandable.
+4. Casual: Witty, social media vibes.
+
+Format your response strictly as JSON, one entry per news item, using its number as "id":
+{
+    "items": [
+        {
+            "id": 0,
+            "Professional": { "headline": "...", "sub": "..." },
+            "Narrative": { "headline": "...", "sub": "..." },
+            "Simple": { "headline": "...", "sub": "..." },
+            "Casual": { "headline": "...", "sub": "..." }
+        }
+    ]
+}
+
+Rules:
+- Headlines: Max 12 words.
+- Subheadings: Max 8 words, no periods.
+- No Source Names.
+"""
+
+def _batch_request(items):
+    news_block = "\n".join(
+        f'{i}. Headline: "{title}"\n   Context: "{article_extractor.context_for("variations_batch", title, context)}"'
+        for i, (title, context) in enumerate(items)
+    )
+    prompt = f"""
+        {len(items)} news items:
+        
+        {news_block}
+        """
+    return {'contents': prompt, 'family': 'variations_batch', 'config': {'response_mime_type': 'application/json'}}
+
+prompt_cache.register('one_liner', ONE_LINER_INSTRUCTIONS)
+prompt_cache.register('refine', REFINE_INSTRUCTIONS)
+prompt_cache.register('variations', VARIATIONS_INSTRUCTIONS)
+prompt_cache.register('variations_batch', VARIATIONS_BATCH_INSTRUCTIONS)
+
+def _valid_variations(entry):
+    """Per-item schema check: all 4 styles with non-empty headline + sub strings."""
+    if not isinstance(entry, dict):
+        return None
+    variations = {}
+    for style in STYLES:
+        var = entry.get(style)
+        if not isinstance(var, dict):
+            return None
+        headline, sub = var.get('headline'), var.get('sub')
+        if not isinstance(headline, str) or not headline.strip() or not isinstance(sub, str):
+            return None
+        variations[style] = {'headline': clean_text(headline.strip()), 'sub': clean_text(sub.strip())}
+    return variations
+
+def _split_batch(items, response_text, total_tokens):
+    """Returns ({index: variations} for valid items, [indexes that failed])."""
+    data = _parse_json(response_text) if response_text else {}
+    entries = data.get('items', []) if isinstance(data, dict) else []
+    per_item_tokens = total_tokens // max(1, len(items))
+
+    good = {}
+    for entry in entries:
+        idx = entry.get('id') if isinstance(entry, dict) else None
+        if not isinstance(idx, int) or not 0 <= idx < len(items) or idx in good:
+            continue
+        variations = _valid_variations(entry)
+        if variations:
+            good[idx] = variations
+            _remember_variations(items[idx][0], variations, tokens=per_item_tokens)
+    return good, [i for i in range(len(items)) if i not in good]
+
+def _next_batches(items, failed):
     """
-    Uses Gemini Vision to check if an image is suitable for a news background.
-    If related_headline is provided, checks if the image matches the topic.
+    Split-and-retry plan: a partial failure retries just the failed items,
+    a total failure splits the batch in half. Single items are not retried.
     """
-    if not GEMINI_API_KEY or not image_url:
-        return False
-        
-    try:
-        # We need the image data
-        import requests
-        from PIL import Image
-        import io
-        
-        # Robust Headers to mimic browser
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8',
-            'Referer': 'https://www.google.com/'
-        }
-        
+    if not failed or len(items) == 1:
+        return []
+    if len(failed) < len(items):
+        return [[items[i] for i in failed]]
+    mid = len(items) // 2
+    return [items[:mid], items[mid:]]
+
+def _batch_usage(response):
+    usage = getattr(response, 'usage_metadata', None)
+    return getattr(usage, 'total_token_count', 0) or 0
+
+@llm_metrics.instrumented('variations_batch', MODEL)
+def generate_variations_batch(items):
+    """
+    Generates style variations for (title, context) items, VARIATION_BATCH_SIZE per request.
+    Valid items go to the variation cache. Returns {title: variations} for those
+    that succeeded (cached ones included); failures are simply absent.
+    """
+    results = {}
+    if not GEMINI_API_KEY:
+        return results
+    pending = []
+    for title, context in items:
+        cached = get_cached_variations(title)
+        if cached:
+            results[title] = cached
+        else:
+            pending.append((title, context))
+
+    queue = [pending[i:i + VARIATION_BATCH_SIZE] for i in range(0, len(pending), VARIATION_BATCH_SIZE)]
+    while queue:
+        batch = queue.pop(0)
         try:
-            resp = requests.get(image_url, headers=headers, timeout=10)
+            request = _batch_request(batch)
+            response = llm_governor.call('variations_batch', lambda model: _generate(model, request), MODEL)
+            llm_metrics.note_response(response)
+            good, failed = _split_batch(batch, response.text, _batch_usage(response))
         except Exception as e:
-            logger.warning(f"Download Error for {image_url}: {e}")
-            return False
+            logger.error(f"Gemini variations batch of {len(batch)} failed: {e}")
+            good, failed = {}, list(range(len(batch)))
+        for idx, variations in good.items():
+            results[batch[idx][0]] = variations
+        queue.extend(_next_batches(batch, failed))
+    return results
 
-        if resp.status_code != 200:
-            logger.warning(f"Image download failed {resp.status_code}: {image_url}")
-            return False
-        
-        content_len = len(resp.content)
-        content_type = resp.headers.get('Content-Type', '')
-        logger.info(f"Downloaded {content_len} bytes. Type: {content_type}")
-        
-        # 1. Technical Validation
-        if content_len < 5500: # 5.5KB limit (Gradient is ~40KB, but small icons are <2KB)
-            logger.warning(f"Rejecting: File too small ({content_len} bytes)")
-            return False
-            
-        if 'text/html' in content_type.lower():
-            logger.warning("Rejecting: Content is HTML")
-            return False
+@llm_metrics.instrumented('variations_batch', MODEL)
+async def generate_variations_batch_async(items):
+    results = {}
+    if not GEMINI_API_KEY:
+        return results
+    pending = []
+    for title, context in items:
+        cached = get_cached_variations(title)
+        if cached:
+            results[title] = cached
+        else:
+            pending.append((title, context))
 
+    queue = [pending[i:i + VARIATION_BATCH_SIZE] for i in range(0, len(pending), VARIATION_BATCH_SIZE)]
+    while queue:
+        batch = queue.pop(0)
         try:
-            image_part = Image.open(io.BytesIO(resp.content))
-            width, height = image_part.size
-            if width < 250 or height < 200:
-                logger.warning(f"Rejecting: Dimensions too small ({width}x{height})")
-                return False
+            request = _batch_request(batch)
+            response = await llm_governor.call_async('variations_batch', lambda model: _generate_async(model, request), MODEL)
+            llm_metrics.note_response(response)
+            good, failed = _split_batch(batch, response.text, _batch_usage(response))
         except Exception as e:
-            logger.warning(f"Rejecting: Invalid Image Data - {e}")
-            return False
-            
-        # 2. Analyze with Gemini (Visual Verification)
-        client = genai.Client(api_key=GEMINI_API_KEY)
+            logger.error(f"Gemini variations batch of {len(batch)} failed: {e}")
+            good, failed = {}, list(range(len(batch)))
+        for idx, variations in good.items():
+            results[batch[idx][0]] = variations
+        queue.extend(_next_batches(batch, failed))
+    return results
+
+# --- Vision Verification ---
+IMAGE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8',
+    'Referer': 'https://www.google.com/'
+}
+
+def download_candidate_image(image_url):
+    """
+    Downloads an image and runs the cheap technical checks.
+    Returns the image reduced for vision (see reduce_for_vision), or None if it should be rejected.
+    """
+    import requests
+
+    try:
+        resp = requests.get(image_url, headers=IMAGE_HEADERS, timeout=10)
+    except Exception as e:
+        logger.warning(f"Download Error for {image_url}: {e}")
+        return None
+
+    if resp.status_code != 200:
+        logger.warning(f"Image download failed {resp.status_code}: {image_url}")
+        return None
+    
+    content_len = len(resp.content)
+    content_type = resp.headers.get('Content-Type', '')
+    logger.info(f"Downloaded {content_len} bytes. Type: {content_type}")
+    
+    # 1. Technical Validation
+    if content_len < 5500: # 5.5KB limit (Gradient is ~40KB, but small icons are <2KB)
+        logger.warning(f"Rejecting: File too small ({content_len} bytes)")
+        return None
         
-        # visual context check
-        context_prompt = ""
-        if related_headline:
-            context_prompt = f"3. RELEVANCE: Is this image related to the news headline: '{related_headline}'? If it's a generic unrelated stock photo or completely wrong topic, Answer NO."
-            
-        prompt = f"""
+    if 'text/html' in content_type.lower():
+        logger.warning("Rejecting: Content is HTML")
+        return None
+
+    try:
+        image_part = Image.open(io.BytesIO(resp.content))
+        width, height = image_part.size
+        if width < 250 or height < 200:
+            logger.warning(f"Rejecting: Dimensions too small ({width}x{height})")
+            return None
+        return reduce_for_vision(image_part)
+    except Exception as e:
+        logger.warning(f"Rejecting: Invalid Image Data - {e}")
+        return None
+
+def reduce_for_vision(image, max_edge=None):
+    """
+    Decodes at reduced size (JPEG draft mode) and shrinks to max_edge on the long side.
+    The original dimensions are kept in info['source_size'] for the resolution checks.
+    """
+    max_edge = max_edge or VISION_MAX_EDGE
+    source_size = image.size
+    try:
+        image.draft('RGB', (max_edge, max_edge))
+    except Exception:
+        pass # Not a JPEG (or an odd mode): decode in full
+    image = image.convert('RGB')
+    image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+    image.info['source_size'] = source_size
+    return image
+
+def vision_payload(image, quality=None):
+    """JPEG bytes sent to the vision model (the SDK would otherwise upload a lossless PNG)."""
+    buf = io.BytesIO()
+    image.convert('RGB').save(buf, format='JPEG', quality=quality or VISION_JPEG_QUALITY, optimize=True)
+    return buf.getvalue()
+
+def prepare_candidate(image_url, related_headline=None):
+    """
+    Everything before the vision call: verdict cache by URL, download, verdict cache
+    by perceptual hash, NumPy pre-filter (src/image_scoring.py).
+    Returns {'verdict': (ok, reason)} when settled without vision,
+    else {'verdict': None, 'image', 'phash', 'score'}.
+    """
+    topic = verdict_cache.topic_key(related_headline)
+    verdict = verdict_cache.lookup(url=image_url, topic=topic)
+    if verdict:
+        return {'verdict': verdict}
+
+    image_part = download_candidate_image(image_url)
+    if image_part is None:
+        return {'verdict': (False, "download rejected")}
+
+    # A re-hosted copy of an image we already judged
+    image_hash = verdict_cache.phash(image_part)
+    verdict = verdict_cache.lookup(image_hash=image_hash, topic=topic)
+    if verdict:
+        verdict_cache.record(image_url, image_hash, topic, *verdict)
+        return {'verdict': verdict}
+
+    result = image_scoring.analyze(image_part)
+    if result['reject']:
+        logger.warning(f"Rejecting locally: {result['reject']} {image_url}")
+        verdict_cache.record(image_url, image_hash, verdict_cache.ANY_TOPIC, False, result['reject'])
+        return {'verdict': (False, result['reject'])}
+    return {'verdict': None, 'image': image_part, 'phash': image_hash, 'score': result['score']}
+
+def _settle(verdict, image_url, image_hash, related_headline):
+    # None = the vision call itself failed; not worth remembering
+    if verdict is None:
+        return False
+    ok, reason = verdict
+    if image_url or image_hash:
+        verdict_cache.record(image_url, image_hash, verdict_cache.topic_key(related_headline), ok, reason)
+    return ok
+
+def _vision_request(image_part, related_headline=None):
+    # visual context check
+    context_prompt = ""
+    if related_headline:
+        context_prompt = f"3. RELEVANCE: Is this image related to the news headline: '{related_headline}'? If it's a generic unrelated stock photo or completely wrong topic, Answer NO."
+        
+    prompt = f"""
         Analyze this image for a news background.
         
         Checks:
@@ -281,20 +733,56 @@ def verify_image_usability(image_url, related_headline=None):
         NOTE: Maps, Charts, and Infographics are ACCEPTABLE if relevant.
         NOTE: Generic photos (e.g. Traffic for 'Traffic Jam', Smog for 'Pollution') are ACCEPTABLE.
         """
-        
-        response = client.models.generate_content(
-            model='gemini-2.0-flash', 
-            contents=[prompt, image_part]
-        )
-        
-        clean_resp = response.text.upper().strip()
+    payload = types.Part.from_bytes(data=vision_payload(image_part), mime_type='image/jpeg')
+    return {'contents': [prompt, payload]}
+
+def _vision_parser(related_headline):
+    def parse(text):
+        clean_resp = text.upper().strip()
         logger.info(f"Vision Verification for '{related_headline or 'Image'}': {clean_resp}")
+        return "YES" in clean_resp, clean_resp
+    return parse
+
+@llm_metrics.instrumented('vision', MODEL)
+def verify_image_usability(image_url, related_headline=None):
+    """
+    Uses Gemini Vision to check if an image is suitable for a news background.
+    If related_headline is provided, checks if the image matches the topic.
+    """
+    if not GEMINI_API_KEY or not image_url:
+        return False
         
-        return "YES" in clean_resp
+    candidate = prepare_candidate(image_url, related_headline)
+    if candidate['verdict']:
+        return candidate['verdict'][0]
         
-    except Exception as e:
-        logger.error(f"Vision verification failed: {e}")
+    # 2. Analyze with Gemini (Visual Verification)
+    verdict = _call('vision', _vision_request(candidate['image'], related_headline), _vision_parser(related_headline), None)
+    return _settle(verdict, image_url, candidate['phash'], related_headline)
+
+@llm_metrics.instrumented('vision', MODEL)
+async def verify_image_usability_async(image_url, related_headline=None):
+    if not GEMINI_API_KEY or not image_url:
+        return False
+
+    # Many users verifying the same candidate share one download + vision call
+    key = singleflight.content_key('vision', image_url, related_headline)
+    return await singleflight.llm.do_async(key, lambda: _verify_async(image_url, related_headline))
+
+async def _verify_async(image_url, related_headline):
+    candidate = await asyncio.to_thread(prepare_candidate, image_url, related_headline)
+    if candidate['verdict']:
+        return candidate['verdict'][0]
+        
+    return await verify_downloaded_image_async(candidate['image'], related_headline, image_url, candidate['phash'])
+
+@llm_metrics.instrumented('vision', MODEL)
+async def verify_downloaded_image_async(image_part, related_headline=None, image_url=None, image_hash=None):
+    """Vision check for a candidate prepared by prepare_candidate. The verdict is cached."""
+    if not GEMINI_API_KEY:
         return False
+    verdict = await _call_async('vision', _vision_request(image_part, related_headline), _vision_parser(related_headline), None)
+    return _settle(verdict, image_url, image_hash, related_headline)
 
 def save_metadata(title, source, data_dict):
     """Saves metadata to the structured workspace."""
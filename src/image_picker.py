@@ -1,10 +1,63 @@
 
+import asyncio
+import io
 import logging
 import random
+import requests
+from PIL import Image
 from src import image_searcher
 
 logger = logging.getLogger(__name__)
 
+PREVIEW_MAX_EDGE = 640
+PREVIEW_QUALITY = 80
+DOWNLOAD_TIMEOUT = 8
+DOWNLOAD_MAX_BYTES = 15 * 1024 * 1024
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'image/avif,image/webp,image/apng,image/*,*/*;q=0.8',
+    'Referer': 'https://www.google.com/'
+}
+
+def download_preview(url, max_edge=PREVIEW_MAX_EDGE):
+    """
+    Downloads a candidate and returns a small JPEG preview (bytes), or None if the
+    link is dead, not an image, or too small to use as a background.
+    """
+    try:
+        resp = requests.get(url, headers=HEADERS, timeout=DOWNLOAD_TIMEOUT, stream=True)
+        if resp.status_code != 200:
+            logger.info(f"Preview rejected ({resp.status_code}): {url}")
+            return None
+        if 'text/html' in resp.headers.get('Content-Type', '').lower():
+            logger.info(f"Preview rejected (HTML): {url}")
+            return None
+
+        data = bytearray()
+        for chunk in resp.iter_content(64 * 1024):
+            data.extend(chunk)
+            if len(data) > DOWNLOAD_MAX_BYTES:
+                logger.info(f"Preview rejected (too large): {url}")
+                return None
+
+        img = Image.open(io.BytesIO(data))
+        if img.width < 250 or img.height < 200:
+            logger.info(f"Preview rejected ({img.width}x{img.height}): {url}")
+            return None
+
+        # JPEG can decode at reduced scale directly
+        img.draft('RGB', (max_edge, max_edge))
+        img = img.convert('RGB')
+        img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+        out = io.BytesIO()
+        img.save(out, format='JPEG', quality=PREVIEW_QUALITY)
+        return out.getvalue()
+    except Exception as e:
+        logger.info(f"Preview rejected ({e}): {url}")
+        return None
+
 class ImagePicker:
     def __init__(self, query):
         self.query = query
@@ -29,17 +82,13 @@ class ImagePicker:
             # Page 0: Mix of Standard + Pinterest
             # Page 1+: Dig deeper
             
-            # Fetch Generic
-            new_generic = image_searcher.search_google_images(
-                self.query, 
-                offset=self.page * 10
-            ) or []
-            
-            # Fetch Pinterest (Explicitly add 'site:pinterest.com')
-            new_pinterest = image_searcher.search_google_images(
-                f"{self.query} site:pinterest.com", 
-                offset=self.page * 10
-            ) or []
+            # Fetch Generic + Pinterest (Explicitly add 'site:pinterest.com') concurrently
+            new_generic, new_pinterest = await asyncio.gather(
+                image_searcher.search_google_images_async(self.query, offset=self.page * 10),
+                image_searcher.search_google_images_async(f"{self.query} site:pinterest.com", offset=self.page * 10)
+            )
+            new_generic = new_generic or []
+            new_pinterest = new_pinterest or []
             
             # Interleave them for variety: [Gen, Pin, Gen, Pin...]
             mixed = []
@@ -62,6 +111,21 @@ class ImagePicker:
             
         return candidates[:count]
 
+    async def prepare_previews(self, urls):
+        """
+        Validates + downscales candidates in parallel.
+        Broken URLs are dropped from the picker (so global indices only cover usable images).
+        Returns [(url, preview_jpeg_bytes)] in the original order.
+        """
+        previews = await asyncio.gather(*(asyncio.to_thread(download_preview, url) for url in urls))
+        valid = [(url, data) for url, data in zip(urls, previews) if data]
+
+        bad = {url for url, data in zip(urls, previews) if not data}
+        if bad:
+            self.cached_images = [u for u in self.cached_images if u not in bad]
+            logger.info(f"Dropped {len(bad)} broken image candidates")
+        return valid
+
     def get_image_at_index(self, index):
         """Returns the image URL at a specific global index (0-based)"""
         if 0 <= index < len(self.cached_images):
@@ -0,0 +1,110 @@
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CANVAS_SIZE = (1080, 1350)
+ANALYSIS_EDGE = 256 # long edge of the downscaled copy the checks run on
+
+# Clear failures (rejected without a vision call)
+MIN_WIDTH, MIN_HEIGHT = 250, 200
+MAX_LETTERBOX = 0.25   # fraction of rows/cols that are flat bars
+MIN_SHARPNESS = 40     # Laplacian variance at ANALYSIS_EDGE
+MIN_ENTROPY = 3.0      # bits over a 512-bin colour histogram
+MAX_TEXT_DENSITY = 0.3 # high-contrast edge pixels / all pixels
+
+stats = {'analyzed': 0, 'rejected': 0}
+_stats_lock = threading.Lock()
+
+def _reduced(image):
+    small = image.copy()
+    small.thumbnail((ANALYSIS_EDGE, ANALYSIS_EDGE))
+    return np.asarray(small.convert('RGB'), dtype=np.float32)
+
+def aspect_fit(width, height):
+    """Share of the image kept when cover-cropping it to the canvas aspect (1.0 = perfect fit)."""
+    ratio = width / height
+    target = CANVAS_SIZE[0] / CANVAS_SIZE[1]
+    return min(ratio / target, target / ratio)
+
+def letterbox_fraction(rgb):
+    """Fraction of rows or columns (whichever is larger) that are flat bars at the borders."""
+    gray = rgb.mean(axis=2)
+
+    def border_run(std_along):
+        flat = std_along < 4
+        n = len(flat)
+        lead = np.argmin(flat) if not flat.all() else n
+        trail = np.argmin(flat[::-1]) if not flat.all() else n
+        return min(n, lead + trail) / n
+
+    return float(max(border_run(gray.std(axis=1)), border_run(gray.std(axis=0))))
+
+def laplacian_variance(gray):
+    lap = (gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:] - 4 * gray[1:-1, 1:-1])
+    return float(lap.var())
+
+def colour_entropy(rgb):
+    quantized = (rgb // 32).astype(np.int32) # 8 levels per channel
+    bins = quantized[..., 0] * 64 + quantized[..., 1] * 8 + quantized[..., 2]
+    counts = np.bincount(bins.ravel(), minlength=512).astype(np.float64)
+    p = counts[counts > 0] / counts.sum()
+    return float(-(p * np.log2(p)).sum())
+
+def text_density(gray):
+    """Share of pixels on strong edges; text and line art are dense with them, photos are not."""
+    gx = np.abs(np.diff(gray, axis=1))[:-1, :]
+    gy = np.abs(np.diff(gray, axis=0))[:, :-1]
+    return float(((gx + gy) > 80).mean())
+
+def analyze(image):
+    """
+    Cheap local checks for a candidate background (PIL image).
+    Works on the reduced vision copy too: info['source_size'] holds the original size.
+    Returns {'score': 0-1, 'reject': reason or None, metrics...}.
+    """
+    width, height = image.info.get('source_size', image.size)
+    result = {'width': width, 'height': height, 'reject': None}
+
+    if width < MIN_WIDTH or height < MIN_HEIGHT:
+        result.update(score=0.0, reject=f"too small ({width}x{height})")
+        _count(True)
+        return result
+
+    rgb = _reduced(image)
+    gray = rgb.mean(axis=2)
+    result['fit'] = aspect_fit(width, height)
+    result['letterbox'] = letterbox_fraction(rgb)
+    result['sharpness'] = laplacian_variance(gray)
+    result['entropy'] = colour_entropy(rgb)
+    result['text_density'] = text_density(gray)
+
+    if result['entropy'] < MIN_ENTROPY:
+        result['reject'] = f"flat graphic (entropy {result['entropy']:.1f})"
+    elif result['letterbox'] > MAX_LETTERBOX:
+        result['reject'] = f"letterboxed ({result['letterbox']:.0%} bars)"
+    elif result['sharpness'] < MIN_SHARPNESS:
+        result['reject'] = f"blurry (laplacian {result['sharpness']:.0f})"
+    elif result['text_density'] > MAX_TEXT_DENSITY:
+        result['reject'] = f"text-heavy ({result['text_density']:.0%} edges)"
+
+    resolution = min(1.0, (width * height) / (CANVAS_SIZE[0] * CANVAS_SIZE[1]))
+    sharp = min(1.0, result['sharpness'] / 500)
+    entropy = min(1.0, result['entropy'] / 8)
+    text_penalty = min(1.0, result['text_density'] / MAX_TEXT_DENSITY)
+    result['score'] = 0.0 if result['reject'] else round(
+        0.3 * resolution + 0.2 * result['fit'] + 0.25 * sharp + 0.15 * entropy + 0.1 * (1 - text_penalty), 4)
+
+    _count(bool(result['reject']))
+    return result
+
+def _count(rejected):
+    with _stats_lock:
+        stats['analyzed'] += 1
+        if rejected:
+            stats['rejected'] += 1
+
+def report():
+    return f"Local image pre-filter: {stats['rejected']}/{stats['analyzed']} rejected (vision calls saved)"
@@ -1,6 +1,8 @@
 import os
+import asyncio
 import logging
 from serpapi import GoogleSearch
+from src import singleflight
 
 logger = logging.getLogger(__name__)
 
@@ -98,3 +100,12 @@ def search_google_images(query, offset=0):
     except Exception as e:
         logger.error(f"SerpApi search failed details: {e}")
         return []
+
+async def search_google_images_async(query, offset=0):
+    """
+    Non-blocking search_google_images. Identical searches already running
+    (e.g. many users opening the same story) share one SerpApi call.
+    """
+    key = singleflight.content_key('serpapi', query, offset)
+    results = await singleflight.search.do_async(key, lambda: asyncio.to_thread(search_google_images, query, offset))
+    return list(results) if results else results
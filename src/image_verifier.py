@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import time
+
+from src import gemini_utils
+from src.config import IMAGE_VERIFY_FAN_OUT, IMAGE_VERIFY_DEADLINE
+
+logger = logging.getLogger(__name__)
+
+# Share of the deadline spent downloading + scoring before vision checks start
+DOWNLOAD_SHARE = 0.35
+
+async def _prepare(url, headline):
+    """(url, candidate) — see gemini_utils.prepare_candidate (verdict caches + local scoring)."""
+    return url, await asyncio.to_thread(gemini_utils.prepare_candidate, url, headline)
+
+async def _gather_until(tasks, timeout):
+    """Results of the tasks finished within `timeout`; the rest are cancelled."""
+    if not tasks:
+        return []
+    done, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+    results = []
+    for task in done:
+        if task.exception() is not None:
+            logger.warning(f"Image download failed: {task.exception()}")
+            continue
+        results.append(task.result())
+    return results
+
+async def pick_first_good(urls, headline=None, fan_out=IMAGE_VERIFY_FAN_OUT, deadline=IMAGE_VERIFY_DEADLINE):
+    """
+    1. Prepares all candidates concurrently: cached verdicts (URL / perceptual hash),
+       download and local scoring (src/image_scoring.py). Clear failures are dropped
+       without a vision call; an image already judged good wins right away.
+    2. Vision-checks the survivors best score first, at most `fan_out` at a time.
+       The first one that passes wins and the remaining checks are cancelled.
+    If nothing passes within `deadline` seconds, returns the best-scoring survivor
+    not rejected by vision, or None.
+    """
+    if not urls:
+        return None
+
+    start = time.time()
+    download_sem = asyncio.Semaphore(max(fan_out, 5))
+
+    async def fetch(url):
+        async with download_sem:
+            return await _prepare(url, headline)
+
+    fetched = await _gather_until([asyncio.ensure_future(fetch(url)) for url in dict.fromkeys(urls)],
+                                  deadline * DOWNLOAD_SHARE)
+    order = {url: i for i, url in enumerate(urls)}
+    for url, candidate in sorted(fetched, key=lambda r: order[r[0]]):
+        if candidate['verdict'] and candidate['verdict'][0]:
+            logger.info(f"Image already verified (cached): {url}")
+            return url
+
+    survivors = sorted(((url, c) for url, c in fetched if c['verdict'] is None), key=lambda r: r[1]['score'], reverse=True)
+    if not survivors:
+        logger.warning("No usable image among candidates.")
+        return None
+
+    scores = {url: c['score'] for url, c in survivors} # not (yet) rejected by vision
+    vision_sem = asyncio.Semaphore(fan_out)
+
+    async def check(url, candidate):
+        async with vision_sem:
+            ok = await gemini_utils.verify_downloaded_image_async(candidate['image'], headline, url, candidate['phash'])
+        if not ok:
+            scores.pop(url, None)
+        return url, ok
+
+    # Created in score order; the semaphore admits them in that order
+    pending = {asyncio.ensure_future(check(url, candidate)) for url, candidate in survivors}
+    try:
+        while pending:
+            remaining = deadline - (time.time() - start)
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    logger.warning(f"Image check failed: {task.exception()}")
+                    continue
+                url, ok = task.result()
+                if ok:
+                    logger.info(f"Image verified in {time.time() - start:.1f}s: {url}")
+                    return url
+    finally:
+        for task in pending:
+            task.cancel()
+
+    if scores:
+        best = max(scores, key=scores.get)
+        logger.info(f"No image verified within {deadline}s, using best candidate: {best}")
+        return best
+    logger.warning("No candidate passed vision verification.")
+    return None
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from src import database as db
+from src.config import LLM_CACHE_TTL, LLM_CACHE_DISABLED, LLM_CACHE_MEMORY_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+_lru = OrderedDict()  # key -> (value, tokens, expires_at)
+_lock = threading.Lock()
+stats = {'hits': 0, 'misses': 0, 'tokens_saved': 0}
+
+def normalize_prompt(prompt):
+    """
+    Whitespace insensitive, so re-spaced titles share an entry. Case is kept:
+    "US" and "us", tickers and proper nouns can change the answer.
+    """
+    return re.sub(r'\s+', ' ', prompt).strip()
+
+def make_key(function, model, prompt):
+    digest = hashlib.sha256(normalize_prompt(prompt).encode('utf-8')).hexdigest()
+    return f"{function}:{model}:{digest}"
+
+def is_enabled(function):
+    return LLM_CACHE_TTL > 0 and function not in LLM_CACHE_DISABLED
+
+def get(key):
+    """Returns the cached value or None. Memory first, then SQLite."""
+    now = time.time()
+    with _lock:
+        entry = _lru.get(key)
+        if entry and entry[2] > now:
+            _lru.move_to_end(key)
+            stats['hits'] += 1
+            stats['tokens_saved'] += entry[1]
+            return entry[0]
+        if entry:
+            del _lru[key]
+
+    conn = db.get_connection()
+    try:
+        c = conn.cursor()
+        c.execute('SELECT value, tokens, expires_at FROM llm_cache WHERE cache_key = ? AND expires_at > ?', (key, now))
+        row = c.fetchone()
+    except Exception as e:
+        logger.warning(f"LLM cache lookup failed: {e}")
+        row = None
+    finally:
+        conn.close()
+
+    if not row:
+        stats['misses'] += 1
+        return None
+
+    value = json.loads(row[0])
+    _remember(key, value, row[1] or 0, row[2])
+    stats['hits'] += 1
+    stats['tokens_saved'] += row[1] or 0
+    return value
+
+def _remember(key, value, tokens, expires_at):
+    with _lock:
+        _lru[key] = (value, tokens, expires_at)
+        _lru.move_to_end(key)
+        while len(_lru) > LLM_CACHE_MEMORY_ENTRIES:
+            _lru.popitem(last=False)
+
+def put(key, value, tokens=0, ttl=None):
+    """Stores a JSON-serialisable response. tokens = what a hit saves."""
+    expires_at = time.time() + (ttl if ttl is not None else LLM_CACHE_TTL)
+    _remember(key, value, tokens, expires_at)
+    conn = db.get_connection()
+    try:
+        conn.execute('INSERT OR REPLACE INTO llm_cache (cache_key, value, tokens, expires_at) VALUES (?, ?, ?, ?)',
+                     (key, json.dumps(value), tokens, expires_at))
+        conn.commit()
+    except Exception as e:
+        logger.warning(f"LLM cache save failed: {e}")
+    finally:
+        conn.close()
+
+def prune():
+    """Drops expired rows."""
+    conn = db.get_connection()
+    try:
+        c = conn.cursor()
+        c.execute('DELETE FROM llm_cache WHERE expires_at <= ?', (time.time(),))
+        conn.commit()
+        if c.rowcount:
+            logger.info(f"Pruned {c.rowcount} expired LLM cache entries.")
+    finally:
+        conn.close()
+
+def clear_memory():
+    with _lock:
+        _lru.clear()
+
+def hit_ratio():
+    total = stats['hits'] + stats['misses']
+    return stats['hits'] / total if total else 0.0
+
+def report():
+    return f"LLM cache: {hit_ratio():.0%} hits ({stats['hits']}/{stats['hits'] + stats['misses']}), ~{stats['tokens_saved']} tokens saved"
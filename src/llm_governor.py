@@ -0,0 +1,234 @@
+import asyncio
+import contextvars
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import httpx
+from google.genai import errors
+
+from src import llm_metrics
+
+from src.config import GEMINI_RPM, GEMINI_BURST, GEMINI_MAX_RETRIES, GEMINI_HEDGE_MODEL
+
+logger = logging.getLogger(__name__)
+
+# Seconds before a hedged request goes to GEMINI_HEDGE_MODEL. A call is abandoned
+# (caller falls back) after HARD_TIMEOUT_FACTOR x its deadline.
+DEADLINES = {
+    'copy': 12,
+    'one_liner': 6,
+    'refine': 6,
+    'variations': 12,
+    'variations_batch': 45,
+    'vision': 10,
+}
+DEFAULT_DEADLINE = 10
+HARD_TIMEOUT_FACTOR = 3
+
+RETRY_BASE_DELAY = 1
+RETRY_MAX_DELAY = 20
+
+class TokenBucket:
+    """Client-side quota: `rate` requests per second, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Takes a token (possibly on credit). Returns seconds to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+bucket = TokenBucket(GEMINI_RPM / 60, GEMINI_BURST)
+
+# --- Metrics ---
+_latencies = {}  # call_site -> deque of seconds
+_counters = {}   # call_site -> {'calls', 'retries', 'hedges', 'hedge_wins', 'fallbacks'}
+_metrics_lock = threading.Lock()
+
+def _count(call_site, name, n=1):
+    with _metrics_lock:
+        counters = _counters.setdefault(call_site, {'calls': 0, 'retries': 0, 'hedges': 0, 'hedge_wins': 0, 'fallbacks': 0})
+        counters[name] += n
+
+def _record_latency(call_site, seconds):
+    with _metrics_lock:
+        _latencies.setdefault(call_site, deque(maxlen=500)).append(seconds)
+
+def record_stream(call_site, seconds, first_chunk_seconds, ok=True):
+    """Metrics for streamed calls (not routed through call_async): total and time to first chunk."""
+    _count(call_site, 'calls')
+    _record_latency(call_site, seconds)
+    if first_chunk_seconds is not None:
+        _record_latency(f"{call_site}_first_chunk", first_chunk_seconds)
+    if not ok:
+        _count(call_site, 'fallbacks')
+
+def record_fallback(call_site):
+    """Called by gemini_utils when a call ended in its canned fallback."""
+    _count(call_site, 'fallbacks')
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def get_metrics():
+    """{call_site: {'calls', 'p50', 'p95', 'fallback_rate', 'retries', 'hedges', 'hedge_wins'}}"""
+    with _metrics_lock:
+        out = {}
+        for call_site, counters in _counters.items():
+            lat = list(_latencies.get(call_site, []))
+            calls = counters['calls']
+            out[call_site] = {
+                **counters,
+                'p50': percentile(lat, 50),
+                'p95': percentile(lat, 95),
+                'fallback_rate': counters['fallbacks'] / calls if calls else 0.0,
+            }
+            first_chunk = _latencies.get(f"{call_site}_first_chunk")
+            if first_chunk:
+                out[call_site]['first_chunk_p50'] = percentile(list(first_chunk), 50)
+        return out
+
+def report():
+    parts = [
+        f"{site}: p50 {m['p50']:.1f}s p95 {m['p95']:.1f}s fallback {m['fallback_rate']:.0%} ({m['calls']} calls, {m['hedge_wins']}/{m['hedges']} hedges won)"
+        + (f" first chunk p50 {m['first_chunk_p50']:.1f}s" if 'first_chunk_p50' in m else "")
+        for site, m in sorted(get_metrics().items())
+    ]
+    return "Gemini latency: " + ("; ".join(parts) if parts else "no calls yet")
+
+# --- Retry ---
+def is_retryable(e):
+    if isinstance(e, errors.APIError):
+        return e.code == 429 or (e.code or 0) >= 500
+    return isinstance(e, (httpx.TransportError, TimeoutError))
+
+def retry_delay(attempt):
+    """Exponential backoff with jitter (half fixed, half random)."""
+    cap = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt))
+    return cap / 2 + random.uniform(0, cap / 2)
+
+def _attempt(call_site, request_fn, model, retries):
+    for attempt in range(retries + 1):
+        bucket.acquire()
+        try:
+            return request_fn(model)
+        except Exception as e:
+            if attempt >= retries or not is_retryable(e):
+                raise
+            _count(call_site, 'retries')
+            llm_metrics.note_retry()
+            delay = retry_delay(attempt)
+            logger.warning(f"Gemini {call_site} ({model}) failed with {e}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+async def _attempt_async(call_site, request_fn, model, retries):
+    for attempt in range(retries + 1):
+        await bucket.acquire_async()
+        try:
+            return await request_fn(model)
+        except Exception as e:
+            if attempt >= retries or not is_retryable(e):
+                raise
+            _count(call_site, 'retries')
+            llm_metrics.note_retry()
+            delay = retry_delay(attempt)
+            logger.warning(f"Gemini {call_site} ({model}) failed with {e}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+# --- Governed calls ---
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='gemini')
+
+def call(call_site, request_fn, model):
+    """
+    Blocking governed call. request_fn(model) performs one generate_content request.
+    Rate limited, retried on 429/5xx, hedged to GEMINI_HEDGE_MODEL after the
+    call site's deadline (first answer wins). Raises on failure or hard timeout.
+    """
+    _count(call_site, 'calls')
+    deadline = DEADLINES.get(call_site, DEFAULT_DEADLINE)
+    start = time.monotonic()
+    primary = _executor.submit(contextvars.copy_context().run, _attempt, call_site, request_fn, model, GEMINI_MAX_RETRIES)
+    try:
+        done, _ = wait([primary], timeout=deadline)
+        if done:
+            return primary.result()
+
+        _count(call_site, 'hedges')
+        logger.info(f"Gemini {call_site} passed its {deadline}s deadline, hedging to {GEMINI_HEDGE_MODEL}")
+        hedge = _executor.submit(contextvars.copy_context().run, _attempt, call_site, request_fn, GEMINI_HEDGE_MODEL, 0)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            remaining = deadline * HARD_TIMEOUT_FACTOR - (time.monotonic() - start)
+            done, pending = wait(pending, timeout=max(0, remaining), return_when=FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError(f"Gemini {call_site} exceeded {deadline * HARD_TIMEOUT_FACTOR}s")
+            for fut in done:
+                if fut.exception() is None:
+                    if fut is hedge:
+                        _count(call_site, 'hedge_wins')
+                    return fut.result()
+                error = fut.exception()
+        raise error
+    finally:
+        _record_latency(call_site, time.monotonic() - start)
+
+async def call_async(call_site, request_fn, model):
+    """Async twin of call(); request_fn(model) returns an awaitable. Losing requests are cancelled."""
+    _count(call_site, 'calls')
+    deadline = DEADLINES.get(call_site, DEFAULT_DEADLINE)
+    start = time.monotonic()
+    primary = asyncio.ensure_future(_attempt_async(call_site, request_fn, model, GEMINI_MAX_RETRIES))
+    pending = {primary}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=deadline)
+        if done:
+            return primary.result()
+
+        _count(call_site, 'hedges')
+        logger.info(f"Gemini {call_site} passed its {deadline}s deadline, hedging to {GEMINI_HEDGE_MODEL}")
+        hedge = asyncio.ensure_future(_attempt_async(call_site, request_fn, GEMINI_HEDGE_MODEL, 0))
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            remaining = deadline * HARD_TIMEOUT_FACTOR - (time.monotonic() - start)
+            done, pending = await asyncio.wait(pending, timeout=max(0, remaining), return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError(f"Gemini {call_site} exceeded {deadline * HARD_TIMEOUT_FACTOR}s")
+            for fut in done:
+                if fut.exception() is None:
+                    if fut is hedge:
+                        _count(call_site, 'hedge_wins')
+                    return fut.result()
+                error = fut.exception()
+        raise error
+    finally:
+        for fut in pending:
+            fut.cancel()
+        _record_latency(call_site, time.monotonic() - start)
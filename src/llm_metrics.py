@@ -0,0 +1,296 @@
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from src import database as db
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the exported histogram buckets (the last bucket is +Inf)
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 45)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 5000, 10000, 30000)
+
+# USD per 1M tokens (input, output) by model family; versioned names (gemini-2.0-flash-001)
+# take the longest matching family. Cached input tokens are billed at CACHED_INPUT_RATE of input
+PRICES = {
+    'gemini-2.0-flash': (0.10, 0.40),
+    'gemini-2.0-flash-lite': (0.075, 0.30),
+}
+CACHED_INPUT_RATE = 0.25
+USAGE_RETENTION_DAYS = 90
+SYSTEM_USER = 0 # background work (scheduled fetches, precompute)
+
+_user = contextvars.ContextVar('llm_user', default=None)
+_active = contextvars.ContextVar('llm_call', default=None)
+_aggregates = {} # call_site -> totals + histograms
+_lock = threading.Lock()
+
+# --- Attribution ---
+def set_user(user_id):
+    """Bills LLM calls made from the current context (handler, and tasks it spawns) to user_id."""
+    _user.set(user_id)
+
+def current_user():
+    return _user.get()
+
+# --- Per-call notes (called from gemini_utils / llm_governor while a call is tracked) ---
+def note_response(response):
+    note_usage(getattr(response, 'usage_metadata', None), getattr(response, 'model_version', None))
+
+def note_usage(usage, model=None):
+    record = _active.get()
+    if record is None:
+        return
+    record['requests'] += 1
+    record['prompt_tokens'] += getattr(usage, 'prompt_token_count', 0) or 0
+    record['response_tokens'] += getattr(usage, 'candidates_token_count', 0) or 0
+    record['cached_tokens'] += getattr(usage, 'cached_content_token_count', 0) or 0
+    if model:
+        record['model'] = model
+
+def note_retry():
+    record = _active.get()
+    if record is not None:
+        record['retries'] += 1
+
+def note_cache_hit(n=1):
+    record = _active.get()
+    if record is not None:
+        record['cache_hits'] += n
+
+def note_fallback():
+    record = _active.get()
+    if record is not None:
+        record['ok'] = False
+
+# --- Tracking ---
+@contextmanager
+def _tracking(call_site, model):
+    record = {'call_site': call_site, 'model': model, 'user_id': _user.get(), 'requests': 0,
+              'prompt_tokens': 0, 'response_tokens': 0, 'cached_tokens': 0,
+              'retries': 0, 'cache_hits': 0, 'ok': True}
+    token = _active.set(record)
+    start = time.monotonic()
+    try:
+        yield record
+    except BaseException:
+        record['ok'] = False
+        raise
+    finally:
+        record['latency'] = time.monotonic() - start
+        try:
+            _active.reset(token)
+        except ValueError: # async generator finalized from another context
+            pass
+        _finish(record)
+
+def instrumented(call_site, model=None):
+    """
+    Decorator for gemini_utils entry points (plain, async and async-generator functions).
+    Entry points called from inside another tracked call count towards the outer one.
+    """
+    def decorate(fn):
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def gen_wrapper(*args, **kwargs):
+                if _active.get() is not None:
+                    async for value in fn(*args, **kwargs):
+                        yield value
+                    return
+                with _tracking(call_site, model):
+                    async for value in fn(*args, **kwargs):
+                        yield value
+            return gen_wrapper
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if _active.get() is not None:
+                    return await fn(*args, **kwargs)
+                with _tracking(call_site, model):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _active.get() is not None:
+                return fn(*args, **kwargs)
+            with _tracking(call_site, model):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def price(model):
+    """(input, output) USD per 1M tokens of a model name or versioned name; (0, 0) when unpriced."""
+    model = (model or '').removeprefix('models/')
+    families = [family for family in PRICES if model == family or model.startswith(family + '-')]
+    return PRICES[max(families, key=len)] if families else (0.0, 0.0)
+
+def cost(model, prompt_tokens, response_tokens, cached_tokens=0):
+    """Estimated USD for one call's token counts (0 for unpriced models)."""
+    price_in, price_out = price(model)
+    fresh = max(0, prompt_tokens - cached_tokens)
+    return (fresh * price_in + cached_tokens * price_in * CACHED_INPUT_RATE + response_tokens * price_out) / 1_000_000
+
+def _finish(record):
+    record['cost'] = cost(record['model'], record['prompt_tokens'], record['response_tokens'], record['cached_tokens'])
+    tokens = record['prompt_tokens'] + record['response_tokens']
+    with _lock:
+        agg = _aggregates.setdefault(record['call_site'], {
+            'calls': 0, 'requests': 0, 'errors': 0, 'retries': 0, 'cache_hits': 0,
+            'prompt_tokens': 0, 'response_tokens': 0, 'cached_tokens': 0, 'cost': 0.0,
+            'latency_sum': 0.0, 'models': {},
+            'latency_hist': [0] * (len(LATENCY_BUCKETS) + 1),
+            'token_hist': [0] * (len(TOKEN_BUCKETS) + 1),
+        })
+        agg['calls'] += 1
+        agg['errors'] += 0 if record['ok'] else 1
+        for name in ('requests', 'retries', 'cache_hits', 'prompt_tokens', 'response_tokens', 'cached_tokens', 'cost'):
+            agg[name] += record[name]
+        agg['latency_sum'] += record['latency']
+        if record['model'] and record['requests']:
+            agg['models'][record['model']] = agg['models'].get(record['model'], 0) + record['requests']
+        agg['latency_hist'][bisect_left(LATENCY_BUCKETS, record['latency'])] += 1
+        if record['requests']:
+            agg['token_hist'][bisect_left(TOKEN_BUCKETS, tokens)] += 1
+    _save_usage(record)
+
+# --- Per-user daily usage (SQLite) ---
+# Buffered in memory and written by flush() (scheduled job, or before reading), so
+# tracked calls - cache hits included - never wait on a database write.
+_USAGE_FIELDS = ('calls', 'requests', 'prompt_tokens', 'response_tokens', 'cache_hits', 'errors', 'latency_total', 'cost')
+_pending = {} # (day, user_id, call_site) -> field totals
+
+def _save_usage(record):
+    user_id = record['user_id'] if record['user_id'] is not None else SYSTEM_USER
+    key = (date.today().isoformat(), user_id, record['call_site'])
+    values = (1, record['requests'], record['prompt_tokens'], record['response_tokens'], record['cache_hits'],
+              0 if record['ok'] else 1, record['latency'], record['cost'])
+    with _lock:
+        totals = _pending.setdefault(key, [0] * len(_USAGE_FIELDS))
+        for i, value in enumerate(values):
+            totals[i] += value
+
+def flush():
+    """Adds buffered usage to the llm_usage table."""
+    with _lock:
+        rows = [key + tuple(totals) for key, totals in _pending.items()]
+        _pending.clear()
+    if not rows:
+        return
+    conn = db.get_connection()
+    try:
+        conn.executemany('''INSERT INTO llm_usage (day, user_id, call_site, calls, requests, prompt_tokens, response_tokens,
+                                                   cache_hits, errors, latency_total, cost)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                            ON CONFLICT (day, user_id, call_site) DO UPDATE SET
+                                calls = calls + excluded.calls,
+                                requests = requests + excluded.requests,
+                                prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                                response_tokens = response_tokens + excluded.response_tokens,
+                                cache_hits = cache_hits + excluded.cache_hits,
+                                errors = errors + excluded.errors,
+                                latency_total = latency_total + excluded.latency_total,
+                                cost = cost + excluded.cost''', rows)
+        conn.commit()
+    except Exception as e:
+        logger.warning(f"LLM usage save failed: {e}")
+    finally:
+        conn.close()
+
+def daily_usage(day=None, user_id=None):
+    """Rows of {'day', 'user_id', 'call_site', 'calls', 'requests', 'prompt_tokens', ...} for a day (default today)."""
+    day = day or date.today().isoformat()
+    flush()
+    conn = db.get_connection()
+    try:
+        c = conn.cursor()
+        query = '''SELECT day, user_id, call_site, calls, requests, prompt_tokens, response_tokens,
+                          cache_hits, errors, latency_total, cost
+                   FROM llm_usage WHERE day = ?'''
+        params = [day]
+        if user_id is not None:
+            query += ' AND user_id = ?'
+            params.append(user_id)
+        c.execute(query + ' ORDER BY user_id, call_site', params)
+        columns = [d[0] for d in c.description]
+        return [dict(zip(columns, row)) for row in c.fetchall()]
+    finally:
+        conn.close()
+
+def format_usage(rows):
+    if not rows:
+        return "No Gemini usage today."
+    lines = []
+    for r in rows:
+        lines.append(f"{r['call_site']}: {r['calls']} calls, {r['prompt_tokens'] + r['response_tokens']} tokens, "
+                     f"{r['cache_hits']} cache hits, ${r['cost']:.4f}")
+    total = sum(r['prompt_tokens'] + r['response_tokens'] for r in rows)
+    lines.append(f"Total: {total} tokens, ${sum(r['cost'] for r in rows):.4f}")
+    return "\n".join(lines)
+
+def prune():
+    cutoff = (date.today() - timedelta(days=USAGE_RETENTION_DAYS)).isoformat()
+    conn = db.get_connection()
+    try:
+        conn.execute('DELETE FROM llm_usage WHERE day < ?', (cutoff,))
+        conn.commit()
+    finally:
+        conn.close()
+
+# --- Export ---
+def export():
+    """JSON-able snapshot: per call site totals plus latency/token histograms (cumulative like Prometheus)."""
+    with _lock:
+        out = {}
+        for call_site, agg in _aggregates.items():
+            out[call_site] = {k: v for k, v in agg.items() if not k.endswith('_hist')}
+            out[call_site]['models'] = dict(agg['models'])
+            out[call_site]['latency_avg'] = agg['latency_sum'] / agg['calls'] if agg['calls'] else 0.0
+            out[call_site]['latency_histogram'] = _cumulative(LATENCY_BUCKETS, agg['latency_hist'])
+            out[call_site]['token_histogram'] = _cumulative(TOKEN_BUCKETS, agg['token_hist'])
+        return out
+
+def _cumulative(bounds, counts):
+    total, buckets = 0, []
+    for bound, n in zip(list(bounds) + ['+Inf'], counts):
+        total += n
+        buckets.append([bound, total])
+    return buckets
+
+def to_prometheus():
+    """Text exposition format of export(), for scraping or pushing to a gateway."""
+    lines = []
+    for call_site, m in sorted(export().items()):
+        label = f'call_site="{call_site}"'
+        for name in ('calls', 'requests', 'errors', 'retries', 'cache_hits', 'prompt_tokens', 'response_tokens', 'cached_tokens'):
+            lines.append(f'newsu_llm_{name}_total{{{label}}} {m[name]}')
+        lines.append(f'newsu_llm_cost_usd_total{{{label}}} {m["cost"]:.6f}')
+        for metric, key in (('latency_seconds', 'latency_histogram'), ('tokens', 'token_histogram')):
+            for bound, count in m[key]:
+                lines.append(f'newsu_llm_{metric}_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f'newsu_llm_{metric}_count{{{label}}} {m[key][-1][1]}')
+        lines.append(f'newsu_llm_latency_seconds_sum{{{label}}} {m["latency_sum"]:.3f}')
+    return "\n".join(lines) + "\n"
+
+def write_snapshot(path):
+    try:
+        with open(path, 'w') as f:
+            json.dump({'generated_at': time.time(), 'call_sites': export()}, f, indent=2)
+    except Exception as e:
+        logger.warning(f"LLM metrics export failed: {e}")
+
+def report():
+    parts = []
+    for call_site, m in sorted(export().items()):
+        parts.append(f"{call_site}: {m['calls']} calls ({m['requests']} requests, {m['cache_hits']} cache hits, "
+                     f"{m['retries']} retries, {m['errors']} errors) avg {m['latency_avg']:.1f}s "
+                     f"{m['prompt_tokens']}+{m['response_tokens']} tokens ${m['cost']:.4f}")
+    return "LLM usage: " + ("; ".join(parts) if parts else "no calls yet")
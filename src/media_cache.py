@@ -0,0 +1,188 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from telegram.error import BadRequest
+
+from src import database as db
+
+logger = logging.getLogger(__name__)
+
+MAX_MEMORY_ENTRIES = 2000
+MAX_PERSISTED_ENTRIES = 20000
+
+_lru = OrderedDict()
+_lock = threading.Lock()
+stats = {'hits': 0, 'misses': 0, 'bytes_saved': 0}
+
+def media_key(media):
+    """
+    Cache key for a photo/video argument.
+    URLs are keyed by the URL; bytes / BytesIO / open files by a SHA-256 of the content.
+    Returns (key, payload) where payload is what to upload on a miss.
+    """
+    if isinstance(media, str):
+        return f"url:{media}", media
+    if isinstance(media, (bytes, bytearray)):
+        data = bytes(media)
+    elif hasattr(media, 'getvalue'):
+        data = media.getvalue()
+    else:
+        data = media.read()
+    return f"sha256:{hashlib.sha256(data).hexdigest()}", data
+
+def get_file_id(key):
+    with _lock:
+        if key in _lru:
+            _lru.move_to_end(key)
+            return _lru[key]
+
+    conn = db.get_connection()
+    try:
+        c = conn.cursor()
+        c.execute('SELECT file_id FROM media_file_ids WHERE media_key = ?', (key,))
+        row = c.fetchone()
+        if row:
+            c.execute('UPDATE media_file_ids SET last_used = ? WHERE media_key = ?', (time.time(), key))
+            conn.commit()
+    except Exception as e:
+        logger.warning(f"Media cache lookup failed: {e}")
+        row = None
+    finally:
+        conn.close()
+
+    if row:
+        _remember(key, row[0])
+        return row[0]
+    return None
+
+def _remember(key, file_id):
+    with _lock:
+        _lru[key] = file_id
+        _lru.move_to_end(key)
+        while len(_lru) > MAX_MEMORY_ENTRIES:
+            _lru.popitem(last=False)
+
+def record_file_id(key, file_id, media_type='photo'):
+    _remember(key, file_id)
+    conn = db.get_connection()
+    try:
+        conn.execute('INSERT OR REPLACE INTO media_file_ids (media_key, file_id, media_type, last_used) VALUES (?, ?, ?, ?)',
+                     (key, file_id, media_type, time.time()))
+        conn.commit()
+    except Exception as e:
+        logger.warning(f"Media cache save failed: {e}")
+    finally:
+        conn.close()
+
+def forget(key):
+    with _lock:
+        _lru.pop(key, None)
+    conn = db.get_connection()
+    try:
+        conn.execute('DELETE FROM media_file_ids WHERE media_key = ?', (key,))
+        conn.commit()
+    finally:
+        conn.close()
+
+def prune(max_entries=MAX_PERSISTED_ENTRIES):
+    """LRU eviction for the persisted table."""
+    conn = db.get_connection()
+    try:
+        c = conn.cursor()
+        c.execute('''
+            DELETE FROM media_file_ids WHERE media_key NOT IN (
+                SELECT media_key FROM media_file_ids ORDER BY last_used DESC LIMIT ?
+            )
+        ''', (max_entries,))
+        conn.commit()
+        if c.rowcount:
+            logger.info(f"Evicted {c.rowcount} old media file_ids.")
+    finally:
+        conn.close()
+
+def extract_file_id(message, media_type='photo'):
+    """file_id of the uploaded media on a sent Message (largest size for photos)."""
+    if media_type == 'photo' and message.photo:
+        return message.photo[-1].file_id
+    if media_type == 'video' and message.video:
+        return message.video.file_id
+    if media_type == 'document' and message.document:
+        return message.document.file_id
+    return None
+
+async def send_cached(send, media, media_type='photo', **kwargs):
+    """
+    Sends media through `send` (e.g. message.reply_photo or partial(bot.send_photo, chat_id=...)),
+    reusing a known Telegram file_id instead of uploading again.
+    Records the file_id from fresh uploads. Returns the sent Message.
+    """
+    key, payload = media_key(media)
+    file_id = get_file_id(key)
+
+    if file_id:
+        try:
+            message = await send(**{media_type: file_id}, **kwargs)
+            stats['hits'] += 1
+            if not isinstance(payload, str):
+                stats['bytes_saved'] += len(payload)
+            return message
+        except BadRequest as e:
+            # Expired / foreign file_id: drop it and upload normally
+            logger.warning(f"Cached file_id rejected, re-uploading: {e}")
+            forget(key)
+
+    stats['misses'] += 1
+    message = await send(**{media_type: payload}, **kwargs)
+    new_id = extract_file_id(message, media_type)
+    if new_id:
+        record_file_id(key, new_id, media_type)
+    return message
+
+async def send_photo_cached(send, photo, **kwargs):
+    return await send_cached(send, photo, 'photo', **kwargs)
+
+async def send_video_cached(send, video, **kwargs):
+    return await send_cached(send, video, 'video', **kwargs)
+
+async def send_photo_group_cached(send_media_group, photos, captions, **kwargs):
+    """
+    Sends 2-10 photos as one album (send_media_group), reusing cached file_ids.
+    photos: list of bytes / URLs. Returns the list of sent Messages.
+    """
+    from telegram import InputMediaPhoto
+
+    keyed = [media_key(p) for p in photos]
+    cached = [get_file_id(key) for key, _ in keyed]
+
+    def build(use_cache):
+        return [
+            InputMediaPhoto(media=(file_id if use_cache and file_id else payload), caption=caption)
+            for (key, payload), file_id, caption in zip(keyed, cached, captions)
+        ]
+
+    try:
+        messages = await send_media_group(media=build(True), **kwargs)
+    except BadRequest as e:
+        if not any(cached):
+            raise
+        logger.warning(f"Cached file_id rejected in album, re-uploading: {e}")
+        for (key, _), file_id in zip(keyed, cached):
+            if file_id:
+                forget(key)
+        cached = [None] * len(keyed)
+        messages = await send_media_group(media=build(False), **kwargs)
+
+    for (key, payload), file_id, message in zip(keyed, cached, messages):
+        if file_id:
+            stats['hits'] += 1
+            if not isinstance(payload, str):
+                stats['bytes_saved'] += len(payload)
+            continue
+        stats['misses'] += 1
+        new_id = extract_file_id(message, 'photo')
+        if new_id:
+            record_file_id(key, new_id, 'photo')
+    return messages
@@ -0,0 +1,73 @@
+import asyncio
+import logging
+import time
+
+from telegram.error import BadRequest, RetryAfter, TelegramError
+
+logger = logging.getLogger(__name__)
+
+# Telegram tolerates roughly one edit per second per chat
+EDIT_INTERVAL = 1.0
+
+class ThrottledEditor:
+    """
+    Edits one Telegram message as streamed text grows. Updates arriving faster
+    than `interval` are coalesced: only the latest text is sent when the window opens.
+    """
+
+    def __init__(self, message, prefix="", interval=EDIT_INTERVAL):
+        self.message = message
+        self.prefix = prefix
+        self.interval = interval
+        self.edits = 0
+        self.coalesced = 0
+        self._pending = None
+        self._shown = None
+        self._last_edit = 0.0
+        self._timer = None
+
+    async def update(self, text):
+        if self._pending is not None and self._pending != self._shown:
+            self.coalesced += 1
+        self._pending = text
+        wait = self.interval - (time.monotonic() - self._last_edit)
+        if wait <= 0 and self._timer is None:
+            await self._edit()
+        elif self._timer is None:
+            self._timer = asyncio.ensure_future(self._edit_later(wait))
+
+    async def _edit_later(self, wait):
+        await asyncio.sleep(wait)
+        self._timer = None
+        await self._edit()
+
+    async def _edit(self):
+        text = self._pending
+        if not text or text == self._shown:
+            return
+        self._shown = text
+        self._last_edit = time.monotonic()
+        try:
+            await self.message.edit_text(f"{self.prefix}{text}")
+            self.edits += 1
+        except RetryAfter as e:
+            # Flood control: push the next edit back instead of failing the stream
+            self._last_edit = time.monotonic() + e.retry_after
+            self._shown = None
+        except BadRequest as e:
+            logger.warning(f"Stream edit ignored: {e}")
+        except TelegramError as e:
+            # TimedOut / NetworkError: skip this edit and keep streaming; the next one resends
+            logger.warning(f"Stream edit failed: {e}")
+            self._shown = None
+
+    async def finish(self, text):
+        """Shows the final text right away (waiting out a flood-control pause if needed)."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        wait = self._last_edit - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self._pending = text
+        await self._edit()
@@ -1,11 +1,13 @@
 import logging
+import asyncio
 import os
 import shutil
 import json
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, MessageHandler, filters, CallbackQueryHandler
 from src import database as db
-from src import image_generator
+from src import config_store, image_generator, media_cache
+from src.components import template as templates
 
 logger = logging.getLogger(__name__)
 
@@ -27,23 +29,14 @@ def get_user_config_path(user_id):
     return os.path.join(get_user_dir(user_id), "template_config.json")
 
 def load_user_config(user_id):
-    path = get_user_config_path(user_id)
-    if os.path.exists(path):
-        with open(path, 'r') as f:
-            return json.load(f)
-    # If not exists, return default (loaded fresh)
-    with open(DEFAULT_CONFIG_PATH, 'r') as f:
-        return json.load(f)
+    # Editable copy of the cached config; the default template if the user has none yet
+    return config_store.load(user_id)
 
 def save_user_config(user_id, config):
-    try:
-        path = get_user_config_path(user_id)
-        with open(path, 'w') as f:
-            json.dump(config, f, indent=4)
-        return True
-    except Exception as e:
-        logger.error(f"Failed to save config for {user_id}: {e}")
+    if not config_store.save(user_id, config):
         return False
+    templates.invalidate(user_id)
+    return True
 
 # Handlers
 async def start_onboarding(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -187,9 +180,10 @@ async def trigger_preview(update: Update, context: ContextTypes.DEFAULT_TYPE):
     status_msg = await msg_or_query.reply_text("🎨 Generating Preview...")
     
     try:
-        from src import image_generator
+        from src import render_client
         # Dummy Content
-        img_io = image_generator.create_news_image(
+        img_io = await asyncio.to_thread(
+            render_client.render_news_image,
             title="Welcome to NewsU", 
             source=base_config['page_name'],
             date_str="Now",
@@ -210,7 +204,7 @@ async def trigger_preview(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 [InlineKeyboardButton("🎨 Highlight Color", callback_data='adj_color'), InlineKeyboardButton("↕️ Gradient", callback_data='adj_grad')],
                 [InlineKeyboardButton("✅ Finish Setup", callback_data='ob_finish')]
             ]
-            await msg_or_query.reply_photo(photo=img_io, caption=caption, reply_markup=InlineKeyboardMarkup(keyboard))
+            await media_cache.send_photo_cached(msg_or_query.reply_photo, img_io, caption=caption, reply_markup=InlineKeyboardMarkup(keyboard))
             return OB_ADJUST_MENU
         else:
              await msg_or_query.reply_text("❌ Preview generation failed. Please check your assets.")
@@ -310,7 +304,7 @@ async def adj_save_gradient(update: Update, context: ContextTypes.DEFAULT_TYPE):
             config = load_user_config(user_id)
             # Assuming config structure has gradient settings
             # We usually use 'gradient_height_ratio' or 'start_ratio' in prepare_background?
-            # Looking at create_gradient_overlay in background.py...
+            # Looking at gradient_mask in background.py...
             
             # Let's save it to a new key if needed, or existing.
             # config['canvas']['gradient_height_ratio'] = val ... 
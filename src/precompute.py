@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import re
+import time
+from email.utils import parsedate_to_datetime
+
+from src import article_extractor, gemini_utils, llm_metrics
+from src.config import PRECOMPUTE_MAX_ITEMS, PRECOMPUTE_TOKEN_BUDGET, PRECOMPUTE_CYCLE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Rough cost of one item inside a batch: ~4 chars per token plus the 4 styles of output
+OUTPUT_TOKENS_PER_ITEM = 250
+CLUSTER_SIMILARITY = 0.5
+
+_in_flight = {}  # title -> asyncio.Future resolved with its variations (or None)
+_budget = {'window_start': 0.0, 'spent': 0}
+stats = {'scheduled': 0, 'skipped_budget': 0, 'ready': 0, 'joined': 0, 'missed': 0}
+
+def item_context(item):
+    return item.get('content') or item.get('summary') or ''
+
+def estimate_tokens(title, context):
+    context_tokens = min(article_extractor.estimate_tokens(context), article_extractor.CONTEXT_BUDGETS['variations_batch'])
+    return article_extractor.estimate_tokens(title) + context_tokens + OUTPUT_TOKENS_PER_ITEM
+
+def _words(title):
+    return set(re.findall(r'\w+', title.lower()))
+
+def cluster_sizes(items):
+    """Number of near-duplicate headlines (word Jaccard >= CLUSTER_SIMILARITY) per item, itself included."""
+    words = [_words(item.get('title', '')) for item in items]
+    sizes = []
+    for a in words:
+        size = 0
+        for b in words:
+            if a and b and len(a & b) / len(a | b) >= CLUSTER_SIMILARITY:
+                size += 1
+        sizes.append(max(1, size))
+    return sizes
+
+def _age_hours(item):
+    try:
+        published = parsedate_to_datetime(item.get('published', ''))
+        return max(0.0, (time.time() - published.timestamp()) / 3600)
+    except Exception:
+        return 0.0 # Unknown date (e.g. scraped links): treat as fresh
+
+def prioritize(items):
+    """Bigger clusters (story carried by many feeds) first, then the most recent."""
+    sizes = cluster_sizes(items)
+    scored = [(size + 1 / (1 + _age_hours(item)), item) for size, item in zip(sizes, items)]
+    scored.sort(key=lambda pair: pair[0], reverse=True)
+    return [item for _, item in scored]
+
+def _take_budget(tokens):
+    now = time.time()
+    if now - _budget['window_start'] >= PRECOMPUTE_CYCLE_SECONDS:
+        _budget['window_start'] = now
+        _budget['spent'] = 0
+    if _budget['spent'] + tokens > PRECOMPUTE_TOKEN_BUDGET:
+        return False
+    _budget['spent'] += tokens
+    return True
+
+def schedule(application, items, max_items=PRECOMPUTE_MAX_ITEMS):
+    """
+    Called when items are delivered (scheduled job, /update, URL paste).
+    Starts batched variation generation in the background for the highest
+    priority uncached items that fit the per-cycle token budget.
+    application: anything with create_task (the telegram Application).
+    Returns the number of items scheduled.
+    """
+    selected = []
+    seen = set()
+    for item in prioritize(items):
+        title = item.get('title')
+        if not title or title in seen or title in _in_flight:
+            continue
+        seen.add(title)
+        if gemini_utils.get_cached_variations(title):
+            continue
+        context = item_context(item)
+        if not _take_budget(estimate_tokens(title, context)):
+            stats['skipped_budget'] += 1
+            continue
+        selected.append((title, context))
+        if len(selected) >= max_items:
+            break
+
+    if not selected:
+        return 0
+
+    loop = asyncio.get_running_loop()
+    for title, _ in selected:
+        _in_flight[title] = loop.create_future()
+    stats['scheduled'] += len(selected)
+    application.create_task(_run(selected))
+    return len(selected)
+
+async def _run(selected):
+    llm_metrics.set_user(None) # speculative work is not billed to the user who triggered it
+    start = time.time()
+    results = {}
+    try:
+        results = await gemini_utils.generate_variations_batch_async(selected)
+    except Exception as e:
+        logger.error(f"Variation precompute failed: {e}")
+    finally:
+        for title, _ in selected:
+            fut = _in_flight.pop(title, None)
+            if fut and not fut.done():
+                fut.set_result(results.get(title))
+    elapsed = time.time() - start
+    logger.info(f"Precomputed variations for {len(results)}/{len(selected)} items in {elapsed:.1f}s "
+                f"({elapsed / max(1, len(selected)):.2f}s per item)")
+    return results
+
+async def get_variations(title, context_text="", wait_timeout=30):
+    """
+    Variations for the "🎨 Generate Image" tap: precomputed if ready, joins a
+    precompute still running, otherwise generates them now.
+    """
+    cached = gemini_utils.get_cached_variations(title)
+    if cached:
+        stats['ready'] += 1
+        return cached
+
+    fut = _in_flight.get(title)
+    if fut is not None:
+        try:
+            variations = await asyncio.wait_for(asyncio.shield(fut), wait_timeout)
+            if variations:
+                stats['joined'] += 1
+                return variations
+        except asyncio.TimeoutError:
+            logger.warning(f"Precompute for '{title[:40]}' still running, generating directly.")
+
+    stats['missed'] += 1
+    return await gemini_utils.generate_all_variations_async(title, context_text)
+
+def report():
+    return (f"Precompute: {stats['scheduled']} scheduled, {stats['ready']} ready on tap, "
+            f"{stats['joined']} joined in flight, {stats['missed']} missed, {stats['skipped_budget']} over budget")
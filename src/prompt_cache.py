@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import threading
+import time
+
+from google.genai import errors, types
+
+from src import singleflight
+from src.config import GEMINI_CONTEXT_CACHE, GEMINI_CONTEXT_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+REFRESH_MARGIN = 300    # extend a cache this many seconds before it expires
+UNAVAILABLE_RETRY = 1800 # after a failed create
+# Smallest prefix (tokens) the API accepts for explicit context caching, by model family
+MIN_CACHE_TOKENS = {'gemini-2.5-flash': 1024, 'gemini-2.5-pro': 2048}
+DEFAULT_MIN_CACHE_TOKENS = 4096
+
+_instructions = {}  # family -> static instruction prefix
+_entries = {}       # (family, model) -> {'name', 'expires_at'}
+_unavailable = {}   # (family, model) -> retry after timestamp
+_lock = threading.Lock()
+_flights = singleflight.Group('context_cache') # one create/refresh per (family, model), sync and async callers alike
+stats = {} # family -> {'calls', 'cached_calls', 'prompt_tokens', 'cached_tokens', 'latency_cached', 'latency_uncached'}
+
+def register(family, instructions):
+    """Declares the static instruction prefix shared by every prompt of a family."""
+    _instructions[family] = instructions.strip()
+
+def instructions(family):
+    return _instructions.get(family, "")
+
+def min_cache_tokens(model):
+    """Minimum cacheable prefix of a model; versioned names (gemini-2.5-flash-001) match their family."""
+    for prefix, tokens in MIN_CACHE_TOKENS.items():
+        if model.startswith(prefix):
+            return tokens
+    return DEFAULT_MIN_CACHE_TOKENS
+
+def _ttl():
+    return f"{GEMINI_CONTEXT_CACHE_TTL}s"
+
+def _base_config(base):
+    return types.GenerateContentConfig(**(base or {}))
+
+def inline_contents(family, contents):
+    """The prompt as sent without a cache: family instructions + per-call contents, as one user turn."""
+    if isinstance(contents, str):
+        return instructions(family) + "\n" + contents
+    return [instructions(family)] + list(contents)
+
+def _usable(key, now):
+    """
+    (state, cache name): state is 'hit' (valid entry), 'refresh' (entry close to
+    expiry), 'create', or None (unavailable).
+    """
+    with _lock:
+        entry = _entries.get(key)
+        if entry:
+            return ('hit' if entry['expires_at'] - REFRESH_MARGIN > now else 'refresh'), entry['name']
+        if _unavailable.get(key, 0) > now:
+            return None, None
+        return 'create', None
+
+def _mark_unavailable(key, reason, retry_after=UNAVAILABLE_RETRY):
+    with _lock:
+        if key not in _unavailable:
+            logger.warning(f"Context cache unavailable for {key[0]} on {key[1]}, sending instructions inline: {reason}")
+        _unavailable[key] = time.time() + retry_after
+        _entries.pop(key, None)
+
+def _create_or_refresh(client, key):
+    """Network side of _cache_name; runs once per key at a time, outside _lock."""
+    family, model = key
+    state, name = _usable(key, time.time())
+    if state in (None, 'hit'):
+        # Another caller finished the flight just before this one started
+        return name
+    try:
+        if state == 'refresh':
+            client.caches.update(name=name, config=types.UpdateCachedContentConfig(ttl=_ttl()))
+        else:
+            tokens = client.models.count_tokens(model=model, contents=instructions(family)).total_tokens or 0
+            if tokens < min_cache_tokens(model):
+                # Static instructions do not grow: do not ask again
+                _mark_unavailable(key, f"prefix is {tokens} tokens, {model} needs {min_cache_tokens(model)}", float('inf'))
+                return None
+            cache = client.caches.create(model=model, config=types.CreateCachedContentConfig(
+                system_instruction=instructions(family), ttl=_ttl(), display_name=f"newsu-{family}"))
+            name = cache.name
+        with _lock:
+            _entries[key] = {'name': name, 'expires_at': time.time() + GEMINI_CONTEXT_CACHE_TTL}
+            _unavailable.pop(key, None)
+        return name
+    except Exception as e:
+        _mark_unavailable(key, e)
+        return None
+
+def _cache_name(client, family, model):
+    key = (family, model)
+    state, name = _usable(key, time.time())
+    if state in (None, 'hit'):
+        return name
+    return _flights.do(key, lambda: _create_or_refresh(client, key))
+
+async def _cache_name_async(client, family, model):
+    # Creates/refreshes run in a thread so async callers join the same per-key flight as sync ones
+    state, name = _usable((family, model), time.time())
+    if state in (None, 'hit'):
+        return name
+    return await asyncio.to_thread(_cache_name, client, family, model)
+
+def _cached_config(name, base):
+    config = _base_config(base)
+    config.cached_content = name
+    return config
+
+def invalidate(family, model):
+    """The server no longer knows the handle (expired / deleted): recreate on next use."""
+    with _lock:
+        _entries.pop((family, model), None)
+
+def _is_stale_handle(e):
+    return isinstance(e, errors.APIError) and e.code in (400, 403, 404)
+
+def generate(client, family, model, contents, base_config=None):
+    """
+    generate_content with the family's instructions from the context cache (GEMINI_CONTEXT_CACHE,
+    sent as system instruction), else inline in front of the contents exactly as without caching.
+    """
+    name = _cache_name(client, family, model) if GEMINI_CONTEXT_CACHE else None
+    start = time.monotonic()
+    if name:
+        try:
+            response = client.models.generate_content(model=model, contents=contents, config=_cached_config(name, base_config))
+            record_usage(family, response, time.monotonic() - start, True)
+            return response
+        except Exception as e:
+            if not _is_stale_handle(e):
+                raise
+            logger.warning(f"Cached content for {family} rejected, retrying inline: {e}")
+            invalidate(family, model)
+            start = time.monotonic()
+    response = client.models.generate_content(model=model, contents=inline_contents(family, contents), config=base_config)
+    record_usage(family, response, time.monotonic() - start, False)
+    return response
+
+async def generate_async(client, family, model, contents, base_config=None):
+    name = await _cache_name_async(client, family, model) if GEMINI_CONTEXT_CACHE else None
+    start = time.monotonic()
+    if name:
+        try:
+            response = await client.aio.models.generate_content(model=model, contents=contents, config=_cached_config(name, base_config))
+            record_usage(family, response, time.monotonic() - start, True)
+            return response
+        except Exception as e:
+            if not _is_stale_handle(e):
+                raise
+            logger.warning(f"Cached content for {family} rejected, retrying inline: {e}")
+            invalidate(family, model)
+            start = time.monotonic()
+    response = await client.aio.models.generate_content(model=model, contents=inline_contents(family, contents), config=base_config)
+    record_usage(family, response, time.monotonic() - start, False)
+    return response
+
+# --- Reporting ---
+def record_usage(family, response, seconds, used_cache):
+    usage = getattr(response, 'usage_metadata', None)
+    with _lock:
+        s = stats.setdefault(family, {'calls': 0, 'cached_calls': 0, 'prompt_tokens': 0, 'cached_tokens': 0,
+                                      'latency_cached': 0.0, 'latency_uncached': 0.0})
+        s['calls'] += 1
+        s['prompt_tokens'] += getattr(usage, 'prompt_token_count', 0) or 0
+        s['cached_tokens'] += getattr(usage, 'cached_content_token_count', 0) or 0
+        if used_cache:
+            s['cached_calls'] += 1
+            s['latency_cached'] += seconds
+        else:
+            s['latency_uncached'] += seconds
+
+def report():
+    parts = []
+    for family, s in sorted(stats.items()):
+        reduction = s['cached_tokens'] / s['prompt_tokens'] if s['prompt_tokens'] else 0.0
+        uncached_calls = s['calls'] - s['cached_calls']
+        cached_avg = s['latency_cached'] / s['cached_calls'] if s['cached_calls'] else 0.0
+        uncached_avg = s['latency_uncached'] / uncached_calls if uncached_calls else 0.0
+        parts.append(f"{family}: {reduction:.0%} input tokens from cache ({s['cached_calls']}/{s['calls']} calls), "
+                     f"avg {cached_avg:.2f}s cached vs {uncached_avg:.2f}s inline")
+    return "Context cache: " + ("; ".join(parts) if parts else "no calls yet")
@@ -0,0 +1,233 @@
+import io
+import json
+import logging
+import threading
+import time
+
+import requests
+
+from src import render_pool, singleflight, video_generator
+from src.config import RENDER_NODES
+
+logger = logging.getLogger(__name__)
+
+HEALTH_TIMEOUT = 2
+RENDER_TIMEOUT = 60
+VIDEO_TIMEOUT = 600
+UNHEALTHY_COOLDOWN = 30 # seconds before a failed node is tried again
+
+class RenderNode:
+    def __init__(self, url):
+        self.url = url
+        self.in_flight = 0        # requests this bot has open on the node
+        self.reported_load = 0    # in_flight reported by the node's /health (all clients)
+        self.capacity = 1
+        self.sent = 0             # tie-breaker so equally loaded nodes take turns
+        self.healthy = True
+        self.failed_at = 0.0
+
+    @property
+    def load(self):
+        return (max(self.in_flight, self.reported_load)) / max(1, self.capacity)
+
+    def available(self):
+        return self.healthy or (time.time() - self.failed_at) > UNHEALTHY_COOLDOWN
+
+    def mark_failed(self):
+        self.healthy = False
+        self.failed_at = time.time()
+
+class RenderClient:
+    """
+    Dispatches renders to remote render nodes (src/render_node.py).
+    Least-loaded node first, failover to the next one on errors,
+    and a local render when no node can take the job.
+    Renders for a user_id stay local: nodes only have their own users_data.
+    """
+
+    def __init__(self, urls):
+        self.nodes = [RenderNode(u) for u in urls]
+        self._lock = threading.Lock()
+        self.session = requests.Session()
+
+    def refresh_health(self):
+        """Polls /health on every node. Returns the number of healthy nodes."""
+        for node in self.nodes:
+            try:
+                resp = self.session.get(f"{node.url}/health", timeout=HEALTH_TIMEOUT)
+                resp.raise_for_status()
+                info = resp.json()
+                node.reported_load = info.get('in_flight', 0)
+                node.capacity = info.get('capacity', 1)
+                node.healthy = True
+            except Exception as e:
+                if node.healthy:
+                    logger.warning(f"Render node {node.url} unhealthy: {e}")
+                node.mark_failed()
+        return sum(1 for n in self.nodes if n.healthy)
+
+    def _candidates(self):
+        with self._lock:
+            nodes = [n for n in self.nodes if n.available()]
+            return sorted(nodes, key=lambda n: (not n.healthy, n.load, n.sent))
+
+    def _release(self, node):
+        with self._lock:
+            node.in_flight -= 1
+
+    def _dispatch(self, path, data, files, timeout, stream=False):
+        """
+        Tries nodes in load order. Returns (response, node); (None, None) when no node
+        could take the request. A 4xx/5xx render error from a node is returned as is
+        (closed, status_code != 200): the request failed, the node is fine.
+        A streamed 200 response keeps its node's in_flight slot until the caller calls _release(node).
+        Only connection errors and timeouts take a node out of rotation.
+        """
+        for node in self._candidates():
+            with self._lock:
+                node.in_flight += 1
+                node.sent += 1
+            keep_slot = False
+            try:
+                resp = self.session.post(f"{node.url}{path}", data=data, files=files, timeout=timeout, stream=stream)
+                node.healthy = True
+                if resp.status_code == 200:
+                    keep_slot = stream
+                    return resp, node
+                resp.close() # a streamed response holds its pooled connection until closed
+                if resp.status_code != 503:
+                    logger.warning(f"Render node {node.url} could not render {path}: {resp.status_code}")
+                    return resp, node
+                # Busy, not broken: bump its load so the next pick prefers another node
+                node.reported_load = node.capacity
+                logger.info(f"Render node {node.url} busy, trying next")
+            except requests.RequestException as e:
+                logger.warning(f"Render node {node.url} failed: {e}")
+                node.mark_failed()
+            finally:
+                if not keep_slot:
+                    self._release(node)
+            # Rewind uploads before retrying on the next node
+            for f in (files or {}).values():
+                if hasattr(f[1], 'seek'):
+                    f[1].seek(0)
+        return None, None
+
+    def render_news_image(self, background=None, **params):
+        if params.get('user_id'):
+            return render_pool.render_news_image(background=background, **params)
+        files = {}
+        if background is not None:
+            if isinstance(background, (bytes, bytearray)):
+                bg_bytes = bytes(background)
+            else:
+                buf = io.BytesIO()
+                background.convert('RGB').save(buf, format='JPEG', quality=95)
+                bg_bytes = buf.getvalue()
+            files['background'] = ('background', io.BytesIO(bg_bytes), 'application/octet-stream')
+
+        resp, _ = self._dispatch('/render/news_image', {'params': json.dumps(params)}, files, RENDER_TIMEOUT)
+        if resp is not None:
+            return io.BytesIO(resp.content) if resp.status_code == 200 else None
+        logger.warning("No render node available, rendering locally.")
+        return render_pool.render_news_image(background=background, **params)
+
+    def render_overlay(self, **params):
+        if params.get('user_id'):
+            return render_pool.render_overlay(**params)
+        resp, _ = self._dispatch('/render/overlay', {'params': json.dumps(params)}, {}, RENDER_TIMEOUT)
+        if resp is not None:
+            return io.BytesIO(resp.content) if resp.status_code == 200 else None
+        logger.warning("No render node available, rendering overlay locally.")
+        return render_pool.render_overlay(**params)
+
+    def render_video(self, video_path, **params):
+        """Uploads the source video, streams the result to <video>_final.mp4. Returns the path or None."""
+        if params.get('user_id'):
+            return render_video_locally(video_path, **params)
+        output_path = video_path.replace(".mp4", "_final.mp4")
+        if output_path == video_path:
+            output_path = f"{video_path}_final.mp4"
+
+        with open(video_path, 'rb') as f:
+            files = {'video': ('video.mp4', f, 'video/mp4')}
+            resp, node = self._dispatch('/render/video', {'params': json.dumps(params)}, files, VIDEO_TIMEOUT, stream=True)
+            if resp is not None and resp.status_code != 200:
+                return None
+            if resp is not None:
+                try:
+                    with open(output_path, 'wb') as out:
+                        for chunk in resp.iter_content(chunk_size=256 * 1024):
+                            out.write(chunk)
+                    return output_path
+                except Exception as e:
+                    logger.error(f"Streaming video from render node failed: {e}")
+                finally:
+                    resp.close()
+                    self._release(node)
+
+        logger.warning("No render node available, processing video locally.")
+        return render_video_locally(video_path, **params)
+
+def render_video_locally(video_path, **params):
+    overlay_io = render_pool.render_overlay(**params)
+    if not overlay_io:
+        return None
+    return video_generator.process_video_with_overlay(video_path, overlay_io)
+
+_client = None
+
+def get_render_client():
+    """Shared client, or None when no RENDER_NODES are configured."""
+    global _client
+    if not RENDER_NODES:
+        return None
+    if _client is None:
+        _client = RenderClient(RENDER_NODES)
+    return _client
+
+# --- Module level entry points (remote when configured, local otherwise) ---
+
+def _render_news_image(background=None, **params):
+    client = get_render_client()
+    if client:
+        return client.render_news_image(background=background, **params)
+    return render_pool.render_news_image(background=background, **params)
+
+def _background_digest(background):
+    """
+    Single-flight key part for a background: encoded bytes are hashed (cheap, and the
+    same upload matches across callers); a PIL image is keyed by identity, since
+    tobytes() would copy the whole pixel buffer on every render.
+    """
+    if background is None:
+        return None
+    if isinstance(background, (bytes, bytearray)):
+        return singleflight.content_key(bytes(background))
+    return ('image', id(background), background.mode, background.size)
+
+def render_news_image(background=None, **params):
+    """
+    Identical renders already in flight (same params + background) are joined;
+    every caller gets its own BytesIO over the shared PNG bytes.
+    """
+    key = singleflight.content_key('news_image', params, _background_digest(background))
+
+    def render():
+        img_io = _render_news_image(background=background, **params)
+        return img_io.getvalue() if img_io else None
+
+    data = singleflight.render.do(key, render)
+    return io.BytesIO(data) if data else None
+
+def render_overlay(**params):
+    client = get_render_client()
+    if client:
+        return client.render_overlay(**params)
+    return render_pool.render_overlay(**params)
+
+def render_video(video_path, **params):
+    client = get_render_client()
+    if client:
+        return client.render_video(video_path, **params)
+    return render_video_locally(video_path, **params)
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import os
+
+from src import media_cache, render_client, task_queue
+
+logger = logging.getLogger(__name__)
+
+JOB_RESULTS_DIR = os.path.join(os.getcwd(), 'job_results')
+
+# Video jobs run ffmpeg and need a longer lease than image renders
+JOB_LEASES = {
+    'news_image': 120,
+    'video_overlay': 600,
+}
+
+def _result_path(job_id, ext):
+    os.makedirs(JOB_RESULTS_DIR, exist_ok=True)
+    return os.path.join(JOB_RESULTS_DIR, f"{job_id}.{ext}")
+
+def _color(value):
+    # JSON turns RGB tuples into lists
+    return tuple(value) if isinstance(value, list) else value
+
+def run_news_image_job(job_id, payload):
+    """Renders a news image. Payload mirrors create_news_image kwargs (JSON-safe ones only)."""
+    img_io = render_client.render_news_image(
+        title=payload['title'],
+        source=payload.get('source', 'Newsu'),
+        date_str=payload.get('date_str', ''),
+        image_url=payload.get('image_url'),
+        summary=payload.get('summary'),
+        manual_color=_color(payload.get('manual_color')),
+        highlight_text=payload.get('highlight_text'),
+        highlight_padding=payload.get('highlight_padding'),
+        user_id=payload.get('user_id')
+    )
+    if not img_io:
+        raise RuntimeError("create_news_image returned nothing")
+
+    path = _result_path(job_id, 'png')
+    with open(path, 'wb') as f:
+        f.write(img_io.getbuffer())
+    return path
+
+def run_video_overlay_job(job_id, payload):
+    """Creates the text overlay and burns it into the source video with ffmpeg."""
+    video_path = payload['video_path']
+    if not os.path.exists(video_path):
+        raise FileNotFoundError(f"Source video missing: {video_path}")
+
+    final_path = render_client.render_video(
+        video_path,
+        title=payload['title'],
+        summary=payload.get('summary'),
+        date_str=payload.get('date_str', ''),
+        source=payload.get('source', 'Newsu'),
+        manual_color=_color(payload.get('manual_color')),
+        highlight_text=payload.get('highlight_text'),
+        highlight_padding=payload.get('highlight_padding'),
+        user_id=payload.get('user_id')
+    )
+    if not final_path or not os.path.exists(final_path):
+        raise RuntimeError("Video processing failed")
+    return final_path
+
+JOB_HANDLERS = {
+    'news_image': run_news_image_job,
+    'video_overlay': run_video_overlay_job,
+}
+
+def execute_claimed_job(job, worker_id):
+    """Runs an already-claimed job. Returns the result path or None."""
+    return task_queue.run_job(job, JOB_HANDLERS, worker_id)
+
+async def run_now(kind, payload, chat_id, prefix="bot"):
+    """
+    Records the render in the durable queue, then runs it right away in this process
+    under its own worker id. If the bot dies mid-render the lease expires and the
+    queue runner picks it up. Returns the job dict after the attempt (check job['state']).
+    """
+    job_id = task_queue.enqueue_job(kind, payload, chat_id=chat_id)
+    worker_id = task_queue.make_worker_id(prefix)
+    job = task_queue.claim_job(job_id, worker_id, lease_seconds=JOB_LEASES.get(kind, task_queue.DEFAULT_LEASE_SECONDS))
+    if job:
+        await asyncio.to_thread(execute_claimed_job, job, worker_id)
+    # Not claimable -> already done (idempotent hit) or owned by another worker
+    return task_queue.get_job(job_id)
+
+def result_ready(job):
+    """True for a done job whose result file is still on disk (results are cleaned up after a few days)."""
+    return bool(job and job['state'] == task_queue.STATE_DONE and job['result_path'] and os.path.exists(job['result_path']))
+
+def requeue(job):
+    """Queues a done job whose result file is gone again; the queue runner renders and delivers it."""
+    return task_queue.enqueue_job(job['kind'], job['payload'], chat_id=job['chat_id'], max_attempts=job['max_attempts'])
+
+async def send_result(job, send_photo, send_video, caption, reply_markup=None):
+    """Sends a job's result file (video or photo by extension) through the media cache."""
+    with open(job['result_path'], 'rb') as f:
+        if job['result_path'].endswith('.mp4'):
+            await media_cache.send_video_cached(send_video, f, caption=caption, reply_markup=reply_markup)
+        else:
+            await media_cache.send_photo_cached(send_photo, f, caption=caption, reply_markup=reply_markup)
+
+async def reply_with_job(reply, status_msg, job, caption, edit_status, fail_text="❌ Render failed.",
+                         pending_text="⏳ Render is still in progress. I'll send it when ready.", reply_markup=None):
+    """
+    Answers a render request with the job returned by run_now: sends the result as a
+    reply to `reply`, or reports through edit_status(status_msg, text) that it is still
+    queued (process_render_jobs delivers it later), failed, or has to be rendered again.
+    """
+    if result_ready(job):
+        await status_msg.delete()
+        await send_result(job, reply.reply_photo, reply.reply_video, caption, reply_markup)
+        task_queue.mark_job_delivered(job['job_id'])
+    elif job and job['state'] == task_queue.STATE_DONE:
+        requeue(job)
+        await edit_status(status_msg, "⏳ The earlier result expired, rendering it again. I'll send it when ready.")
+    elif job and job['state'] in (task_queue.STATE_QUEUED, task_queue.STATE_RUNNING):
+        await edit_status(status_msg, pending_text)
+    else:
+        await edit_status(status_msg, fail_text)
+        if job: task_queue.mark_job_delivered(job['job_id'])
+
+def edit_params(payload):
+    """The edit flow's last_gen_params for a job payload, so a result delivered later can be edited too."""
+    params = {
+        'title': payload.get('title'),
+        'summary': payload.get('summary'),
+        'source': payload.get('source', 'Newsu'),
+        'date_str': payload.get('date_str', ''),
+        'image_url': payload.get('image_url'),
+        'manual_image': None,
+        'manual_color': _color(payload.get('manual_color')),
+        'highlight_text': payload.get('highlight_text'),
+        'highlight_padding': payload.get('highlight_padding'),
+    }
+    if payload.get('video_path'):
+        params['manual_video'] = payload['video_path']
+    return params
+
+def main():
+    """Standalone worker process: python -m src.render_jobs"""
+    from src.utils.logger import setup_logger
+    setup_logger()
+    task_queue.run_worker(JOB_HANDLERS, lease_seconds=max(JOB_LEASES.values()))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+import argparse
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+from flask import Flask, Response, jsonify, request, send_file
+
+from src import render_pool, video_generator
+from src.config import RENDER_NODE_CAPACITY
+
+logger = logging.getLogger(__name__)
+
+app = Flask('render_node')
+
+_in_flight = 0
+_served = 0
+_lock = threading.Lock()
+
+def _acquire():
+    global _in_flight
+    with _lock:
+        if _in_flight >= RENDER_NODE_CAPACITY:
+            return False
+        _in_flight += 1
+        return True
+
+def _release():
+    global _in_flight, _served
+    with _lock:
+        _in_flight -= 1
+        _served += 1
+
+def _read_params():
+    params = json.loads(request.form.get('params') or '{}')
+    # JSON turns RGB tuples into lists
+    if isinstance(params.get('manual_color'), list):
+        params['manual_color'] = tuple(params['manual_color'])
+    return params
+
+def _busy():
+    return jsonify({'error': 'busy', 'in_flight': _in_flight}), 503
+
+@app.route('/health')
+def health():
+    return jsonify({
+        'status': 'ok',
+        'pid': os.getpid(),
+        'in_flight': _in_flight,
+        'capacity': RENDER_NODE_CAPACITY,
+        'served': _served,
+    })
+
+@app.route('/render/news_image', methods=['POST'])
+def render_news_image():
+    if not _acquire():
+        return _busy()
+    try:
+        params = _read_params()
+        bg_file = request.files.get('background')
+        background = bg_file.read() if bg_file else None
+        img_io = render_pool.render_news_image(background=background, **params)
+        if not img_io:
+            return jsonify({'error': 'render failed'}), 500
+        return send_file(img_io, mimetype='image/png')
+    except Exception as e:
+        logger.error(f"Node news_image render failed: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        _release()
+
+@app.route('/render/overlay', methods=['POST'])
+def render_overlay():
+    if not _acquire():
+        return _busy()
+    try:
+        img_io = render_pool.render_overlay(**_read_params())
+        if not img_io:
+            return jsonify({'error': 'render failed'}), 500
+        return send_file(img_io, mimetype='image/png')
+    except Exception as e:
+        logger.error(f"Node overlay render failed: {e}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        _release()
+
+@app.route('/render/video', methods=['POST'])
+def render_video():
+    """Multipart: 'params' (overlay kwargs) + 'video' file. Streams the final MP4 back."""
+    if not _acquire():
+        return _busy()
+    work_dir = tempfile.mkdtemp(prefix='render_node_')
+    try:
+        video_file = request.files.get('video')
+        if not video_file:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            _release()
+            return jsonify({'error': 'missing video'}), 400
+
+        video_path = os.path.join(work_dir, 'source.mp4')
+        video_file.save(video_path)
+
+        overlay_io = render_pool.render_overlay(**_read_params())
+        final_path = video_generator.process_video_with_overlay(video_path, overlay_io) if overlay_io else None
+        if not final_path:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            _release()
+            return jsonify({'error': 'video processing failed'}), 500
+    except Exception as e:
+        logger.error(f"Node video render failed: {e}")
+        shutil.rmtree(work_dir, ignore_errors=True)
+        _release()
+        return jsonify({'error': str(e)}), 500
+
+    def stream():
+        with open(final_path, 'rb') as f:
+            while True:
+                chunk = f.read(256 * 1024)
+                if not chunk:
+                    break
+                yield chunk
+
+    def cleanup():
+        # Runs when the server closes the response: after the body is sent, or on a
+        # disconnect, even one before stream() ever started
+        shutil.rmtree(work_dir, ignore_errors=True)
+        _release()
+
+    response = Response(stream(), mimetype='video/mp4',
+                        headers={'Content-Length': str(os.path.getsize(final_path))})
+    response.call_on_close(cleanup)
+    return response
+
+def main():
+    """Run a node: python -m src.render_node --port 8101"""
+    from src.utils.logger import setup_logger
+    parser = argparse.ArgumentParser(description="Newsu render node")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8101)
+    args = parser.parse_args()
+
+    setup_logger()
+    logger.info(f"Render node listening on {args.host}:{args.port} (capacity {RENDER_NODE_CAPACITY})")
+    app.run(host=args.host, port=args.port, threaded=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,320 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+from PIL import Image
+
+from src import config_store, image_generator
+from src.config import RENDER_POOL_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# Backgrounds above this size go through shared memory instead of the pickle pipe
+SHM_THRESHOLD = 1024 * 1024
+RENDER_TIMEOUT = 60 # seconds of execution per render (time spent queued does not count)
+# A worker still on a render this long past its deadline is stuck in native code
+# (the in-worker alarm could not interrupt it) and gets killed
+KILL_GRACE = 15
+WATCH_INTERVAL = 1.0
+
+class RenderTimeout(BaseException):
+    """
+    A render overran its deadline inside the worker. BaseException so the broad
+    `except Exception` blocks in image_generator don't swallow it and carry on.
+    """
+
+# --- Worker side ---
+
+_events = None # queue of ('start' | 'end', token, pid, deadline) messages to the parent
+
+def _init_worker(events=None):
+    """Runs once per worker process: compile the default template and preload its fonts."""
+    global _events
+    from src.components import fonts, template
+
+    _events = events
+    fonts.preload(template.get().config)
+    logger.info(f"Render worker {os.getpid()} ready")
+
+def _on_deadline(signum, frame):
+    raise RenderTimeout("render deadline exceeded")
+
+def _unpack_background(background):
+    """Rebuilds the background from a packed message (see _pack_background): encoded bytes or a PIL image."""
+    if not background:
+        return None
+    kind = background[0]
+    if kind == 'encoded':
+        return background[1] # decoded by create_news_image, near the canvas scale
+    if kind == 'raw':
+        _, mode, size, data = background
+        return Image.frombytes(mode, size, data)
+    if kind == 'shm':
+        _, mode, size, shm_name, nbytes = background
+        shm = shared_memory.SharedMemory(name=shm_name)
+        try:
+            # frombytes copies, so the segment can be closed right after
+            return Image.frombytes(mode, size, bytes(shm.buf[:nbytes]))
+        finally:
+            shm.close()
+    raise ValueError(f"Unknown background message: {kind}")
+
+def _render_in_worker(kind, params, background, token=None, timeout=RENDER_TIMEOUT, config_version=None):
+    """
+    Executes one render request. Returns the encoded PNG bytes (or None).
+    The deadline counts from here (not from submission) and is enforced with an alarm.
+    config_version: the parent's config_store.version() of the user, so a template
+    saved a moment ago is not rendered from this worker's cached snapshot.
+    """
+    if _events is not None:
+        _events.put(('start', token, os.getpid(), time.time() + timeout))
+    signal.signal(signal.SIGALRM, _on_deadline)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        if config_version is not None:
+            config_store.revalidate(params.get('user_id'), config_version)
+        manual_image = _unpack_background(background)
+        if kind == 'news_image':
+            output = image_generator.create_news_image(manual_image=manual_image, **params)
+        elif kind == 'overlay':
+            output = image_generator.create_overlay_image(**params)
+        else:
+            raise ValueError(f"Unknown render kind: {kind}")
+        return output.getvalue() if output else None
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        if _events is not None:
+            _events.put(('end', token, os.getpid(), None))
+
+def _ping():
+    return os.getpid()
+
+# --- Parent side ---
+
+def _pack_background(image):
+    """
+    Turns a background into a compact message for a worker.
+    Bytes (an encoded file) are sent as-is; PIL images are sent as raw pixels,
+    through a shared-memory segment when large. Returns (message, shm_or_None).
+    """
+    if image is None:
+        return None, None
+    if isinstance(image, (bytes, bytearray)):
+        return ('encoded', bytes(image)), None
+
+    if image.mode not in ('RGB', 'RGBA', 'L'):
+        image = image.convert('RGB')
+    data = image.tobytes()
+    if len(data) < SHM_THRESHOLD:
+        return ('raw', image.mode, image.size, data), None
+
+    shm = shared_memory.SharedMemory(create=True, size=len(data))
+    shm.buf[:len(data)] = data
+    return ('shm', image.mode, image.size, shm.name, len(data)), shm
+
+class RenderPool:
+    """
+    Process pool for CPU-bound Pillow renders, so they don't hold the bot's GIL.
+    Workers are spawned fresh (no forked event loop state) and preload assets once.
+    Each render has an execution deadline enforced in its worker; a worker stuck past
+    it is killed. A broken pool (crashed or killed worker) is respawned automatically
+    and the renders that were in flight on it are retried once.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor = None
+        self._events = None
+        self._running = {} # token -> (worker pid, deadline) of renders executing right now
+        self._killed = set()
+        self._lock = threading.Lock()
+        self.respawns = 0
+        self.kills = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                ctx = multiprocessing.get_context('spawn')
+                self._events = ctx.Queue()
+                self._running.clear()
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=ctx,
+                    initializer=_init_worker,
+                    initargs=(self._events,)
+                )
+                logger.info(f"Render pool started with {self.max_workers} workers")
+            return self._executor
+
+    def respawn(self, reason="", executor=None, kill=False):
+        """
+        Replaces the pool. With `executor`, only if it is still the current one (several
+        callers seeing the same broken pool respawn it once). Queued renders are not
+        cancelled; kill=True terminates the old workers (stuck ones keep their memory otherwise).
+        """
+        with self._lock:
+            old = self._executor
+            if executor is not None and old is not executor:
+                return
+            self._executor = None
+            self.respawns += 1
+        logger.warning(f"Respawning render pool ({reason})")
+        if old:
+            processes = list((getattr(old, '_processes', None) or {}).values()) # not public API
+            old.shutdown(wait=False)
+            if kill:
+                for process in processes:
+                    if process.is_alive():
+                        process.kill()
+
+    def _drain_events(self):
+        with self._lock:
+            events = self._events
+            while events is not None:
+                try:
+                    event, token, pid, deadline = events.get_nowait()
+                except (queue.Empty, OSError, ValueError):
+                    break
+                if event == 'start':
+                    self._running[token] = (pid, deadline)
+                else:
+                    self._running.pop(token, None)
+
+    def _kill_overrun(self):
+        """Kills workers still executing a render KILL_GRACE seconds past its deadline."""
+        self._drain_events()
+        now = time.time()
+        with self._lock:
+            stuck = [(token, pid) for token, (pid, deadline) in self._running.items() if now > deadline + KILL_GRACE]
+            for token, _ in stuck:
+                self._running.pop(token, None)
+                self._killed.add(token)
+        for token, pid in stuck:
+            logger.error(f"Render worker {pid} stuck past its deadline, killing it")
+            try:
+                os.kill(pid, signal.SIGKILL)
+                self.kills += 1
+            except OSError:
+                pass
+
+    def render(self, kind, params, background=None, timeout=RENDER_TIMEOUT):
+        """
+        Blocking render in a worker. kind: 'news_image' or 'overlay'.
+        params: create_news_image / create_overlay_image kwargs (picklable values only).
+        background: PIL image or encoded image bytes (news_image only).
+        timeout: execution seconds, counted from when a worker starts the render.
+        Returns PNG bytes or None. Retries once on a fresh pool if a worker died.
+        """
+        message, shm = _pack_background(background)
+        token = uuid.uuid4().hex
+        config_version = config_store.version(params.get('user_id'))
+        try:
+            for attempt in range(2):
+                executor = self._get_executor()
+                try:
+                    future = executor.submit(_render_in_worker, kind, params, message, token, timeout, config_version)
+                    while True:
+                        try:
+                            return future.result(timeout=WATCH_INTERVAL)
+                        except FutureTimeout:
+                            self._kill_overrun()
+                except BrokenProcessPool:
+                    self.respawn("worker died during render", executor)
+                    if token in self._killed:
+                        return None # this render was the stuck one, don't run it again
+                except RenderTimeout:
+                    logger.error(f"Render ({kind}) exceeded {timeout}s, aborted in the worker")
+                    return None
+            return None
+        finally:
+            self._killed.discard(token)
+            if shm:
+                shm.close()
+                shm.unlink()
+
+    async def render_async(self, kind, params, background=None, timeout=RENDER_TIMEOUT):
+        return await asyncio.to_thread(self.render, kind, params, background, timeout)
+
+    def check_health(self, timeout=10):
+        """
+        Checks that every worker process is alive and that the pool answers a ping,
+        and kills workers stuck on a render. Respawns the pool if it is broken or
+        unresponsive. Returns True if healthy.
+        """
+        executor = self._get_executor()
+        self._kill_overrun()
+        processes = list((getattr(executor, '_processes', None) or {}).values())
+        dead = [p.pid for p in processes if not p.is_alive()]
+        if dead:
+            self.respawn(f"workers {dead} died", executor)
+            return False
+        try:
+            executor.submit(_ping).result(timeout=timeout)
+            logger.debug(f"Render pool healthy: {len(processes)} live workers, {len(self._running)} renders running")
+            return True
+        except BrokenProcessPool:
+            self.respawn("health check: pool broken", executor)
+            return False
+        except FutureTimeout:
+            # Every worker busy or stuck: stuck ones are killed above, a busy pool is left alone
+            self._drain_events()
+            if len(self._running) < self.max_workers:
+                self.respawn("health check: ping unanswered", executor, kill=True)
+                return False
+            logger.warning("Render pool health check: all workers busy")
+            return True
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_render_pool():
+    """Shared pool, or None when disabled (RENDER_POOL_WORKERS=0)."""
+    global _pool
+    if RENDER_POOL_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = RenderPool(RENDER_POOL_WORKERS)
+        return _pool
+
+def render_news_image(background=None, **params):
+    """
+    Drop-in for image_generator.create_news_image that runs in the pool.
+    `background` replaces manual_image. Returns a BytesIO (or None), like the original.
+    Falls back to rendering in-process if the pool is disabled or unavailable.
+    """
+    pool = get_render_pool()
+    if pool:
+        try:
+            data = pool.render('news_image', params, background)
+            return io.BytesIO(data) if data else None
+        except Exception as e:
+            logger.error(f"Render pool failed, rendering in-process: {e}")
+    return image_generator.create_news_image(manual_image=background, **params)
+
+def render_overlay(**params):
+    """Drop-in for image_generator.create_overlay_image that runs in the pool."""
+    pool = get_render_pool()
+    if pool:
+        try:
+            data = pool.render('overlay', params)
+            return io.BytesIO(data) if data else None
+        except Exception as e:
+            logger.error(f"Render pool failed, rendering in-process: {e}")
+    return image_generator.create_overlay_image(**params)
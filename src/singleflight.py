@@ -0,0 +1,89 @@
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+def content_key(*parts):
+    """Stable SHA-256 over JSON-able parts (bytes are hashed as-is)."""
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, (bytes, bytearray)):
+            h.update(part)
+        else:
+            h.update(json.dumps(part, sort_keys=True, default=str).encode('utf-8'))
+        h.update(b'\x00')
+    return h.hexdigest()
+
+class Group:
+    """
+    Coalesces identical concurrent calls: while a call for `key` is running,
+    later callers wait for it and get the same result (or exception).
+    Nothing is cached once the call finishes.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._async_calls = {}   # key -> asyncio.Future (bot event loop)
+        self._thread_calls = {}  # key -> _ThreadCall
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'shared': 0}
+
+    async def do_async(self, key, coro_fn):
+        """Awaits coro_fn() once per key; concurrent awaiters share its result."""
+        fut = self._async_calls.get(key)
+        if fut is not None:
+            self.stats['shared'] += 1
+            return await asyncio.shield(fut)
+
+        self.stats['calls'] += 1
+        fut = asyncio.ensure_future(coro_fn())
+        self._async_calls[key] = fut
+        fut.add_done_callback(lambda _: self._async_calls.pop(key, None))
+        # shield: one cancelled caller must not cancel the shared call
+        return await asyncio.shield(fut)
+
+    def do(self, key, fn):
+        """Blocking version for worker threads (e.g. asyncio.to_thread renders)."""
+        with self._lock:
+            call = self._thread_calls.get(key)
+            leader = call is None
+            if leader:
+                call = _ThreadCall()
+                self._thread_calls[key] = call
+                self.stats['calls'] += 1
+            else:
+                self.stats['shared'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._thread_calls[key]
+            call.done.set()
+        return call.result
+
+class _ThreadCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+# Shared groups
+llm = Group('llm')
+search = Group('search')
+render = Group('render')
+
+def report():
+    return ", ".join(f"{g.name}: {g.stats['shared']} shared / {g.stats['calls']} calls" for g in (llm, search, render))
@@ -0,0 +1,347 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+
+from src import database as db
+
+logger = logging.getLogger(__name__)
+
+# Job States
+STATE_QUEUED = 'queued'
+STATE_RUNNING = 'running'
+STATE_DONE = 'done'
+STATE_FAILED = 'failed'
+
+DEFAULT_LEASE_SECONDS = 120
+RETRY_BASE_DELAY = 5     # seconds, doubled per attempt
+RETRY_MAX_DELAY = 300
+HEARTBEATS_PER_LEASE = 3 # a running job renews its lease this often per lease period
+
+_JOB_COLUMNS = (
+    'job_id', 'kind', 'payload', 'chat_id', 'state', 'attempts', 'max_attempts',
+    'worker_id', 'lease_expires_at', 'available_at', 'created_at', 'started_at',
+    'finished_at', 'delivered_at', 'result_path', 'last_error'
+)
+
+def make_worker_id(prefix="worker"):
+    """Unique-enough id for a worker loop (host + pid + random suffix)."""
+    return f"{prefix}-{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+def job_hash(kind, payload, chat_id=None):
+    """Content hash used as the job id, so re-submitting the same job is a no-op."""
+    raw = json.dumps({'kind': kind, 'payload': payload, 'chat_id': chat_id}, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def _row_to_job(row):
+    if not row:
+        return None
+    job = dict(zip(_JOB_COLUMNS, row))
+    job['payload'] = json.loads(job['payload'])
+    return job
+
+def enqueue_job(kind, payload, chat_id=None, max_attempts=3):
+    """
+    Adds a job to the durable queue and returns its id.
+    Idempotent: an identical (kind, payload, chat_id) returns the existing job.
+    A previously failed job, or a done one whose result file was cleaned up, is
+    re-queued with a fresh attempt budget.
+    """
+    job_id = job_hash(kind, payload, chat_id)
+    now = time.time()
+    conn = db.get_connection()
+    try:
+        c = conn.cursor()
+        c.execute('BEGIN IMMEDIATE')
+        c.execute('SELECT state, result_path FROM render_jobs WHERE job_id = ?', (job_id,))
+        row = c.fetchone()
+        if row is None:
+            c.execute('''
+                INSERT INTO render_jobs (job_id, kind, payload, chat_id, state, max_attempts, available_at, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (job_id, kind, json.dumps(payload, default=str), chat_id, STATE_QUEUED, max_attempts, now, now))
+            logger.info(f"Enqueued {kind} job {job_id[:12]}")
+        elif row[0] == STATE_FAILED or (row[0] == STATE_DONE and not (row[1] and os.path.exists(row[1]))):
+            c.execute('''
+                UPDATE render_jobs SET state = ?, attempts = 0, available_at = ?, last_error = NULL,
+                    worker_id = NULL, lease_expires_at = NULL, delivered_at = NULL, result_path = NULL
+                WHERE job_id = ?
+            ''', (STATE_QUEUED, now, job_id))
+            logger.info(f"Re-queued {row[0]} {kind} job {job_id[:12]}")
+        conn.commit()
+    finally:
+        conn.close()
+    return job_id
+
+def get_job(job_id):
+    conn = db.get_connection()
+    try:
+        c = conn.cursor()
+        c.execute(f'SELECT {", ".join(_JOB_COLUMNS)} FROM render_jobs WHERE job_id = ?', (job_id,))
+        return _row_to_job(c.fetchone())
+    finally:
+        conn.close()
+
+def _claim(where_sql, params, worker_id, lease_seconds):
+    now = time.time()
+    conn = db.get_connection()
+    try:
+        c = conn.cursor()
+        c.execute('BEGIN IMMEDIATE')
+        while True:
+            # Claimable: queued and due, or running with an expired lease (crashed worker)
+            c.execute(f'''
+                SELECT {", ".join(_JOB_COLUMNS)} FROM render_jobs
+                WHERE {where_sql} AND (
+                    (state = ? AND available_at <= ?) OR
+                    (state = ? AND lease_expires_at < ?)
+                )
+                ORDER BY available_at ASC
+                LIMIT 1
+            ''', (*params, STATE_QUEUED, now, STATE_RUNNING, now))
+            job = _row_to_job(c.fetchone())
+            if not job:
+                conn.commit()
+                return None
+            if job['state'] != STATE_RUNNING:
+                break
+
+            # The expired lease was an attempt too: a job that keeps crashing its worker stops at max_attempts
+            if job['attempts'] < job['max_attempts']:
+                logger.warning(f"Lease expired for job {job['job_id'][:12]} (worker {job['worker_id']}). Reclaiming.")
+                break
+            c.execute('''
+                UPDATE render_jobs SET state = ?, finished_at = ?, lease_expires_at = NULL, last_error = ?
+                WHERE job_id = ?
+            ''', (STATE_FAILED, now, f"Lease expired on attempt {job['attempts']} (worker {job['worker_id']})", job['job_id']))
+            logger.error(f"Job {job['job_id'][:12]} failed permanently: lease expired after {job['attempts']} attempts")
+
+        c.execute('''
+            UPDATE render_jobs SET state = ?, worker_id = ?, lease_expires_at = ?, started_at = ?, attempts = attempts + 1
+            WHERE job_id = ?
+        ''', (STATE_RUNNING, worker_id, now + lease_seconds, now, job['job_id']))
+        conn.commit()
+
+        job.update(state=STATE_RUNNING, worker_id=worker_id, lease_expires_at=now + lease_seconds,
+                   started_at=now, attempts=job['attempts'] + 1)
+        return job
+    finally:
+        conn.close()
+
+def claim_job(job_id, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """Claims a specific job. Returns the job dict or None if it is not claimable."""
+    return _claim('job_id = ?', (job_id,), worker_id, lease_seconds)
+
+def claim_next_job(worker_id, kinds=None, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """Claims the oldest due job (optionally restricted to kinds)."""
+    if kinds:
+        placeholders = ", ".join("?" for _ in kinds)
+        return _claim(f'kind IN ({placeholders})', tuple(kinds), worker_id, lease_seconds)
+    return _claim('1 = 1', (), worker_id, lease_seconds)
+
+def extend_lease(job_id, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """Heartbeat for long jobs. Returns False if the lease was lost."""
+    conn = db.get_connection()
+    try:
+        c = conn.cursor()
+        c.execute('UPDATE render_jobs SET lease_expires_at = ? WHERE job_id = ? AND worker_id = ? AND state = ?',
+                  (time.time() + lease_seconds, job_id, worker_id, STATE_RUNNING))
+        conn.commit()
+        return c.rowcount == 1
+    finally:
+        conn.close()
+
+def complete_job(job_id, worker_id, result_path):
+    """Marks a job done and stores the pointer to its output file."""
+    conn = db.get_connection()
+    try:
+        c = conn.cursor()
+        c.execute('''
+            UPDATE render_jobs SET state = ?, finished_at = ?, result_path = ?, lease_expires_at = NULL, last_error = NULL
+            WHERE job_id = ? AND worker_id = ?
+        ''', (STATE_DONE, time.time(), result_path, job_id, worker_id))
+        conn.commit()
+        if c.rowcount != 1:
+            logger.warning(f"Job {job_id[:12]} completed by {worker_id} but lease was lost.")
+        return c.rowcount == 1
+    finally:
+        conn.close()
+
+def fail_job(job_id, worker_id, error):
+    """
+    Records a failed attempt. Re-queues with exponential backoff (+ jitter)
+    until max_attempts is reached, then marks the job failed.
+    """
+    now = time.time()
+    conn = db.get_connection()
+    try:
+        c = conn.cursor()
+        c.execute('BEGIN IMMEDIATE')
+        c.execute('SELECT attempts, max_attempts FROM render_jobs WHERE job_id = ? AND worker_id = ?', (job_id, worker_id))
+        row = c.fetchone()
+        if not row:
+            conn.commit()
+            return None
+        attempts, max_attempts = row
+        if attempts >= max_attempts:
+            c.execute('''
+                UPDATE render_jobs SET state = ?, finished_at = ?, lease_expires_at = NULL, last_error = ?
+                WHERE job_id = ?
+            ''', (STATE_FAILED, now, str(error)[:500], job_id))
+            new_state = STATE_FAILED
+            logger.error(f"Job {job_id[:12]} failed permanently after {attempts} attempts: {error}")
+        else:
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** (attempts - 1)))
+            delay += random.uniform(0, delay * 0.2)
+            c.execute('''
+                UPDATE render_jobs SET state = ?, available_at = ?, worker_id = NULL, lease_expires_at = NULL, last_error = ?
+                WHERE job_id = ?
+            ''', (STATE_QUEUED, now + delay, str(error)[:500], job_id))
+            new_state = STATE_QUEUED
+            logger.warning(f"Job {job_id[:12]} attempt {attempts} failed, retrying in {delay:.0f}s: {error}")
+        conn.commit()
+        return new_state
+    finally:
+        conn.close()
+
+def get_undelivered_jobs(finished_before=0, limit=10):
+    """
+    Done or failed jobs with a chat to notify that were never delivered (e.g. after a restart).
+    finished_before: only jobs finished at least this many seconds ago, so a result
+    that is being sent right now by the handler that rendered it is not sent twice.
+    """
+    conn = db.get_connection()
+    try:
+        c = conn.cursor()
+        c.execute(f'''
+            SELECT {", ".join(_JOB_COLUMNS)} FROM render_jobs
+            WHERE state IN (?, ?) AND chat_id IS NOT NULL AND delivered_at IS NULL AND finished_at <= ?
+            ORDER BY finished_at ASC LIMIT ?
+        ''', (STATE_DONE, STATE_FAILED, time.time() - finished_before, limit))
+        return [_row_to_job(r) for r in c.fetchall()]
+    finally:
+        conn.close()
+
+def mark_job_delivered(job_id):
+    conn = db.get_connection()
+    try:
+        conn.execute('UPDATE render_jobs SET delivered_at = ? WHERE job_id = ?', (time.time(), job_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+def get_queue_metrics():
+    """
+    Depth and age numbers for capacity planning.
+    Returns: {'depth': {state: count}, 'oldest_queued_age', 'avg_wait', 'avg_run_time', 'finished_last_hour'}
+    """
+    now = time.time()
+    conn = db.get_connection()
+    try:
+        c = conn.cursor()
+        c.execute('SELECT state, COUNT(*) FROM render_jobs GROUP BY state')
+        depth = {STATE_QUEUED: 0, STATE_RUNNING: 0, STATE_DONE: 0, STATE_FAILED: 0}
+        depth.update(dict(c.fetchall()))
+
+        c.execute('SELECT MIN(created_at) FROM render_jobs WHERE state = ?', (STATE_QUEUED,))
+        oldest = c.fetchone()[0]
+
+        c.execute('''
+            SELECT AVG(started_at - created_at), AVG(finished_at - started_at), COUNT(*)
+            FROM render_jobs WHERE state = ? AND finished_at >= ?
+        ''', (STATE_DONE, now - 3600))
+        avg_wait, avg_run, finished = c.fetchone()
+    finally:
+        conn.close()
+
+    return {
+        'depth': depth,
+        'oldest_queued_age': round(now - oldest, 1) if oldest else 0.0,
+        'avg_wait': round(avg_wait or 0.0, 2),
+        'avg_run_time': round(avg_run or 0.0, 2),
+        'finished_last_hour': finished,
+    }
+
+def cleanup_jobs(days=3):
+    """Removes finished jobs (and their result files) older than X days."""
+    cutoff = time.time() - days * 86400
+    conn = db.get_connection()
+    try:
+        c = conn.cursor()
+        c.execute('SELECT job_id, result_path FROM render_jobs WHERE state IN (?, ?) AND finished_at < ?',
+                  (STATE_DONE, STATE_FAILED, cutoff))
+        rows = c.fetchall()
+        for _, path in rows:
+            if path and os.path.exists(path):
+                try: os.remove(path)
+                except OSError: pass
+        c.execute('DELETE FROM render_jobs WHERE state IN (?, ?) AND finished_at < ?',
+                  (STATE_DONE, STATE_FAILED, cutoff))
+        conn.commit()
+    finally:
+        conn.close()
+    if rows:
+        logger.info(f"Cleaned up {len(rows)} old render jobs.")
+
+def _heartbeat(job_id, worker_id, lease_seconds, stop):
+    """Renews a running job's lease until `stop` is set, so a long render is not reclaimed mid-run."""
+    while not stop.wait(lease_seconds / HEARTBEATS_PER_LEASE):
+        try:
+            if not extend_lease(job_id, worker_id, lease_seconds):
+                logger.warning(f"Job {job_id[:12]} lost its lease while {worker_id} was running it.")
+                return
+        except Exception as e:
+            logger.warning(f"Lease heartbeat failed for job {job_id[:12]}: {e}")
+
+def run_job(job, handlers, worker_id):
+    """
+    Executes a claimed job with the handler registered for its kind.
+    Handlers take (job_id, payload) and return a result file path.
+    The lease is renewed (same length as claimed) while the handler runs.
+    Returns the result path, or None if the attempt failed.
+    """
+    handler = handlers.get(job['kind'])
+    if not handler:
+        fail_job(job['job_id'], worker_id, f"No handler for job kind '{job['kind']}'")
+        return None
+
+    lease_seconds = DEFAULT_LEASE_SECONDS
+    if job.get('lease_expires_at') and job.get('started_at'):
+        lease_seconds = max(1, job['lease_expires_at'] - job['started_at'])
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(job['job_id'], worker_id, lease_seconds, stop), daemon=True)
+    heartbeat.start()
+    try:
+        result_path = handler(job['job_id'], job['payload'])
+        complete_job(job['job_id'], worker_id, result_path)
+        return result_path
+    except Exception as e:
+        fail_job(job['job_id'], worker_id, e)
+        return None
+    finally:
+        stop.set()
+        heartbeat.join()
+
+def run_worker(handlers, worker_id=None, poll_interval=2.0, lease_seconds=DEFAULT_LEASE_SECONDS, max_jobs=None):
+    """
+    Blocking worker loop for a separate process. Polls the queue and runs jobs
+    for the registered kinds. max_jobs is mainly for tests.
+    """
+    worker_id = worker_id or make_worker_id()
+    db.init_db()
+    logger.info(f"Render worker {worker_id} started for kinds: {list(handlers)}")
+
+    processed = 0
+    while max_jobs is None or processed < max_jobs:
+        job = claim_next_job(worker_id, kinds=list(handlers), lease_seconds=lease_seconds)
+        if not job:
+            time.sleep(poll_interval)
+            continue
+        run_job(job, handlers, worker_id)
+        processed += 1
+    return processed
@@ -0,0 +1,149 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+from src import database as db
+from src.config import IMAGE_VERDICT_TTL
+
+logger = logging.getLogger(__name__)
+
+PHASH_MAX_DISTANCE = 6 # bits out of 64; re-encoded / resized copies land well inside this
+# Multi-index hashing: the hash is stored as BANDS 16-bit bands. Two hashes within
+# PHASH_MAX_DISTANCE (6) bits differ in at most 1 bit in some band (pigeonhole), so
+# probing each band's value and its 16 one-bit neighbours finds every candidate.
+BANDS = 4
+BAND_BITS = 16
+ANY_TOPIC = '' # verdicts that do not depend on the headline (local quality rejects)
+
+STOPWORDS = {
+    'the', 'and', 'for', 'with', 'from', 'that', 'this', 'over', 'after', 'into', 'amid',
+    'says', 'said', 'will', 'have', 'has', 'are', 'was', 'were', 'its', 'his', 'her', 'their',
+}
+
+stats = {'url_hits': 0, 'phash_hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+def topic_key(headline):
+    """Order-insensitive key over the headline's significant words, so rewordings of a story match."""
+    if not headline:
+        return ANY_TOPIC
+    words = sorted({w for w in re.findall(r'\w+', headline.lower()) if len(w) > 2 and w not in STOPWORDS})
+    return hashlib.sha1(" ".join(words[:8]).encode('utf-8')).hexdigest()[:16]
+
+def _dct_matrix(n):
+    k = np.arange(n)
+    m = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n))
+    m[0] *= 1 / np.sqrt(2)
+    return m * np.sqrt(2 / n)
+
+_DCT32 = _dct_matrix(32)
+
+def phash(image):
+    """64-bit DCT perceptual hash as 16 hex chars."""
+    small = image.convert('L').resize((32, 32), Image.Resampling.LANCZOS)
+    pixels = np.asarray(small, dtype=np.float64)
+    low = (_DCT32 @ pixels @ _DCT32.T)[:8, :8].ravel()
+    bits = low > np.median(low[1:])
+    return f"{int(''.join('1' if b else '0' for b in bits), 2):016x}"
+
+def hamming(a, b):
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+def band_keys(image_hash):
+    """Index keys (band * 2^16 + band value) of a 16-hex-char hash."""
+    value = int(image_hash, 16)
+    return [band << BAND_BITS | (value >> (band * BAND_BITS)) & 0xFFFF for band in range(BANDS)]
+
+def probe_keys(image_hash):
+    """band_keys of every hash within 1 bit per band: each band value plus its one-bit flips."""
+    keys = []
+    for key in band_keys(image_hash):
+        keys.append(key)
+        keys.extend(key ^ (1 << bit) for bit in range(BAND_BITS))
+    return keys
+
+def _hit(kind):
+    with _stats_lock:
+        stats[kind] += 1
+
+def lookup(url=None, image_hash=None, topic=ANY_TOPIC):
+    """
+    Returns (ok, reason) for a known image, else None.
+    By URL before download, by perceptual hash (nearest within PHASH_MAX_DISTANCE) after decode.
+    Topic-independent verdicts match any topic.
+    """
+    now = time.time()
+    conn = db.get_connection()
+    try:
+        c = conn.cursor()
+        if url:
+            c.execute('''SELECT ok, reason FROM image_verdicts
+                         WHERE url = ? AND topic IN (?, ?) AND expires_at > ?
+                         ORDER BY created_at DESC LIMIT 1''', (url, topic, ANY_TOPIC, now))
+            row = c.fetchone()
+            if row:
+                _hit('url_hits')
+                return bool(row[0]), row[1]
+        if image_hash:
+            probes = probe_keys(image_hash)
+            c.execute(f'''SELECT DISTINCT v.phash, v.ok, v.reason
+                          FROM image_verdict_bands b JOIN image_verdicts v ON v.url = b.url AND v.topic = b.topic
+                          WHERE b.band_key IN ({", ".join("?" for _ in probes)})
+                            AND v.phash IS NOT NULL AND v.topic IN (?, ?) AND v.expires_at > ?''',
+                      (*probes, topic, ANY_TOPIC, now))
+            best = None
+            for row_hash, ok, reason in c.fetchall():
+                distance = hamming(image_hash, row_hash)
+                if distance <= PHASH_MAX_DISTANCE and (best is None or distance < best[0]):
+                    best = (distance, bool(ok), reason)
+            if best:
+                _hit('phash_hits')
+                return best[1], best[2]
+    except Exception as e:
+        logger.warning(f"Verdict cache lookup failed: {e}")
+    finally:
+        conn.close()
+    if image_hash or not url:
+        _hit('misses')
+    return None
+
+def record(url, image_hash, topic, ok, reason="", ttl=None):
+    now = time.time()
+    expires_at = now + (ttl if ttl is not None else IMAGE_VERDICT_TTL)
+    url = url or ''
+    conn = db.get_connection()
+    try:
+        conn.execute('''INSERT OR REPLACE INTO image_verdicts (url, phash, topic, ok, reason, created_at, expires_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                     (url, image_hash, topic, int(bool(ok)), (reason or '')[:200], now, expires_at))
+        conn.execute('DELETE FROM image_verdict_bands WHERE url = ? AND topic = ?', (url, topic))
+        if image_hash:
+            conn.executemany('INSERT INTO image_verdict_bands (band_key, url, topic) VALUES (?, ?, ?)',
+                             [(key, url, topic) for key in band_keys(image_hash)])
+        conn.commit()
+    except Exception as e:
+        logger.warning(f"Verdict cache save failed: {e}")
+    finally:
+        conn.close()
+
+def prune():
+    conn = db.get_connection()
+    try:
+        c = conn.cursor()
+        c.execute('DELETE FROM image_verdicts WHERE expires_at <= ?', (time.time(),))
+        pruned = c.rowcount
+        c.execute('''DELETE FROM image_verdict_bands WHERE NOT EXISTS (
+                         SELECT 1 FROM image_verdicts v WHERE v.url = image_verdict_bands.url AND v.topic = image_verdict_bands.topic)''')
+        conn.commit()
+        if pruned:
+            logger.info(f"Pruned {pruned} expired image verdicts.")
+    finally:
+        conn.close()
+
+def report():
+    return f"Image verdict cache: {stats['url_hits']} URL hits, {stats['phash_hits']} pHash hits, {stats['misses']} misses"
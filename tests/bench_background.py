@@ -0,0 +1,94 @@
+import sys
+import os
+import io
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+
+sys.path.append(os.getcwd())
+
+from PIL import Image
+
+from src.components.background import fit_background
+
+# Usage: python tests/bench_background.py
+#   Compares the previous background ingest (full decode, cover resize, crop) with
+#   fit_background (JPEG draft / reduce, one resize-and-crop) on a 4000x3000 photo.
+#   Each variant runs in its own process so the peak RSS figures don't mix.
+
+WIDTH, HEIGHT = 1080, 1350
+RUNS = 10
+
+def sample_bytes(fmt):
+    # Photo-like content: smooth gradients plus grain, so JPEG sizes are realistic
+    base = Image.merge('RGB', (Image.radial_gradient('L'), Image.linear_gradient('L'), Image.linear_gradient('L').rotate(90)))
+    photo = Image.blend(base.resize((4000, 3000), Image.Resampling.BICUBIC),
+                        Image.effect_noise((4000, 3000), 40).convert('RGB'), 0.25)
+    buf = io.BytesIO()
+    photo.save(buf, format=fmt, **({'quality': 90} if fmt == 'JPEG' else {}))
+    return buf.getvalue()
+
+def old_ingest(data):
+    img = Image.open(io.BytesIO(data)).convert('RGB')
+    img_ratio = img.width / img.height
+    if img_ratio > WIDTH / HEIGHT:
+        scale_width = int(HEIGHT * img_ratio)
+        img = img.resize((scale_width, HEIGHT), Image.Resampling.LANCZOS)
+        left = (scale_width - WIDTH) // 2
+        return img.crop((left, 0, left + WIDTH, HEIGHT))
+    scale_height = int(WIDTH / img_ratio)
+    img = img.resize((WIDTH, scale_height), Image.Resampling.LANCZOS)
+    top = (scale_height - HEIGHT) // 2
+    return img.crop((0, top, WIDTH, top + HEIGHT))
+
+def new_ingest(data):
+    with Image.open(io.BytesIO(data)) as source:
+        return fit_background(source, WIDTH, HEIGHT)
+
+def peak_rss_kb():
+    # VmHWM is per address space; ru_maxrss survives exec on Linux and would
+    # carry over the parent's peak from building the samples
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def run_variant(variant, path):
+    """Child process: times one variant and reports its peak RSS above the baseline."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    ingest = old_ingest if variant == 'old' else new_ingest
+    baseline = peak_rss_kb()
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        ingest(data)
+        times.append((time.perf_counter() - start) * 1000)
+    peak = peak_rss_kb()
+    print(f"{min(times):.1f} {sorted(times)[len(times) // 2]:.1f} {(peak - baseline) / 1024:.1f}")
+
+def main():
+    tmp = tempfile.mkdtemp()
+    for fmt in ('JPEG', 'PNG'):
+        path = os.path.join(tmp, f"sample.{fmt.lower()}")
+        with open(path, 'wb') as f:
+            f.write(sample_bytes(fmt))
+        print(f"{fmt} 4000x3000 ({os.path.getsize(path) / 1e6:.1f} MB) -> {WIDTH}x{HEIGHT}, {RUNS} runs")
+        for variant in ('old', 'new'):
+            out = subprocess.run([sys.executable, __file__, variant, path], capture_output=True, text=True, check=True)
+            best, median, rss = out.stdout.split()
+            label = "full decode + resize + crop" if variant == 'old' else "draft/reduce + fit"
+            print(f"  {label:<28} best {best} ms, median {median} ms, peak RSS +{rss} MB")
+    shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        run_variant(sys.argv[1], sys.argv[2])
+    else:
+        main()
@@ -0,0 +1,110 @@
+import sys
+import os
+import statistics
+import textwrap
+import time
+
+sys.path.append(os.getcwd())
+
+from PIL import Image, ImageDraw
+
+from src.components import fonts, text_layout
+
+# Usage: python tests/bench_text_layout.py
+#   Compares the previous headline fit (step-4 size loop, draw.textlength per word per size)
+#   and footer wrap (character-count guess + textbbox per line) with src/components/text_layout.py.
+
+FONT = "assets/Poppins-Bold.ttf"
+MAX_WIDTH = 1080 - 2 * 50 - 6
+HEADLINES = [
+    "Sensex closes at a record high as foreign investors return to Indian equities",
+    "Monsoon floods shut schools in Mumbai",
+    "Supreme Court reserves verdict on electoral bonds after marathon hearing spanning five days",
+    "ISRO successfully tests reusable launch vehicle in autonomous landing mission",
+    "RBI keeps repo rate unchanged for the eighth straight time, signals caution on inflation",
+    "Heatwave grips north India as Delhi records highest temperature in 80 years",
+    "Parliament passes landmark data protection bill after opposition walkout over amendments to consent clauses",
+    "Government announces nationwide rollout of unified digital health IDs for all citizens by next March",
+]
+SUMMARY = "Markets rallied for a third straight session as banking and IT stocks led gains across the board"
+
+def old_fit(draw, text, start=65, minimum=35):
+    words = text.split()
+    size = start
+    while size >= minimum:
+        font = fonts.face(FONT, size) # faces were lru-cached before too
+        space_w = draw.textlength(" ", font=font)
+        lines, line, line_w, fits = [], [], 0, True
+        for w in words:
+            w_w = draw.textlength(w, font=font)
+            added = w_w + (space_w if line else 0)
+            if line_w + added <= MAX_WIDTH:
+                line.append(w)
+                line_w += added
+            else:
+                if not line:
+                    fits = False
+                    break
+                lines.append(line)
+                line, line_w = [w], w_w
+        if line:
+            lines.append(line)
+        if fits and len(lines) <= 4:
+            return size, lines
+        size -= 4
+    return minimum, []
+
+def old_footer(draw, text, size=35, max_width=1076):
+    font = fonts.face(FONT, size)
+    lines = textwrap.TextWrapper(width=int(max_width / (size * 0.5))).wrap(text)
+    return [draw.textbbox((0, 0), line, font=font) for line in lines]
+
+def new_fit(text, start=65, minimum=35):
+    return text_layout.fit_lines(text, FONT, MAX_WIDTH, max_lines=4, min_size=minimum, max_size=start)
+
+def new_footer(text, size=35, max_width=1076):
+    return text_layout.wrap_text(text, FONT, size, max_width)
+
+def timed(fn, repeat=200):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def main():
+    draw = ImageDraw.Draw(Image.new('RGB', (1080, 1350)))
+
+    def old_render():
+        for headline in HEADLINES:
+            old_fit(draw, headline)
+        old_footer(draw, SUMMARY)
+
+    def new_cold():
+        text_layout._fit_lines.cache_clear()
+        text_layout._wrap_text.cache_clear()
+        for headline in HEADLINES:
+            new_fit(headline)
+        new_footer(SUMMARY)
+
+    def new_warm():
+        for headline in HEADLINES:
+            new_fit(headline)
+        new_footer(SUMMARY)
+
+    fonts.preload({'fonts': {'headline_path': FONT, 'headline_size_start': 65, 'headline_size_min': 35},
+                   'subheading': {'font_path': FONT, 'font_size': 35}})
+    old_ms = timed(old_render, 50)
+    cold_ms = timed(new_cold)
+    warm_ms = timed(new_warm)
+    print(f"{len(HEADLINES)} headlines + 1 footer per run (median)")
+    print(f"  previous loop:            {old_ms:8.3f} ms")
+    print(f"  text_layout (no memo):    {cold_ms:8.3f} ms  ({old_ms / cold_ms:.1f}x)")
+    print(f"  text_layout (memoized):   {warm_ms:8.3f} ms  ({old_ms / warm_ms:.0f}x)")
+    for headline in HEADLINES:
+        old_size, _ = old_fit(draw, headline)
+        print(f"  {old_size}px -> {new_fit(headline).size}px  {headline[:50]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import sys
+import os
+import glob
+import io
+import statistics
+import time
+
+sys.path.append(os.getcwd())
+
+from PIL import Image
+from google.genai import _transformers
+
+from src import gemini_utils
+
+# Usage: python tests/bench_vision_payload.py [--live]
+#   Fixtures: rendered posts under workspace/, re-encoded as 2160x2700 JPEGs to mimic
+#   multi-megapixel news photos. --live also times real vision calls (needs GEMINI_API_KEY).
+
+def load_fixtures(limit=20):
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join("workspace", "*", "*", "post.png")))[:limit]:
+        img = Image.open(path).convert('RGB').resize((2160, 2700), Image.Resampling.BICUBIC)
+        buf = io.BytesIO()
+        img.save(buf, format='JPEG', quality=92)
+        fixtures.append((path, buf.getvalue()))
+    return fixtures
+
+def full_payload(data):
+    """What the SDK uploaded before: the decoded PIL image, serialised by pil_to_blob."""
+    return _transformers.pil_to_blob(Image.open(io.BytesIO(data))).data
+
+def shaped_payload(data):
+    return gemini_utils.vision_payload(gemini_utils.reduce_for_vision(Image.open(io.BytesIO(data))))
+
+def timed(fn, data):
+    start = time.perf_counter()
+    out = fn(data)
+    return out, (time.perf_counter() - start) * 1000
+
+def live_latency(payload, mime):
+    client = gemini_utils.get_client()
+    start = time.perf_counter()
+    client.models.generate_content(
+        model=gemini_utils.MODEL,
+        contents=["Is this a usable news background photo? Answer YES or NO.",
+                  gemini_utils.types.Part.from_bytes(data=payload, mime_type=mime)]
+    )
+    return time.perf_counter() - start
+
+def main():
+    live = '--live' in sys.argv
+    fixtures = load_fixtures()
+    if not fixtures:
+        print("No fixtures found under workspace/*/*/post.png")
+        return
+
+    rows = []
+    for path, data in fixtures:
+        before, before_ms = timed(full_payload, data)
+        after, after_ms = timed(shaped_payload, data)
+        row = {'before': len(before), 'after': len(after), 'before_ms': before_ms, 'after_ms': after_ms}
+        if live and gemini_utils.GEMINI_API_KEY:
+            row['before_s'] = live_latency(before, 'image/png')
+            row['after_s'] = live_latency(after, 'image/jpeg')
+        rows.append(row)
+
+    before_kb = statistics.mean(r['before'] for r in rows) / 1024
+    after_kb = statistics.mean(r['after'] for r in rows) / 1024
+    print(f"Fixtures: {len(rows)} (2160x2700 JPEG sources)")
+    print(f"Request image bytes: {before_kb:,.0f} KB -> {after_kb:,.0f} KB per call ({before_kb / after_kb:.0f}x smaller)")
+    print(f"Payload prep time:   {statistics.median(r['before_ms'] for r in rows):.0f} ms -> "
+          f"{statistics.median(r['after_ms'] for r in rows):.0f} ms (median)")
+    if live and 'before_s' in rows[0]:
+        print(f"Vision latency:      {statistics.median(r['before_s'] for r in rows):.2f} s -> "
+              f"{statistics.median(r['after_s'] for r in rows):.2f} s (median)")
+    elif live:
+        print("Vision latency: skipped (GEMINI_API_KEY not set)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import sys
+import os
+
+sys.path.append(os.getcwd())
+
+from src import article_extractor, fetcher
+
+ARTICLE = """
+<html><head>
+<title>Monsoon floods close Mumbai schools - Example News</title>
+<meta property="og:title" content="Monsoon floods close Mumbai schools - Example News">
+<meta name="description" content="Heavy rain shuts schools across the city.">
+<meta property="og:image" content="https://example.com/flood.jpg">
+</head><body>
+<nav><ul><li><a href="/">Home</a></li><li><a href="/india">India</a></li></ul>
+<p>Subscribe to our newsletter for the latest updates, offers and more.</p></nav>
+<div class="layout">
+  <div class="article-body">
+    <p>Schools across Mumbai stayed closed on Tuesday after monsoon floods submerged roads, the municipal corporation said.</p>
+    <p>The city recorded 240 mm of rain in 24 hours, the heaviest downpour this season, according to the weather office.</p>
+    <p>Local train services on the Central line were suspended for several hours, stranding thousands of commuters.</p>
+    <p>Officials said schools would reopen once the water receded, and urged residents to stay indoors.</p>
+    <div class="related-links"><p>Read more: <a href="/a">Ten photos of the rain that will amaze you</a></p></div>
+  </div>
+  <div class="sidebar"><p>Trending: <a href="/b">Celebrity wedding</a>, <a href="/c">Cricket scores</a>, <a href="/d">Markets</a></p></div>
+</div>
+<footer><p>Copyright Example News. All rights reserved, including the right to reproduce.</p></footer>
+</body></html>
+"""
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+        self.read = 0
+        self.closed = False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, size):
+        for i in range(0, len(self.body), size):
+            self.read += len(self.body[i:i + size])
+            yield self.body[i:i + size]
+
+    def close(self):
+        self.closed = True
+
+def test_article_extractor():
+    print("Testing article extraction...")
+    original_get = article_extractor.requests.get
+    try:
+        # Body extraction drops navigation, sidebars, related links and footers
+        body = article_extractor.extract_from_html(ARTICLE)
+        print(body)
+        assert "240 mm of rain" in body and "reopen once the water receded" in body
+        assert "Subscribe" not in body and "Trending" not in body
+        assert "Read more" not in body and "Copyright" not in body
+
+        # Sentence selection stays within the budget and keeps the headline-relevant facts
+        context = article_extractor.select_sentences(body, "Monsoon floods close Mumbai schools", budget_tokens=40)
+        print(context)
+        assert len(context) <= 40 * 4
+        assert "Schools across Mumbai stayed closed" in context
+        assert article_extractor.select_sentences("Short summary.", "Anything", 40) == "Short summary."
+        assert len(article_extractor.context_for('variations_batch', "Mumbai floods", body)) <= \
+            article_extractor.CONTEXT_BUDGETS['variations_batch'] * 4
+
+        # Streaming download stops at the byte cap
+        big = FakeResponse(ARTICLE.encode() + b"<script>" + b"x" * 500000 + b"</script>")
+        article_extractor.requests.get = lambda *args, **kwargs: big
+        html = article_extractor.fetch_html("https://example.com/story", max_bytes=64 * 1024)
+        assert len(html) == 64 * 1024 and big.read < 100 * 1024 and big.closed
+
+        # Scraped links carry the extracted body as content
+        article_extractor.requests.get = lambda *args, **kwargs: FakeResponse(ARTICLE.encode())
+        item = fetcher.scrape_url_metadata("https://example.com/story")
+        assert item['title'] == "Monsoon floods close Mumbai schools"
+        assert item['summary'] == "Heavy rain shuts schools across the city."
+        assert "Central line" in item['content'] and "Trending" not in item['content']
+        print(article_extractor.report())
+        print("Article extraction test passed.")
+    finally:
+        article_extractor.requests.get = original_get
+
+if __name__ == "__main__":
+    test_article_extractor()
@@ -0,0 +1,68 @@
+import sys
+import os
+import io
+
+sys.path.append(os.getcwd())
+
+import numpy as np
+from PIL import Image
+
+from src.components.background import fit_background
+
+WIDTH, HEIGHT = 1080, 1350
+
+def sample_photo(size=(4000, 3000)):
+    """Smooth photo-like content (JPEG/PNG encodable, no pure noise)."""
+    base = Image.merge('RGB', (Image.radial_gradient('L'), Image.linear_gradient('L'), Image.linear_gradient('L').rotate(90)))
+    return base.resize(size, Image.Resampling.BICUBIC)
+
+def full_decode_fit(data):
+    """The previous path: full decode, cover resize, then a separate crop."""
+    img = Image.open(io.BytesIO(data)).convert('RGB')
+    scale_height = HEIGHT
+    scale_width = int(scale_height * img.width / img.height)
+    img = img.resize((scale_width, scale_height), Image.Resampling.LANCZOS)
+    left = (scale_width - WIDTH) // 2
+    return img.crop((left, 0, left + WIDTH, HEIGHT))
+
+def encode(img, fmt):
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, quality=90) if fmt == 'JPEG' else img.save(buf, format=fmt)
+    return buf.getvalue()
+
+def test_background_ingest():
+    print("Testing reduced-scale background ingest...")
+    photo = sample_photo()
+    for fmt in ('JPEG', 'PNG'):
+        data = encode(photo, fmt)
+        with Image.open(io.BytesIO(data)) as source:
+            fitted = fit_background(source, WIDTH, HEIGHT)
+            if fmt == 'JPEG':
+                # Decoded at 1/2 scale: still covers the 1800x1350 cover size
+                assert source.size == (2000, 1500), source.size
+        assert fitted.size == (WIDTH, HEIGHT) and fitted.mode == 'RGB'
+        diff = np.abs(np.asarray(fitted, dtype=np.int16) - np.asarray(full_decode_fit(data), dtype=np.int16))
+        print(f"{fmt}: mean difference to full decode {diff.mean():.2f}")
+        assert diff.mean() < 2, f"{fmt} differs from the full decode by {diff.mean():.2f}"
+
+    # Palette / bilevel / 16-bit sources can't be box-reduced as-is: converted first
+    for mode, fmt in (('P', 'GIF'), ('P', 'PNG'), ('1', 'PNG'), ('I;16', 'PNG')):
+        source_img = photo.convert('L').convert(mode) if mode != 'P' else photo.quantize(64)
+        data = encode(source_img, fmt)
+        with Image.open(io.BytesIO(data)) as source:
+            assert source.mode == mode, (fmt, source.mode)
+            fitted = fit_background(source, WIDTH, HEIGHT)
+        assert fitted.size == (WIDTH, HEIGHT) and fitted.mode == 'RGB'
+        if mode == 'P':
+            diff = np.abs(np.asarray(fitted, dtype=np.int16) - np.asarray(full_decode_fit(data), dtype=np.int16))
+            print(f"{mode} {fmt}: mean difference to full decode {diff.mean():.2f}")
+            assert diff.mean() < 3, f"{mode} {fmt} differs from the full decode by {diff.mean():.2f}"
+
+    # Smaller than the canvas: upscaled, never drafted below the cover size
+    with Image.open(io.BytesIO(encode(sample_photo((600, 400)), 'JPEG'))) as small:
+        assert fit_background(small, WIDTH, HEIGHT).size == (WIDTH, HEIGHT)
+        assert small.size == (600, 400)
+    print("Background ingest test passed.")
+
+if __name__ == "__main__":
+    test_background_ingest()
@@ -0,0 +1,72 @@
+import sys
+import os
+import json
+import shutil
+
+sys.path.append(os.getcwd())
+
+from src import config_store, image_generator, onboarding
+
+USER_ID = 990049
+
+def test_config_store():
+    print("Testing config store...")
+    user_dir = os.path.join("users_data", str(USER_ID))
+    original_read = config_store._read
+    try:
+        # No user file yet: the default template
+        assert image_generator.load_config(USER_ID)['canvas']['width'] == 1080
+
+        # Partial user file: defaults merged in once, snapshot shared and read-only
+        os.makedirs(user_dir, exist_ok=True)
+        with open(config_store.user_config_path(USER_ID), 'w') as f:
+            json.dump({'page_name': 'Test Page', 'fonts': {'headline_size_start': 70}}, f)
+        config_store._mtimes.clear()
+        cfg = image_generator.load_config(USER_ID)
+        assert cfg['page_name'] == 'Test Page' and cfg['fonts']['headline_size_start'] == 70
+        assert cfg['fonts']['headline_size_min'] == image_generator.DEFAULT_CONFIG['fonts']['headline_size_min']
+        try:
+            cfg['page_name'] = 'changed'
+            raise AssertionError("snapshot is writable")
+        except TypeError:
+            pass
+
+        # Hot path: cached snapshot, no file reads
+        reads = []
+        config_store._read = lambda path: reads.append(path) or original_read(path)
+        for _ in range(100):
+            assert image_generator.load_config(USER_ID) is cfg
+        assert reads == [], f"config re-read {len(reads)} times"
+
+        # Onboarding edits a copy and saves atomically; the next load sees it
+        editable = onboarding.load_user_config(USER_ID)
+        editable['fonts']['headline_size_start'] = 60
+        assert onboarding.save_user_config(USER_ID, editable)
+        assert image_generator.load_config(USER_ID)['fonts']['headline_size_start'] == 60
+        assert cfg['fonts']['headline_size_start'] == 70, "old snapshot changed"
+        assert [n for n in os.listdir(user_dir) if n.endswith('.tmp')] == []
+        with open(config_store.user_config_path(USER_ID)) as f:
+            assert json.load(f)['page_name'] == 'Test Page'
+
+        # Saved by another process: a cached stat hides it until the parent's version says otherwise
+        saved = image_generator.load_config(USER_ID)
+        with open(config_store.user_config_path(USER_ID), 'w') as f:
+            json.dump({'page_name': 'Other Process'}, f)
+        stat = os.stat(config_store.user_config_path(USER_ID))
+        os.utime(config_store.user_config_path(USER_ID), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        assert image_generator.load_config(USER_ID) is saved
+        config_store.revalidate(USER_ID, config_store.version(USER_ID)) # same version: kept
+        assert image_generator.load_config(USER_ID) is saved
+        expected = (os.stat(config_store.user_config_path(USER_ID)).st_mtime_ns, os.stat(config_store.DEFAULT_PATH).st_mtime_ns)
+        config_store.revalidate(USER_ID, expected)
+        assert image_generator.load_config(USER_ID)['page_name'] == 'Other Process'
+        print(f"Config store: {config_store.cache_info()}")
+        print("Config store test passed.")
+    finally:
+        config_store._read = original_read
+        shutil.rmtree(user_dir, ignore_errors=True)
+        config_store._snapshots.pop(USER_ID, None)
+        config_store._mtimes.clear()
+
+if __name__ == "__main__":
+    test_config_store()
@@ -0,0 +1,84 @@
+import sys
+import os
+import asyncio
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.append(os.getcwd())
+
+from telegram.error import TimedOut
+
+from src import database as db
+from src import gemini_utils, llm_cache, message_stream
+
+CHUNKS = ["Monsoon arrives ", "early in Kerala, ", "says ND", "TV. Farmers ", "cheer as rains ", "lift sowing hopes.\n",
+          "Read more ", "and share ", "#Monsoon #Kerala."]
+
+class FakeAioModels:
+    async def generate_content_stream(self, model, contents, config=None):
+        async def gen():
+            for text in CHUNKS:
+                await asyncio.sleep(0.05)
+                yield SimpleNamespace(text=text, usage_metadata=None)
+        return gen()
+
+class FakeMessage:
+    def __init__(self, timeouts=0):
+        self.edits = []
+        self.timeouts = timeouts
+
+    async def edit_text(self, text):
+        if self.timeouts:
+            self.timeouts -= 1
+            raise TimedOut()
+        self.edits.append((time.monotonic(), text))
+
+def test_copy_stream():
+    print("Testing streamed copy with throttled edits...")
+    original = (db.DB_NAME, gemini_utils._client, gemini_utils.GEMINI_API_KEY)
+    db.DB_NAME = os.path.join(tempfile.mkdtemp(), "stream_test.db")
+    gemini_utils._client = SimpleNamespace(aio=SimpleNamespace(models=FakeAioModels()))
+    gemini_utils.GEMINI_API_KEY = "test"
+    try:
+        db.init_db()
+        llm_cache.clear_memory()
+        message = FakeMessage()
+
+        async def run():
+            start = time.monotonic()
+            editor = message_stream.ThrottledEditor(message, interval=0.15)
+            final = None
+            async for final in gemini_utils.stream_copy_async("Monsoon arrives early", "src"):
+                await editor.update(final)
+            await editor.finish(final)
+            return start, final, editor
+
+        start, final, editor = asyncio.run(run())
+        for t, text in message.edits:
+            print(f"  +{t - start:.2f}s {text!r}")
+        assert all("NDTV" not in text and "ND" not in text.split() for _, text in message.edits)
+        assert final == message.edits[-1][1] and final.endswith("#Kerala")
+        assert message.edits[0][0] - start < 0.3, "first text should show after the first chunks"
+        assert len(message.edits) < len(CHUNKS) and editor.coalesced > 0
+        # Streamed answers go to the response cache like generate_copy
+        assert gemini_utils.generate_copy("Monsoon arrives early", "src") == final
+        print(f"PASS: {len(message.edits)} edits for {len(CHUNKS)} chunks.")
+
+        # Network trouble on an edit (here or in the delayed-edit task) does not end the stream
+        flaky = FakeMessage(timeouts=2)
+        async def run_flaky():
+            editor = message_stream.ThrottledEditor(flaky, interval=0.05)
+            for i, chunk in enumerate(CHUNKS):
+                await editor.update("".join(CHUNKS[:i + 1]))
+                await asyncio.sleep(0.02)
+            await asyncio.sleep(0.1)
+            await editor.finish("".join(CHUNKS))
+        asyncio.run(run_flaky())
+        assert flaky.timeouts == 0 and flaky.edits[-1][1] == "".join(CHUNKS)
+    finally:
+        db.DB_NAME, gemini_utils._client, gemini_utils.GEMINI_API_KEY = original
+        llm_cache.clear_memory()
+
+if __name__ == "__main__":
+    test_copy_stream()
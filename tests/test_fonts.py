@@ -0,0 +1,57 @@
+import sys
+import os
+import shutil
+import tempfile
+
+sys.path.append(os.getcwd())
+
+from PIL import ImageFont
+from src.components import fonts
+
+def test_font_registry():
+    print("Testing font registry...")
+    original = (fonts.user_font_path, fonts.ImageFont.truetype)
+    tmp = tempfile.mkdtemp()
+    upload = os.path.join(tmp, "headline_font.ttf")
+    lookups = []
+
+    def counting_truetype(font, size=10, *args, **kwargs):
+        lookups.append(font)
+        return original[1](font, size, *args, **kwargs)
+
+    fonts.user_font_path = lambda user_id: upload
+    fonts.ImageFont.truetype = counting_truetype
+    fonts._system_fonts.clear()
+    try:
+        # Missing template font: one system lookup, then the fallback face is shared
+        first = fonts.get_font("arial-missing.ttf", 35)
+        lookups.clear()
+        second = fonts.get_font("arial-missing.ttf", 35)
+        assert first is second and isinstance(first, ImageFont.FreeTypeFont)
+        assert lookups == [], f"repeated font loads: {lookups}"
+
+        # User upload is used for headlines before the global fallbacks
+        assert fonts.resolve("missing.ttf", 'headline', user_id=1) == "assets/Poppins-Bold.ttf"
+        shutil.copy("assets/Poppins-Bold.ttf", upload)
+        assert fonts.resolve("missing.ttf", 'headline', user_id=1) == upload
+        face = fonts.get_font("missing.ttf", 50, 'headline', user_id=1)
+        assert face.path == upload and face is fonts.get_font("missing.ttf", 50, 'headline', user_id=1)
+
+        # Re-uploaded file (new mtime) gets a fresh face
+        stat = os.stat(upload)
+        os.utime(upload, (stat.st_atime, stat.st_mtime + 10))
+        assert fonts.get_font("missing.ttf", 50, 'headline', user_id=1) is not face
+
+        # Nothing resolvable: Pillow's built-in font at the requested size, no exception
+        fonts.FALLBACKS['test'] = []
+        builtin = fonts.get_font("nowhere/none.ttf", 40, 'test')
+        assert builtin.size == 40
+        print(f"Face cache: {fonts.cache_info()}")
+        print("Font registry test passed.")
+    finally:
+        fonts.user_font_path, fonts.ImageFont.truetype = original
+        fonts.FALLBACKS.pop('test', None)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    test_font_registry()
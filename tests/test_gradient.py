@@ -0,0 +1,61 @@
+import sys
+import os
+import time
+
+sys.path.append(os.getcwd())
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from src.components import background, template
+
+CONFIG = {'gradient': {'height_ratio': 0.85, 'max_alpha': 255, 'start_color': [0, 0, 0]}}
+
+def line_by_line_overlay(width, height, config):
+    """The previous implementation: one draw.line per gradient row."""
+    grad = config['gradient']
+    r, g, b = grad['start_color']
+    overlay = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
+    gradient_height = int(height * grad['height_ratio'])
+    start_y = height - gradient_height
+    for y in range(start_y, height):
+        alpha = int((y - start_y) / gradient_height * grad['max_alpha'])
+        draw.line([(0, y), (width, y)], fill=(r, g, b, alpha))
+    return overlay
+
+def test_gradient():
+    print("Testing vectorized gradient overlay...")
+    width, height = 1080, 1350
+    background._GRADIENT_CACHE.clear()
+
+    start = time.perf_counter()
+    expected = line_by_line_overlay(width, height, CONFIG)
+    old_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    mask, start_color = background.gradient_mask(width, height, CONFIG)
+    new_ms = (time.perf_counter() - start) * 1000
+    print(f"Per-row drawing {old_ms:.1f} ms, vectorized {new_ms:.1f} ms (then cached)")
+
+    # Same alpha ramp as the per-row version; only the L mask is cached
+    assert np.array_equal(np.asarray(mask), np.asarray(expected.getchannel('A')))
+    assert background.gradient_mask(width, height, CONFIG)[0] is mask
+    assert all(key[0] == 'mask' for key in background._GRADIENT_CACHE)
+
+    # A compiled template (no logo) builds its own layer from the shared mask
+    tpl = template.CompiledTemplate(CONFIG, None, 0)
+    assert tpl.mask is not mask and np.array_equal(np.asarray(tpl.mask), np.asarray(mask))
+    assert tpl.layer.getpixel((0, height - 1)) == start_color
+    assert tpl.overlay().mode == 'RGBA' and np.array_equal(np.asarray(tpl.overlay().getchannel('A')), np.asarray(expected.getchannel('A')))
+
+    # L-mask blend into RGB matches the RGBA alpha composite within rounding
+    photo = Image.effect_noise((width, height), 64).convert('RGB')
+    composited = Image.alpha_composite(photo.convert('RGBA'), expected).convert('RGB')
+    blended = photo.copy()
+    blended.paste(start_color, (0, 0, width, height), mask)
+    diff = np.abs(np.asarray(blended, dtype=np.int16) - np.asarray(composited, dtype=np.int16))
+    assert diff.max() <= 1, f"max difference {diff.max()}"
+    print("Gradient test passed.")
+
+if __name__ == "__main__":
+    test_gradient()
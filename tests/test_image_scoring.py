@@ -0,0 +1,55 @@
+import sys
+import os
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+sys.path.append(os.getcwd())
+
+from src import image_scoring
+
+def synthetic_photo(size=(1080, 1350), seed=1):
+    """Smooth colour regions, object edges and fine grain, roughly like a news photo."""
+    rng = np.random.default_rng(seed)
+    base = Image.fromarray(rng.integers(0, 255, (12, 10, 3), dtype=np.uint8)).resize(size, Image.Resampling.BICUBIC)
+    draw = ImageDraw.Draw(base)
+    for _ in range(60):
+        x, y = int(rng.integers(0, size[0])), int(rng.integers(0, size[1]))
+        w, h = int(rng.integers(20, 200)), int(rng.integers(20, 200))
+        draw.ellipse((x, y, x + w, y + h), fill=tuple(int(c) for c in rng.integers(0, 255, 3)))
+    grain = rng.normal(0, 12, (size[1], size[0], 3))
+    return Image.fromarray(np.clip(np.asarray(base, dtype=np.float32) + grain, 0, 255).astype(np.uint8))
+
+def test_local_prefilter():
+    print("Testing local image pre-filter...")
+    photo = synthetic_photo()
+    result = image_scoring.analyze(photo)
+    print(f"photo: {result}")
+    assert result['reject'] is None and result['score'] > 0.5
+
+    logo = Image.new('RGB', (800, 800), 'white')
+    ImageDraw.Draw(logo).ellipse((200, 200, 600, 600), fill='red')
+    assert "flat" in image_scoring.analyze(logo)['reject']
+
+    blurry = photo.resize((540, 675)).filter(ImageFilter.GaussianBlur(8))
+    assert "blurry" in image_scoring.analyze(blurry)['reject']
+
+    letterboxed = Image.new('RGB', (1080, 1080))
+    letterboxed.paste(photo.resize((1080, 500)), (0, 290))
+    assert "letterboxed" in image_scoring.analyze(letterboxed)['reject']
+
+    text = Image.new('RGB', (900, 700), (240, 240, 230))
+    draw = ImageDraw.Draw(text)
+    rng = np.random.default_rng(2)
+    for y in range(0, 700, 30):
+        for x in range(0, 900, 14):
+            draw.rectangle((x, y, x + 8, y + 18), fill=(int(rng.integers(0, 255)), 0, int(rng.integers(0, 80))))
+    assert "text-heavy" in image_scoring.analyze(text)['reject']
+
+    # Smaller, badly fitting photo ranks below the canvas-sized one
+    small = image_scoring.analyze(synthetic_photo((600, 300)))
+    assert small['score'] < result['score']
+    print(f"PASS: {image_scoring.report()}")
+
+if __name__ == "__main__":
+    test_local_prefilter()
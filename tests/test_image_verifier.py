@@ -0,0 +1,82 @@
+import sys
+import os
+import asyncio
+import tempfile
+import time
+import zlib
+
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.getcwd())
+
+from src import database as db
+from src import gemini_utils, image_scoring, image_verifier
+
+def test_first_good_wins():
+    print("Testing parallel image verification...")
+    original = (gemini_utils.download_candidate_image, gemini_utils.verify_downloaded_image_async, image_scoring.analyze)
+    # url -> (local score or None if rejected locally, vision delay seconds, verdict)
+    plan = {
+        'logo': (None, 0, True),
+        'bad1': (0.9, 0.3, False), 'bad2': (0.8, 0.3, False), 'good': (0.7, 0.3, True),
+        'slow_good': (0.6, 5, True), 'big_pending': (0.95, 5, True),
+    }
+    vision_order = []
+    cancelled = []
+
+    def fake_download(url):
+        # Distinct content per URL so perceptual hashes differ
+        rng = np.random.default_rng(zlib.crc32(url.encode()))
+        img = Image.fromarray(rng.integers(0, 255, (6, 8, 3), dtype=np.uint8)).resize((800, 600))
+        img.info['url'] = url
+        return img
+
+    def fake_analyze(image):
+        score = plan[image.info['url']][0]
+        return {'score': score or 0.0, 'reject': None if score else "flat graphic"}
+
+    async def fake_vision(image, headline=None, image_url=None, image_hash=None):
+        url = image.info['url']
+        vision_order.append(url)
+        _, delay, verdict = plan[url]
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(url)
+            raise
+        return gemini_utils._settle((verdict, "fake"), image_url, image_hash, headline)
+
+    original_db = db.DB_NAME
+    db.DB_NAME = os.path.join(tempfile.mkdtemp(), "verifier_test.db")
+    db.init_db()
+    gemini_utils.download_candidate_image = fake_download
+    gemini_utils.verify_downloaded_image_async = fake_vision
+    image_scoring.analyze = fake_analyze
+    try:
+        start = time.time()
+        urls = ['logo', 'bad1', 'bad2', 'good', 'slow_good', 'big_pending']
+        picked = asyncio.run(image_verifier.pick_first_good(urls, "headline", fan_out=3, deadline=3))
+        elapsed = time.time() - start
+        print(f"Picked {picked} in {elapsed:.2f}s, vision order {vision_order}, cancelled {cancelled}")
+        assert 'logo' not in vision_order, "local reject must not cost a vision call"
+        assert vision_order[:3] == ['big_pending', 'bad1', 'bad2'], "best local score checked first"
+        assert picked == 'good' and elapsed < 1.5
+        assert 'big_pending' in cancelled
+
+        # Nothing passes before the deadline: best-scoring pending candidate is used
+        start = time.time()
+        picked = asyncio.run(image_verifier.pick_first_good(['bad1', 'slow_good', 'big_pending'], deadline=1))
+        assert picked == 'big_pending' and time.time() - start < 2, picked
+
+        # Verdicts are cached: 'good' wins again without any vision call
+        vision_order.clear()
+        picked = asyncio.run(image_verifier.pick_first_good(['bad1', 'good'], "headline", deadline=3))
+        assert picked == 'good' and vision_order == [], vision_order
+        print("PASS: locally ranked, first good wins; deadline falls back to best candidate; verdicts reused.")
+    finally:
+        db.DB_NAME = original_db
+        gemini_utils.download_candidate_image, gemini_utils.verify_downloaded_image_async, image_scoring.analyze = original
+
+if __name__ == "__main__":
+    test_first_good_wins()
@@ -0,0 +1,56 @@
+import sys
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.append(os.getcwd())
+
+from src import database as db
+from src import gemini_utils, llm_cache
+
+class FakeModels:
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, model, contents, config=None):
+        self.calls += 1
+        return SimpleNamespace(text=f"Refined: {contents.split(chr(34))[1]}",
+                               usage_metadata=SimpleNamespace(total_token_count=120))
+
+def test_llm_cache():
+    print("Testing LLM response cache...")
+    original = (db.DB_NAME, gemini_utils._client, gemini_utils.GEMINI_API_KEY)
+    db.DB_NAME = os.path.join(tempfile.mkdtemp(), "llm_cache_test.db")
+    fake = FakeModels()
+    gemini_utils._client = SimpleNamespace(models=fake)
+    gemini_utils.GEMINI_API_KEY = "test"
+    try:
+        db.init_db()
+        llm_cache.clear_memory()
+        first = gemini_utils.refine_headline("Sensex hits record high")
+        # Same story, different spacing
+        second = gemini_utils.refine_headline("Sensex  hits record\nhigh")
+        assert first == second and fake.calls == 1, f"expected 1 Gemini call, got {fake.calls}"
+        # Case is meaning ("US" vs "us"): a separate entry
+        gemini_utils.refine_headline("SENSEX hits record high")
+        assert fake.calls == 2, f"expected 2 Gemini calls, got {fake.calls}"
+
+        start = time.perf_counter()
+        gemini_utils.refine_headline("Sensex hits record high")
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(f"Memory hit took {elapsed_ms:.3f} ms")
+        assert elapsed_ms < 1
+
+        # Disk backing survives losing the memory front
+        llm_cache.clear_memory()
+        gemini_utils.refine_headline("Sensex hits record high")
+        assert fake.calls == 2
+        assert llm_cache.stats['tokens_saved'] >= 360
+        print(f"PASS: {llm_cache.report()}")
+    finally:
+        db.DB_NAME, gemini_utils._client, gemini_utils.GEMINI_API_KEY = original
+        llm_cache.clear_memory()
+
+if __name__ == "__main__":
+    test_llm_cache()
@@ -0,0 +1,68 @@
+import sys
+import os
+import asyncio
+import time
+
+sys.path.append(os.getcwd())
+
+from google.genai import errors
+from src import llm_governor
+
+def test_retry_and_hedge():
+    print("Testing Gemini governor (retry + hedged request)...")
+    original = (dict(llm_governor.DEADLINES), llm_governor.RETRY_BASE_DELAY)
+    llm_governor.DEADLINES.update({'test_retry': 5, 'test_hedge': 0.1})
+    llm_governor.RETRY_BASE_DELAY = 0.01
+    try:
+        attempts = []
+
+        async def flaky(model):
+            attempts.append(model)
+            if len(attempts) < 3:
+                raise errors.APIError(429, {'error': {'message': 'quota'}})
+            return "ok"
+
+        async def slow_primary(model):
+            if model == llm_governor.GEMINI_HEDGE_MODEL:
+                return "light"
+            await asyncio.sleep(2)
+            return "primary"
+
+        async def run():
+            first = await llm_governor.call_async('test_retry', flaky, 'gemini-2.0-flash')
+            start = time.monotonic()
+            second = await llm_governor.call_async('test_hedge', slow_primary, 'gemini-2.0-flash')
+            return first, second, time.monotonic() - start
+
+        first, second, elapsed = asyncio.run(run())
+        metrics = llm_governor.get_metrics()
+        print(llm_governor.report())
+        assert first == "ok" and metrics['test_retry']['retries'] == 2
+        assert second == "light" and elapsed < 1, "hedge should answer well before the slow primary"
+        assert metrics['test_hedge']['hedge_wins'] == 1
+
+        # Non-retryable errors surface immediately
+        def bad_request(model):
+            raise errors.APIError(400, {'error': {'message': 'bad'}})
+        try:
+            llm_governor.call('test_retry', bad_request, 'gemini-2.0-flash')
+            assert False, "expected APIError"
+        except errors.APIError:
+            pass
+        assert llm_governor.get_metrics()['test_retry']['retries'] == 2
+        print("PASS: retried 429s, hedge won, 400 not retried.")
+    finally:
+        llm_governor.DEADLINES.clear()
+        llm_governor.DEADLINES.update(original[0])
+        llm_governor.RETRY_BASE_DELAY = original[1]
+
+def test_token_bucket():
+    bucket = llm_governor.TokenBucket(rate=10, capacity=2)
+    delays = [bucket.reserve() for _ in range(4)]
+    assert delays[0] == 0 and delays[1] == 0
+    assert 0.05 < delays[2] <= 0.1 and 0.15 < delays[3] <= 0.2, delays
+    print(f"PASS: token bucket delays {['%.2f' % d for d in delays]}")
+
+if __name__ == "__main__":
+    test_retry_and_hedge()
+    test_token_bucket()
@@ -0,0 +1,86 @@
+import sys
+import os
+import asyncio
+import tempfile
+from types import SimpleNamespace
+
+sys.path.append(os.getcwd())
+
+from google.genai import errors
+from src import database as db
+from src import gemini_utils, llm_cache, llm_governor, llm_metrics
+
+class FakeModels:
+    """Fails the first request with a 429 so the governor retries it."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, model, contents, config=None):
+        self.calls += 1
+        if self.calls == 1:
+            raise errors.APIError(429, {'error': {'message': 'quota'}})
+        usage = SimpleNamespace(prompt_token_count=180, candidates_token_count=20, total_token_count=200)
+        return SimpleNamespace(text="Markets close higher", usage_metadata=usage, model_version=model)
+
+class FakeAsyncModels:
+    async def generate_content(self, model, contents, config=None):
+        usage = SimpleNamespace(prompt_token_count=400, candidates_token_count=100, total_token_count=500)
+        return SimpleNamespace(text="Rain shuts schools", usage_metadata=usage, model_version=model)
+
+def test_llm_metrics():
+    print("Testing LLM call instrumentation...")
+    original = (db.DB_NAME, gemini_utils._client, gemini_utils.GEMINI_API_KEY, llm_governor.RETRY_BASE_DELAY)
+    db.DB_NAME = os.path.join(tempfile.mkdtemp(), "llm_metrics_test.db")
+    fake = FakeModels()
+    gemini_utils._client = SimpleNamespace(models=fake, aio=SimpleNamespace(models=FakeAsyncModels()))
+    gemini_utils.GEMINI_API_KEY = "test"
+    llm_governor.RETRY_BASE_DELAY = 0.01
+    llm_metrics._aggregates.clear()
+    try:
+        db.init_db()
+        llm_cache.clear_memory()
+        llm_metrics.set_user(42)
+
+        # Retried call, then the same prompt again from the response cache
+        gemini_utils.refine_headline("Sensex ends the day higher")
+        gemini_utils.refine_headline("Sensex ends the day higher")
+        refine = llm_metrics.export()['refine']
+        assert refine['calls'] == 2 and refine['requests'] == 1
+        assert refine['retries'] == 1 and refine['cache_hits'] == 1
+        assert refine['prompt_tokens'] == 180 and refine['response_tokens'] == 20
+        assert refine['models'] == {gemini_utils.MODEL: 1}
+        assert refine['latency_histogram'][-1] == ['+Inf', 2]
+
+        # Async entry point, tracked inside a task started for another user
+        async def other_user():
+            llm_metrics.set_user(7)
+            return await gemini_utils.generate_one_liner_async("Mumbai schools shut", "Heavy rain in Mumbai.")
+        assert asyncio.run(other_user()) == "Rain shuts schools"
+        assert llm_metrics.export()['one_liner']['cost'] > 0
+
+        # Per-user daily view
+        mine = llm_metrics.daily_usage(user_id=42)
+        assert [(r['call_site'], r['calls'], r['prompt_tokens']) for r in mine] == [('refine', 2, 180)]
+        theirs = llm_metrics.daily_usage(user_id=7)
+        assert theirs[0]['call_site'] == 'one_liner' and theirs[0]['response_tokens'] == 100
+        print(llm_metrics.format_usage(mine))
+
+        # Versioned model names are priced by family (longest match wins)
+        assert llm_metrics.price('gemini-2.0-flash-001') == llm_metrics.PRICES['gemini-2.0-flash']
+        assert llm_metrics.price('models/gemini-2.0-flash-lite-001') == llm_metrics.PRICES['gemini-2.0-flash-lite']
+        assert llm_metrics.price('gemini-2.0-flashy') == (0.0, 0.0)
+        assert llm_metrics.cost('gemini-2.0-flash-001', 1_000_000, 0) == llm_metrics.PRICES['gemini-2.0-flash'][0]
+
+        text = llm_metrics.to_prometheus()
+        assert 'newsu_llm_calls_total{call_site="refine"} 2' in text
+        assert 'newsu_llm_latency_seconds_bucket{call_site="refine",le="+Inf"} 2' in text
+        print(llm_metrics.report())
+        print("LLM metrics test passed.")
+    finally:
+        db.DB_NAME, gemini_utils._client, gemini_utils.GEMINI_API_KEY, llm_governor.RETRY_BASE_DELAY = original
+        llm_metrics.set_user(None)
+        llm_cache.clear_memory()
+
+if __name__ == "__main__":
+    test_llm_metrics()
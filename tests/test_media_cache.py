@@ -0,0 +1,46 @@
+import sys
+import os
+import asyncio
+import io
+import tempfile
+from types import SimpleNamespace
+
+sys.path.append(os.getcwd())
+
+from src import database as db
+from src import media_cache
+
+def test_media_cache():
+    print("Testing Telegram file_id cache...")
+    original_db = db.DB_NAME
+    db.DB_NAME = os.path.join(tempfile.mkdtemp(), "media_test.db")
+    try:
+        db.init_db()
+        uploads = []
+
+        async def fake_reply_photo(photo, **kwargs):
+            uploads.append(photo)
+            file_id = photo if isinstance(photo, str) and photo.startswith("FILE") else f"FILE{len(uploads)}"
+            return SimpleNamespace(photo=[SimpleNamespace(file_id="thumb"), SimpleNamespace(file_id=file_id)])
+
+        async def run():
+            png = b'\x89PNG' + b'0' * 1000
+            await media_cache.send_photo_cached(fake_reply_photo, io.BytesIO(png), caption="a")
+            await media_cache.send_photo_cached(fake_reply_photo, io.BytesIO(png), caption="b")
+            await media_cache.send_photo_cached(fake_reply_photo, "https://example.com/a.jpg")
+            await media_cache.send_photo_cached(fake_reply_photo, "https://example.com/a.jpg")
+
+        asyncio.run(run())
+        print(f"Uploads: {[u if isinstance(u, str) else f'<{len(u)} bytes>' for u in uploads]}")
+        assert uploads[1] == "FILE1" and uploads[3] == "FILE3"
+
+        # Persistence: survives losing the in-memory LRU
+        media_cache._lru.clear()
+        key, _ = media_cache.media_key("https://example.com/a.jpg")
+        assert media_cache.get_file_id(key) == "FILE3"
+        print(f"PASS: file_ids reused ({media_cache.stats}).")
+    finally:
+        db.DB_NAME = original_db
+
+if __name__ == "__main__":
+    test_media_cache()
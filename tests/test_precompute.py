@@ -0,0 +1,67 @@
+import sys
+import os
+import asyncio
+import json
+import re
+import tempfile
+from types import SimpleNamespace
+
+sys.path.append(os.getcwd())
+
+from src import database as db
+from src import gemini_utils, llm_cache, precompute
+
+STYLE_BLOCK = {s: {"headline": f"{s} headline", "sub": "short sub"} for s in gemini_utils.STYLES}
+
+class FakeAioModels:
+    def __init__(self):
+        self.batches = []
+
+    async def generate_content(self, model, contents, config=None):
+        titles = re.findall(r'^\s*\d+\. Headline: "(.*)"$', contents, re.MULTILINE)
+        self.batches.append(titles)
+        await asyncio.sleep(0.2)
+        entries = [{"id": i, **STYLE_BLOCK} for i in range(len(titles))]
+        return SimpleNamespace(text=json.dumps({"items": entries}), usage_metadata=None)
+
+def test_precompute():
+    print("Testing speculative variation precompute...")
+    original = (db.DB_NAME, gemini_utils._client, gemini_utils.GEMINI_API_KEY, precompute.PRECOMPUTE_TOKEN_BUDGET)
+    db.DB_NAME = os.path.join(tempfile.mkdtemp(), "precompute_test.db")
+    fake = FakeAioModels()
+    gemini_utils._client = SimpleNamespace(aio=SimpleNamespace(models=fake))
+    gemini_utils.GEMINI_API_KEY = "test"
+    # Room for roughly two items this cycle
+    precompute.PRECOMPUTE_TOKEN_BUDGET = 2 * precompute.OUTPUT_TOKENS_PER_ITEM + 60
+    precompute._budget['window_start'] = 0.0
+    try:
+        db.init_db()
+        llm_cache.clear_memory()
+        items = [
+            {'title': "Local fair opens downtown", 'published': "Mon, 01 Jan 2024 10:00:00 GMT"},
+            {'title': "Monsoon hits Kerala early this year", 'published': "Mon, 01 Jan 2024 09:00:00 GMT"},
+            {'title': "Monsoon hits Kerala early, IMD says", 'published': "Mon, 01 Jan 2024 09:30:00 GMT"},
+            {'title': "Monsoon hits Kerala early this year", 'published': "Mon, 01 Jan 2024 09:00:00 GMT"},
+        ]
+
+        async def run():
+            app = SimpleNamespace(create_task=asyncio.create_task)
+            scheduled = precompute.schedule(app, items)
+            # Tap arrives while the batch is still running: joins it
+            variations = await precompute.get_variations("Monsoon hits Kerala early this year", "ctx")
+            ready = await precompute.get_variations("Monsoon hits Kerala early, IMD says", "ctx")
+            return scheduled, variations, ready
+
+        scheduled, variations, ready = asyncio.run(run())
+        print(f"Batches: {fake.batches} | {precompute.report()}")
+        assert scheduled == 2
+        assert "Local fair opens downtown" not in fake.batches[0], "cluster members outrank the lone story"
+        assert variations and ready and len(fake.batches) == 1
+        assert precompute.stats['joined'] == 1 and precompute.stats['ready'] == 1
+        print("PASS: prioritised within budget, tap joined the precompute.")
+    finally:
+        db.DB_NAME, gemini_utils._client, gemini_utils.GEMINI_API_KEY, precompute.PRECOMPUTE_TOKEN_BUDGET = original
+        llm_cache.clear_memory()
+
+if __name__ == "__main__":
+    test_precompute()
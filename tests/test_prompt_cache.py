@@ -0,0 +1,146 @@
+import sys
+import os
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+sys.path.append(os.getcwd())
+
+from google.genai import errors
+from src import prompt_cache
+
+class FakeClient:
+    """Records which configs reach generate_content; the first cached call reports a stale handle if asked."""
+
+    def __init__(self, fail_create=False, stale_once=False, prefix_tokens=5000, create_delay=0):
+        self.created, self.updated, self.configs, self.contents, self.counted = [], [], [], [], []
+        self.fail_create = fail_create
+        self.stale_once = stale_once
+        self.prefix_tokens = prefix_tokens
+        self.create_delay = create_delay
+        self.caches = SimpleNamespace(create=self._create, update=self._update)
+        self.models = SimpleNamespace(generate_content=self._generate, count_tokens=self._count_tokens)
+
+    def _count_tokens(self, model, contents):
+        self.counted.append(contents)
+        return SimpleNamespace(total_tokens=self.prefix_tokens)
+
+    def _create(self, model, config):
+        time.sleep(self.create_delay)
+        if self.fail_create:
+            raise errors.APIError(400, {'error': {'message': 'Cached content is too small'}})
+        self.created.append(config.system_instruction)
+        return SimpleNamespace(name=f"cachedContents/{len(self.created)}")
+
+    def _update(self, name, config):
+        self.updated.append((name, config.ttl))
+
+    def _generate(self, model, contents, config=None):
+        self.configs.append(config)
+        self.contents.append(contents)
+        cached_content = getattr(config, 'cached_content', None)
+        if cached_content and self.stale_once:
+            self.stale_once = False
+            raise errors.APIError(404, {'error': {'message': 'cached content not found'}})
+        cached = 200 if cached_content else 0
+        usage = SimpleNamespace(prompt_token_count=220, cached_content_token_count=cached)
+        return SimpleNamespace(text="ok", usage_metadata=usage)
+
+def _reset():
+    prompt_cache._entries.clear()
+    prompt_cache._unavailable.clear()
+    prompt_cache.stats.clear()
+
+INLINE = "Static instructions for the test family.\nHeadline: "
+
+def test_prompt_cache():
+    print("Testing context-cached prompt instructions...")
+    prompt_cache.register('test_family', "  Static instructions for the test family.  ")
+    original_enabled = prompt_cache.GEMINI_CONTEXT_CACHE
+    _reset()
+    try:
+        # Off by default: instructions stay inline with the prompt, no cache calls
+        prompt_cache.GEMINI_CONTEXT_CACHE = False
+        client = FakeClient()
+        prompt_cache.generate(client, 'test_family', 'gemini-2.0-flash', "Headline: Zero")
+        assert client.contents == [INLINE + "Zero"] and client.configs == [None]
+        assert not client.counted and not client.created
+
+        # Created once, then referenced by handle
+        prompt_cache.GEMINI_CONTEXT_CACHE = True
+        client = FakeClient()
+        for headline in ("One", "Two", "Three"):
+            prompt_cache.generate(client, 'test_family', 'gemini-2.0-flash', f"Headline: {headline}")
+        assert client.created == ["Static instructions for the test family."]
+        assert all(c.cached_content == "cachedContents/1" and not c.system_instruction for c in client.configs)
+        assert client.contents[0] == "Headline: One"
+        assert prompt_cache.stats['test_family']['cached_tokens'] == 600
+        print(prompt_cache.report())
+
+        # Refreshed shortly before expiry instead of recreated
+        prompt_cache._entries[('test_family', 'gemini-2.0-flash')]['expires_at'] = 10
+        prompt_cache.generate(client, 'test_family', 'gemini-2.0-flash', "Headline: Four", {'response_mime_type': 'application/json'})
+        assert client.updated == [("cachedContents/1", f"{prompt_cache.GEMINI_CONTEXT_CACHE_TTL}s")]
+        assert len(client.created) == 1
+        assert client.configs[-1].response_mime_type == 'application/json'
+
+        # Handle rejected by the server: answered inline, recreated next time
+        stale = FakeClient(stale_once=True)
+        _reset()
+        response = prompt_cache.generate(stale, 'test_family', 'gemini-2.0-flash', "Headline: Five")
+        assert response.text == "ok"
+        assert stale.contents[-1] == INLINE + "Five"
+        prompt_cache.generate(stale, 'test_family', 'gemini-2.0-flash', "Headline: Six")
+        assert len(stale.created) == 2 and stale.configs[-1].cached_content == "cachedContents/2"
+
+        # Prefix below the model's minimum: counted once, never created, inline from then on
+        small = FakeClient(prefix_tokens=1500)
+        _reset()
+        for headline in ("Seven", "Eight"):
+            prompt_cache.generate(small, 'test_family', 'gemini-2.0-flash', f"Headline: {headline}")
+        assert len(small.counted) == 1 and not small.created
+        assert small.contents == [INLINE + "Seven", INLINE + "Eight"]
+        # ...while a model family with a lower minimum (versioned name) does cache it
+        prompt_cache.generate(small, 'test_family', 'gemini-2.5-flash-001', "Headline: Nine")
+        assert prompt_cache.min_cache_tokens('gemini-2.5-flash-001') == 1024 and len(small.created) == 1
+
+        # Cache creation refused: transparent inline fallback
+        refused = FakeClient(fail_create=True)
+        _reset()
+        response = prompt_cache.generate(refused, 'test_family', 'gemini-2.0-flash', "Headline: Ten")
+        prompt_cache.generate(refused, 'test_family', 'gemini-2.0-flash', "Headline: Eleven")
+        assert response.text == "ok"
+        assert all(c is None for c in refused.configs) and refused.contents[-1] == INLINE + "Eleven"
+        assert prompt_cache.stats['test_family']['cached_calls'] == 0
+
+        # Concurrent first calls, from threads and the event loop, create the cache once
+        slow = FakeClient(create_delay=0.3)
+        slow.aio = SimpleNamespace(models=SimpleNamespace(generate_content=_async_generate(slow)))
+        _reset()
+        threads = [threading.Thread(target=prompt_cache.generate, args=(slow, 'test_family', 'gemini-2.0-flash', "Headline: T"))
+                   for _ in range(3)]
+        for t in threads:
+            t.start()
+
+        async def burst():
+            await asyncio.gather(*(prompt_cache.generate_async(slow, 'test_family', 'gemini-2.0-flash', "Headline: A")
+                                   for _ in range(3)))
+        asyncio.run(burst())
+        for t in threads:
+            t.join()
+        assert len(slow.created) == 1, slow.created
+        assert all(c.cached_content == "cachedContents/1" for c in slow.configs)
+        print(prompt_cache.report())
+        print("Prompt cache test passed.")
+    finally:
+        prompt_cache.GEMINI_CONTEXT_CACHE = original_enabled
+        _reset()
+
+def _async_generate(client):
+    async def generate_content(model, contents, config=None):
+        return client._generate(model, contents, config)
+    return generate_content
+
+if __name__ == "__main__":
+    test_prompt_cache()
@@ -0,0 +1,121 @@
+import sys
+import os
+import io
+import socket
+import subprocess
+import time
+
+sys.path.append(os.getcwd())
+
+import requests
+from types import SimpleNamespace
+
+from src import render_node, render_pool
+from src.render_client import RenderClient
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def _start_node(port):
+    env = dict(os.environ, RENDER_POOL_WORKERS="0", RENDER_NODE_CAPACITY="2")
+    return subprocess.Popen(
+        [sys.executable, "-m", "src.render_node", "--port", str(port)],
+        cwd=os.getcwd(), env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+def _wait_ready(url, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{url}/health", timeout=1).ok:
+                return True
+        except requests.RequestException:
+            time.sleep(0.2)
+    return False
+
+def test_render_nodes():
+    print("Testing render nodes on localhost...")
+    ports = [_free_port(), _free_port()]
+    procs = [_start_node(p) for p in ports]
+    urls = [f"http://127.0.0.1:{p}" for p in ports]
+    try:
+        assert all(_wait_ready(u) for u in urls)
+
+        client = RenderClient(urls)
+        assert client.refresh_health() == 2
+
+        params = {'title': "Render Nodes Share The Load", 'source': "Test", 'date_str': "Now", 'summary': "Remote render"}
+        for _ in range(4):
+            img = client.render_news_image(**params)
+            assert img.getvalue()[:4] == b'\x89PNG'
+        served = [requests.get(f"{u}/health").json()['served'] for u in urls]
+        print(f"Requests served per node: {served}")
+        assert served == [2, 2]
+
+        # Per-user templates live in this host's users_data: those renders stay local
+        original_workers = render_pool.RENDER_POOL_WORKERS
+        render_pool.RENDER_POOL_WORKERS = 0
+        try:
+            assert client.render_news_image(user_id=123, **params).getvalue()[:4] == b'\x89PNG'
+        finally:
+            render_pool.RENDER_POOL_WORKERS = original_workers
+        assert [requests.get(f"{u}/health").json()['served'] for u in urls] == served
+
+        # Failover: kill the first node, renders keep working on the second
+        procs[0].kill()
+        procs[0].wait()
+        overlay = client.render_overlay(title="Failover", summary="Still rendering", date_str="")
+        assert overlay.getvalue()[:4] == b'\x89PNG'
+        assert client.refresh_health() == 1
+        print("PASS: Least-loaded dispatch and failover work.")
+
+        # A streamed (video) response holds its node's slot until the stream is released
+        streaming = RenderClient(["http://stream.invalid"])
+        streaming.session = SimpleNamespace(post=lambda *a, **k: SimpleNamespace(status_code=200))
+        resp, node = streaming._dispatch('/render/video', {}, {}, 1, stream=True)
+        assert resp is not None and node.in_flight == 1
+        streaming._release(node)
+        assert node.in_flight == 0
+
+        # A render error from a node fails the request; the node stays in rotation
+        closed = []
+        error_resp = SimpleNamespace(status_code=500, close=lambda: closed.append(True))
+        failing = RenderClient(["http://error.invalid"])
+        failing.session = SimpleNamespace(post=lambda *a, **k: error_resp)
+        assert failing.render_overlay(title="Bad", summary="", date_str="") is None
+        assert closed == [True] and failing.nodes[0].healthy and failing.nodes[0].in_flight == 0
+        print("PASS: Stream slots and render errors handled.")
+    finally:
+        for p in procs:
+            p.kill()
+            p.wait()
+
+def test_node_releases_on_early_disconnect():
+    """A client gone before the video body starts still frees the node's slot and temp dir."""
+    originals = (render_node.render_pool.render_overlay, render_node.video_generator.process_video_with_overlay)
+    work_dirs = []
+    def fake_video(video_path, overlay_io):
+        work_dirs.append(os.path.dirname(video_path))
+        final_path = video_path.replace('.mp4', '_final.mp4')
+        with open(final_path, 'wb') as f:
+            f.write(b'\x00' * 1024)
+        return final_path
+    render_node.render_pool.render_overlay = lambda **params: io.BytesIO(b'overlay')
+    render_node.video_generator.process_video_with_overlay = fake_video
+    try:
+        with render_node.app.test_request_context('/render/video', method='POST',
+                                                  data={'params': '{}', 'video': (io.BytesIO(b'mp4'), 'video.mp4')}):
+            resp = render_node.render_video()
+            assert resp.status_code == 200 and render_node._in_flight == 1
+            resp.close() # what the server does on a disconnect: the body generator never started
+        assert render_node._in_flight == 0
+        assert not os.path.exists(work_dirs[0])
+        print("PASS: Early disconnect released the node slot.")
+    finally:
+        render_node.render_pool.render_overlay, render_node.video_generator.process_video_with_overlay = originals
+
+if __name__ == "__main__":
+    test_render_nodes()
+    test_node_releases_on_early_disconnect()
@@ -0,0 +1,71 @@
+import sys
+import os
+import io
+import shutil
+import time
+
+sys.path.append(os.getcwd())
+
+from PIL import Image
+from src import config_store, onboarding, render_pool
+
+USER_ID = 990027
+
+def test_render_pool():
+    print("Testing render worker pool...")
+    pool = render_pool.RenderPool(max_workers=1)
+    try:
+        assert pool.check_health()
+
+        # Large background goes through shared memory
+        background = Image.new('RGB', (1600, 2000), (30, 60, 90))
+        data = pool.render('news_image', {
+            'title': "Worker Pool Renders Headlines Off The Main Process",
+            'source': "Test",
+            'date_str': "Now",
+            'summary': "Rendered in a separate process"
+        }, background)
+        assert data and data[:8] == b'\x89PNG\r\n\x1a\n'
+        print(f"PASS: Pool rendered {len(data)} bytes.")
+
+        # Encoded uploads reach the worker as bytes and are decoded there
+        upload = io.BytesIO()
+        background.save(upload, format='JPEG')
+        data = pool.render('news_image', {'title': "Encoded upload", 'source': "Test", 'date_str': "Now"}, upload.getvalue())
+        assert Image.open(io.BytesIO(data)).size == (1080, 1350)
+
+        # Respawn after the pool is torn down
+        pool.respawn("test")
+        assert pool.check_health()
+        assert pool.render('overlay', {'title': "Overlay", 'summary': "Sub", 'date_str': ""})
+        print(f"PASS: Pool recovered after respawn ({pool.respawns} respawns).")
+
+        # Deadline is enforced in the worker: the render is aborted, the pool stays
+        respawns = pool.respawns
+        assert pool.render('overlay', {'title': "Too slow", 'summary': "Sub", 'date_str': ""}, timeout=0.001) is None
+        assert pool.respawns == respawns and pool.check_health()
+
+        # A worker stuck past deadline + grace is killed; the next render gets a fresh pool
+        pid = pool._get_executor().submit(render_pool._ping).result(timeout=30)
+        pool._running['stuck'] = (pid, time.time() - render_pool.KILL_GRACE - 1)
+        pool._kill_overrun()
+        assert pool.kills == 1
+        assert pool.render('overlay', {'title': "After kill", 'summary': "Sub", 'date_str': ""})
+        print(f"PASS: Deadline abort and stuck worker kill ({pool.respawns} respawns).")
+
+        # A template saved in this process applies to the very next render in the worker
+        overlay = {'title': "Saved template", 'summary': "Sub", 'date_str': "", 'user_id': USER_ID}
+        assert Image.open(io.BytesIO(pool.render('overlay', overlay))).size == (1080, 1350)
+        config = config_store.load(USER_ID)
+        config['canvas'].update(width=540, height=675)
+        assert onboarding.save_user_config(USER_ID, config)
+        assert Image.open(io.BytesIO(pool.render('overlay', overlay))).size == (540, 675)
+        print("PASS: Worker picked up the saved template at once.")
+    finally:
+        pool.shutdown()
+        shutil.rmtree(os.path.join("users_data", str(USER_ID)), ignore_errors=True)
+        config_store._snapshots.pop(USER_ID, None)
+        config_store._mtimes.clear()
+
+if __name__ == "__main__":
+    test_render_pool()
@@ -0,0 +1,80 @@
+import sys
+import os
+import asyncio
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+sys.path.append(os.getcwd())
+
+from src import database as db
+from PIL import Image
+from src import gemini_utils, llm_cache, render_client, singleflight
+
+class FakeAioModels:
+    def __init__(self):
+        self.calls = 0
+
+    async def generate_content(self, model, contents, config=None):
+        self.calls += 1
+        await asyncio.sleep(0.2)
+        return SimpleNamespace(text='{"Simple": {"headline": "H", "sub": "S"}}', usage_metadata=None)
+
+def test_llm_coalescing():
+    print("Testing single-flight for concurrent Gemini calls...")
+    original = (db.DB_NAME, gemini_utils._client, gemini_utils.GEMINI_API_KEY)
+    db.DB_NAME = os.path.join(tempfile.mkdtemp(), "singleflight_test.db")
+    fake = FakeAioModels()
+    gemini_utils._client = SimpleNamespace(aio=SimpleNamespace(models=fake))
+    gemini_utils.GEMINI_API_KEY = "test"
+    try:
+        db.init_db()
+        llm_cache.clear_memory()
+
+        async def run():
+            return await asyncio.gather(*[
+                gemini_utils.generate_all_variations_async("Breaking: Monsoon arrives early", "Kerala")
+                for _ in range(25)
+            ])
+
+        results = asyncio.run(run())
+        assert fake.calls == 1, f"expected 1 Gemini call, got {fake.calls}"
+        assert all(r == results[0] for r in results)
+        print(f"PASS: 25 requests -> {fake.calls} call ({singleflight.report()})")
+    finally:
+        db.DB_NAME, gemini_utils._client, gemini_utils.GEMINI_API_KEY = original
+        llm_cache.clear_memory()
+
+def test_thread_coalescing():
+    print("Testing single-flight for concurrent renders...")
+    group = singleflight.Group('test')
+    calls = []
+    lock = threading.Lock()
+
+    def render():
+        with lock:
+            calls.append(1)
+        time.sleep(0.2)
+        return b"png-bytes"
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: group.do("same-key", render), range(8)))
+
+    assert len(calls) == 1 and results == [b"png-bytes"] * 8
+    # Finished calls are not cached
+    group.do("same-key", render)
+    assert len(calls) == 2
+
+    # Render keys: uploads by content, PIL backgrounds by identity (no pixel copy)
+    background = Image.new('RGB', (1600, 2000))
+    background.tobytes = None
+    assert render_client._background_digest(background) == render_client._background_digest(background)
+    assert render_client._background_digest(background) != render_client._background_digest(Image.new('RGB', (1600, 2000)))
+    assert render_client._background_digest(b"jpeg") == render_client._background_digest(bytearray(b"jpeg"))
+    print(f"PASS: {group.stats}")
+
+if __name__ == "__main__":
+    test_llm_coalescing()
+    test_thread_coalescing()
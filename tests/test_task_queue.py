@@ -0,0 +1,99 @@
+import sys
+import os
+import asyncio
+import tempfile
+import time
+
+sys.path.append(os.getcwd())
+
+from src import database as db
+from src import render_jobs, task_queue
+
+def test_task_queue():
+    print("Testing durable task queue...")
+    tmp_dir = tempfile.mkdtemp()
+    original_db, original_delay = db.DB_NAME, task_queue.RETRY_BASE_DELAY
+    db.DB_NAME = os.path.join(tmp_dir, "queue_test.db")
+    try:
+        db.init_db()
+        task_queue.RETRY_BASE_DELAY = 0
+
+        # 1. Idempotent by content hash
+        payload = {'title': 'Test', 'summary': 'Sub'}
+        job_id = task_queue.enqueue_job('news_image', payload, chat_id=1)
+        assert task_queue.enqueue_job('news_image', payload, chat_id=1) == job_id
+        assert task_queue.get_queue_metrics()['depth']['queued'] == 1
+
+        # 2. Lease + retry
+        job = task_queue.claim_next_job('w1')
+        assert job and job['job_id'] == job_id
+        assert task_queue.claim_next_job('w2') is None  # leased
+        assert task_queue.fail_job(job_id, 'w1', 'boom') == 'queued'
+
+        # 3. Crashed worker: expired lease is reclaimed by another worker
+        job = task_queue.claim_job(job_id, 'w2', lease_seconds=-1)
+        assert job['attempts'] == 2
+        job = task_queue.claim_next_job('w3')
+        assert job and job['worker_id'] == 'w3'
+
+        # 4. Completion + result pointer + delivery
+        assert task_queue.complete_job(job_id, 'w3', '/tmp/out.png')
+        assert not task_queue.complete_job(job_id, 'w2', '/tmp/stale.png')  # lost lease
+        done = task_queue.get_job(job_id)
+        assert done['state'] == 'done' and done['result_path'] == '/tmp/out.png'
+        assert [j['job_id'] for j in task_queue.get_undelivered_jobs()] == [job_id]
+        task_queue.mark_job_delivered(job_id)
+        assert task_queue.get_undelivered_jobs() == []
+
+        # 5. Handler failures exhaust attempts
+        def broken(job_id, payload):
+            raise RuntimeError("render failed")
+        bad_id = task_queue.enqueue_job('news_image', {'title': 'Bad'}, max_attempts=2)
+        for _ in range(2):
+            time.sleep(0.01)
+            job = task_queue.claim_job(bad_id, 'w1')
+            assert task_queue.run_job(job, {'news_image': broken}, 'w1') is None
+        assert task_queue.get_job(bad_id)['state'] == 'failed'
+
+        # 6. A job that keeps crashing its worker (lease expires) stops at max_attempts too
+        crash_id = task_queue.enqueue_job('news_image', {'title': 'Crash'}, max_attempts=1)
+        assert task_queue.claim_job(crash_id, 'w1', lease_seconds=-1)['attempts'] == 1
+        assert task_queue.claim_next_job('w2') is None
+        crashed = task_queue.get_job(crash_id)
+        assert crashed['state'] == 'failed' and 'Lease expired' in crashed['last_error']
+
+        # 7. A handler running past its lease keeps it through heartbeats: no second execution
+        slow_id = task_queue.enqueue_job('video_overlay', {'title': 'Slow'})
+        job = task_queue.claim_job(slow_id, 'w1', lease_seconds=1)
+        stolen = []
+        def slow(job_id, payload):
+            for _ in range(5):
+                time.sleep(0.4)
+                stolen.append(task_queue.claim_next_job('w2'))
+            return '/tmp/slow.mp4'
+        assert task_queue.run_job(job, {'video_overlay': slow}, 'w1') == '/tmp/slow.mp4'
+        assert stolen == [None] * 5
+        assert task_queue.get_job(slow_id)['attempts'] == 1
+        task_queue.mark_job_delivered(slow_id)
+
+        # 8. A done job whose result file was cleaned up is rendered again, not sent
+        gone_id = task_queue.enqueue_job('news_image', {'title': 'Gone'}, chat_id=5)
+        task_queue.complete_job(gone_id, task_queue.claim_job(gone_id, 'w1')['worker_id'], os.path.join(tmp_dir, 'gone.png'))
+        statuses = []
+        async def edit_status(message, text):
+            statuses.append(text)
+        asyncio.run(render_jobs.reply_with_job(None, None, task_queue.get_job(gone_id), "caption", edit_status))
+        assert task_queue.get_job(gone_id)['state'] == 'queued' and 'again' in statuses[0]
+        assert task_queue.enqueue_job('news_image', {'title': 'Gone'}, chat_id=5) == gone_id
+        task_queue.fail_job(gone_id, task_queue.claim_job(gone_id, 'w1')['worker_id'], 'stop')
+        task_queue.mark_job_delivered(gone_id)
+
+        metrics = task_queue.get_queue_metrics()
+        print(f"Metrics: {metrics}")
+        assert metrics['depth']['done'] == 2 and metrics['depth']['failed'] == 2
+        print("PASS: Queue leases, retries and delivery tracking work.")
+    finally:
+        db.DB_NAME, task_queue.RETRY_BASE_DELAY = original_db, original_delay
+
+if __name__ == "__main__":
+    test_task_queue()
@@ -0,0 +1,75 @@
+import sys
+import os
+import json
+import shutil
+import tempfile
+
+sys.path.append(os.getcwd())
+
+import numpy as np
+from PIL import Image
+
+from src import config_store, image_generator, onboarding
+from src.components import template
+from src.components.background import gradient_mask
+from src.components.logo import load_logo
+
+USER_ID = 990048
+
+def reference_render(image, config):
+    """Gradient then logo, blended per render (what a compiled template replaces)."""
+    mask, start_color = gradient_mask(image.width, image.height, config)
+    image.paste(start_color, (0, 0, image.width, image.height), mask)
+    logo_img, position = load_logo(config)
+    image.paste(logo_img, position, logo_img)
+    return image
+
+def test_template_cache():
+    print("Testing compiled template cache...")
+    tmp = tempfile.mkdtemp()
+    user_dir = os.path.join("users_data", str(USER_ID))
+    logo_path = os.path.join(tmp, "logo.png")
+    Image.radial_gradient('L').convert('RGBA').save(logo_path)
+    try:
+        config = config_store.load()
+        config['logo'] = {'path': logo_path, 'target_width': 120, 'margin_top': 30, 'margin_left': 30}
+        onboarding.save_user_config(USER_ID, config)
+
+        tpl = template.get(USER_ID)
+        assert template.get(USER_ID) is tpl, "unchanged template was compiled again"
+        assert tpl.size == (1080, 1350) and isinstance(tpl.bg_color, tuple)
+
+        # One paste of the static layer matches gradient + logo drawn per render
+        photo = Image.effect_noise(tpl.size, 64).convert('RGB')
+        expected = reference_render(photo.copy(), config)
+        diff = np.abs(np.asarray(tpl.apply(photo.copy()), dtype=np.int16) - np.asarray(expected, dtype=np.int16))
+        assert diff.max() <= 2, f"max difference {diff.max()}"
+        assert tpl.overlay().mode == 'RGBA' and tpl.overlay() is not tpl.overlay()
+
+        # A new logo file (mtime) recompiles
+        stat = os.stat(logo_path)
+        os.utime(logo_path, (stat.st_atime, stat.st_mtime + 10))
+        config_store._mtimes.clear() # as if CHECK_INTERVAL had passed
+        relogo = template.get(USER_ID)
+        assert relogo is not tpl
+
+        # Saving through onboarding drops the compiled template
+        config['gradient'] = {'height_ratio': 0.5, 'max_alpha': 200, 'start_color': [0, 0, 0]}
+        onboarding.save_user_config(USER_ID, config)
+        saved = template.get(USER_ID)
+        assert saved is not relogo and saved.config['gradient']['max_alpha'] == 200
+        assert saved.mask.getpixel((0, 0)) == 0 and saved.mask.getpixel((0, 1349)) < 200
+
+        overlay = image_generator.create_overlay_image("Compiled templates render", "Static layers are reused.", "Today", user_id=USER_ID)
+        assert overlay is not None
+        print(f"Template cache: {template.cache_info()}")
+        print("Template cache test passed.")
+    finally:
+        template.invalidate(USER_ID)
+        shutil.rmtree(user_dir, ignore_errors=True)
+        config_store._snapshots.pop(USER_ID, None)
+        config_store._mtimes.clear()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    test_template_cache()
@@ -0,0 +1,68 @@
+import sys
+import os
+
+sys.path.append(os.getcwd())
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from src.components import fonts, text_layout
+from src.components.headline import draw_headline
+
+HEADLINES = [
+    "Sensex closes at a record high as foreign investors return to Indian equities",
+    "Monsoon floods shut schools in Mumbai",
+    "Supreme Court reserves verdict on electoral bonds after marathon hearing spanning five days of arguments from both sides",
+    "Breaking",
+]
+
+def _exact_width(font, words):
+    return sum(font.getlength(w) for w in words) + font.getlength(" ") * (len(words) - 1)
+
+def test_text_layout():
+    print("Testing text layout engine...")
+    path = "assets/Poppins-Bold.ttf"
+    max_width = 900
+    for headline in HEADLINES:
+        layout = text_layout.fit_lines(headline, path, max_width, max_lines=4, min_size=35, max_size=65)
+        font = fonts.face(path, layout.size)
+        assert layout.fits and len(layout.lines) <= 4
+        assert [w for line in layout.lines for _, w, _ in line] == headline.split()
+        for line in layout.lines:
+            assert _exact_width(font, [w for _, w, _ in line]) <= max_width
+            # Lines carry the advances they are drawn and centred with
+            assert all(width == font.getlength(w) for _, w, width in line)
+        assert layout.space == font.getlength(" ")
+        # Largest size: one point more no longer fits
+        if layout.size < 65:
+            bigger = fonts.face(path, layout.size + 1)
+            widths = [bigger.getlength(w) for w in headline.split()]
+            lines = text_layout._wrap(widths, bigger.getlength(" "), max_width)
+            assert lines is None or len(lines) > 4, f"{headline!r} also fits at {layout.size + 1}"
+        print(f"  {layout.size}px, {len(layout.lines)} lines: {headline[:40]}")
+
+    # Memoized by (text, font, sizes, width)
+    again = text_layout.fit_lines(HEADLINES[0], path, max_width, max_lines=4, min_size=35, max_size=65)
+    assert again is text_layout.fit_lines(HEADLINES[0], path, max_width, max_lines=4, min_size=35, max_size=65)
+
+    # Footer wrap is pixel accurate
+    summary = "Markets rallied for a third straight session as banking and IT stocks led gains across the board"
+    block = text_layout.wrap_text(summary, path, 35, 600)
+    font = fonts.face(path, 35)
+    assert " ".join(line for line, _, _ in block.lines) == summary
+    assert all(font.getlength(line) <= 600 for line, _, _ in block.lines)
+    assert len(block.lines) >= 2
+    # Highlight boxes cover the glyph ink, overhangs included
+    canvas = Image.new('RGB', (1080, 400), (0, 0, 0))
+    config = {'fonts': {'headline_path': path}, 'colors': {'text_headline_box': [0, 0, 255]}}
+    draw_headline(ImageDraw.Draw(canvas), 1080, 350, "Jiff Quickly", (255, 0, 0), config, highlight_padding=0, font_file=path)
+    pixels = np.asarray(canvas)
+    box_cols = np.nonzero((pixels[..., 0] > 0).any(axis=0))[0]
+    ink_cols = np.nonzero((pixels[..., 2] > 0).any(axis=0))[0]
+    assert box_cols.min() <= ink_cols.min() and ink_cols.max() <= box_cols.max(), (box_cols.min(), box_cols.max(), ink_cols.min(), ink_cols.max())
+
+    print(f"Caches: {text_layout.cache_info()}")
+    print("Text layout test passed.")
+
+if __name__ == "__main__":
+    test_text_layout()
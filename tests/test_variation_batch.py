@@ -0,0 +1,64 @@
+import sys
+import os
+import json
+import re
+import tempfile
+from types import SimpleNamespace
+
+sys.path.append(os.getcwd())
+
+from src import database as db
+from src import gemini_utils, llm_cache
+
+STYLE_BLOCK = {s: {"headline": f"{s} headline", "sub": "short sub"} for s in gemini_utils.STYLES}
+
+class FakeModels:
+    """First batch drops one item and returns a broken schema for another."""
+    def __init__(self):
+        self.batches = []
+
+    def generate_content(self, model, contents, config=None):
+        titles = re.findall(r'^\s*\d+\. Headline: "(.*)"$', contents, re.MULTILINE)
+        self.batches.append(titles)
+        entries = []
+        for i, title in enumerate(titles):
+            if len(self.batches) == 1 and title == "Item 2":
+                continue
+            if len(self.batches) == 1 and title == "Item 3":
+                entries.append({"id": i, "Simple": {"headline": "only one style"}})
+                continue
+            entries.append({"id": i, **STYLE_BLOCK})
+        return SimpleNamespace(text=json.dumps({"items": entries}),
+                               usage_metadata=SimpleNamespace(total_token_count=100 * len(titles)))
+
+def test_variation_batch():
+    print("Testing batched variation generation...")
+    original = (db.DB_NAME, gemini_utils._client, gemini_utils.GEMINI_API_KEY)
+    db.DB_NAME = os.path.join(tempfile.mkdtemp(), "batch_test.db")
+    fake = FakeModels()
+    gemini_utils._client = SimpleNamespace(models=fake)
+    gemini_utils.GEMINI_API_KEY = "test"
+    try:
+        db.init_db()
+        llm_cache.clear_memory()
+        items = [(f"Item {i}", f"context {i}") for i in range(6)]
+        results = gemini_utils.generate_variations_batch(items)
+
+        print(f"Batches sent: {fake.batches}")
+        assert len(results) == 6
+        assert fake.batches[1] == ["Item 2", "Item 3"], "only failed items are retried"
+
+        # Single-item path is served from the variation cache
+        assert gemini_utils.generate_all_variations("Item 4", "ctx") == results["Item 4"]
+        assert len(fake.batches) == 2
+
+        # A malformed single-item reply is returned but not shared through the variation cache
+        assert gemini_utils.generate_all_variations("Item 9", "ctx") == {"items": []}
+        assert gemini_utils.get_cached_variations("Item 9") is None
+        print("PASS: partial failures retried, cache filled.")
+    finally:
+        db.DB_NAME, gemini_utils._client, gemini_utils.GEMINI_API_KEY = original
+        llm_cache.clear_memory()
+
+if __name__ == "__main__":
+    test_variation_batch()
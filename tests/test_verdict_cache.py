@@ -0,0 +1,71 @@
+import sys
+import os
+import io
+import tempfile
+
+from PIL import Image, ImageDraw
+
+sys.path.append(os.getcwd())
+
+from src import database as db
+from src import verdict_cache
+
+def test_verdict_cache():
+    print("Testing image verdict cache...")
+    original_db = db.DB_NAME
+    db.DB_NAME = os.path.join(tempfile.mkdtemp(), "verdict_test.db")
+    try:
+        db.init_db()
+        img = Image.new('RGB', (1200, 900), (30, 60, 90))
+        draw = ImageDraw.Draw(img)
+        for i in range(12):
+            draw.ellipse((i * 90, (i * 137) % 700, i * 90 + 160, (i * 137) % 700 + 160), fill=(20 * i, 255 - 15 * i, 120))
+
+        # Re-hosted copy: resized and JPEG re-encoded
+        buf = io.BytesIO()
+        img.resize((640, 480)).save(buf, format='JPEG', quality=70)
+        copy = Image.open(io.BytesIO(buf.getvalue()))
+        original_hash, copy_hash = verdict_cache.phash(img), verdict_cache.phash(copy)
+        print(f"pHash {original_hash} vs {copy_hash} (distance {verdict_cache.hamming(original_hash, copy_hash)})")
+
+        topic = verdict_cache.topic_key("Delhi air quality turns severe")
+        verdict_cache.record("https://a.example/img.jpg", original_hash, topic, True, "YES")
+
+        assert verdict_cache.lookup(url="https://a.example/img.jpg", topic=topic) == (True, "YES")
+        assert verdict_cache.lookup(image_hash=copy_hash, topic=topic) == (True, "YES")
+        # Same words, different order = same topic
+        assert verdict_cache.topic_key("Air quality in Delhi turns severe") == topic
+        # Relevance verdicts do not carry over to another story
+        other = verdict_cache.topic_key("Mumbai local trains delayed")
+        assert verdict_cache.lookup(url="https://a.example/img.jpg", topic=other) is None
+
+        # Quality rejects apply to every story
+        verdict_cache.record("https://b.example/logo.png", "ffffffffffffffff", verdict_cache.ANY_TOPIC, False, "flat graphic")
+        assert verdict_cache.lookup(url="https://b.example/logo.png", topic=other) == (False, "flat graphic")
+
+        # pHash lookups go through the band index: a hash 6 bits away (2 per band) is still
+        # found, one 7 bits away is not, and an unrelated hash shares no band key at all
+        base = int(original_hash, 16)
+        near = f"{base ^ 0b11 ^ (0b11 << 16) ^ (0b11 << 32):016x}"
+        far = f"{int(near, 16) ^ (1 << 63):016x}"
+        assert verdict_cache.lookup(image_hash=near, topic=topic) == (True, "YES")
+        assert verdict_cache.lookup(image_hash=far, topic=topic) is None
+        unrelated = f"{base ^ 0xFFFFFFFFFFFFFFFF:016x}"
+        assert not set(verdict_cache.probe_keys(unrelated)) & set(verdict_cache.band_keys(original_hash))
+        assert verdict_cache.lookup(image_hash=unrelated, topic=topic) is None
+
+        # Re-recording a URL replaces its bands; pruning drops bands of expired verdicts
+        verdict_cache.record("https://a.example/img.jpg", unrelated, topic, True, "YES", ttl=-1)
+        verdict_cache.prune()
+        conn = db.get_connection()
+        try:
+            bands = conn.execute('SELECT COUNT(*) FROM image_verdict_bands').fetchone()[0]
+        finally:
+            conn.close()
+        assert bands == len(verdict_cache.band_keys(original_hash)), f"{bands} band rows left" # only b.example's
+        print(f"PASS: {verdict_cache.report()}")
+    finally:
+        db.DB_NAME = original_db
+
+if __name__ == "__main__":
+    test_verdict_cache()